@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.preprocessing import LabelEncoder
 import plotly.express as px
 from datetime import datetime
 
+from train_model import load_artifacts
+
 # Page configuration
 st.set_page_config(
     page_title="Calorie Burnt Tracker",
@@ -140,54 +140,84 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load and train model
+# Load model
 @st.cache_resource
 def load_model():
     try:
-        # Load dataset (you should replace this with your actual dataset path)
-        # For demo purposes, I'll create sample data structure
-        # Replace this with: df = pd.read_csv('your_dataset.csv')
-        
-        # Sample data structure - replace with your actual data loading
-        np.random.seed(42)
-        n_samples = 1000
-        
-        df = pd.DataFrame({
-            'Gender': np.random.choice(['male', 'female'], n_samples),
-            'Age': np.random.randint(18, 70, n_samples),
-            'Height': np.random.randint(150, 200, n_samples),
-            'Weight': np.random.randint(50, 120, n_samples),
-            'Duration': np.random.randint(10, 60, n_samples),
-            'Heart_Rate': np.random.randint(60, 180, n_samples),
-            'Body_Temp': np.random.uniform(36.5, 40.0, n_samples)
-        })
-        
-        # Calculate calories (sample formula - replace with your actual target)
-        df['Calories'] = (
-            0.5 * df['Weight'] + 
-            0.3 * df['Duration'] + 
-            0.4 * df['Heart_Rate'] + 
-            10 * (df['Gender'] == 'male').astype(int) +
-            np.random.normal(0, 20, n_samples)
-        )
-        
-        # Encode gender
-        le = LabelEncoder()
-        df['Gender_Encoded'] = le.fit_transform(df['Gender'])
-        
-        # Features and target
-        X = df[['Gender_Encoded', 'Age', 'Height', 'Weight', 'Duration', 'Heart_Rate', 'Body_Temp']]
-        y = df['Calories']
-        
-        # Train model
-        model = GradientBoostingRegressor(n_estimators=100, random_state=42)
-        model.fit(X, y)
-        
+        # Trained once by train_model.py and saved as versioned artifacts; this
+        # only retrains when the dataset or hyperparameters have changed.
+        model, le, _ = load_artifacts()
         return model, le
     except Exception as e:
         st.error(f"Error loading model: {str(e)}")
         return None, None
 
+# History tab chart
+def history_chart(history):
+    """
+    Calories chart and totals for the history tab. Streamlit reruns the script
+    on every widget interaction; history only grows (or is cleared, which drops
+    this), so the DataFrame and figure are rebuilt only when a record was added.
+    """
+    cached = st.session_state.get('history_chart')
+    if cached is not None and cached[0] == len(history):
+        return cached[1], cached[2]
+
+    df_history = pd.DataFrame(history)
+
+    # Calculate y-axis range for better visualization
+    min_cal = df_history['calories'].min()
+    max_cal = df_history['calories'].max()
+    y_range = max_cal - min_cal
+    y_padding = max(y_range * 0.2, 10)  # At least 10 units padding
+
+    # Chart with better styling
+    fig = px.line(df_history, x='timestamp', y='calories',
+                 title='Calories Burned Over Time')
+    fig.update_traces(
+        line_color='#ea580c', 
+        line_width=4,
+        marker=dict(size=12, color='#dc2626', line=dict(width=2, color='white')),
+        fill='tozeroy',
+        fillcolor='rgba(234, 88, 12, 0.1)'
+    )
+    fig.update_layout(
+        plot_bgcolor='rgba(255, 247, 237, 0.5)',
+        paper_bgcolor='white',
+        font=dict(family='Poppins', size=14, color='#292524'),
+        title=dict(
+            text='🔥 Calories Burned Over Time',
+            font=dict(size=24, color='#ea580c', family='Poppins'),
+            x=0.5,
+            xanchor='center'
+        ),
+        xaxis=dict(
+            title='Workout Sessions',
+            gridcolor='rgba(234, 88, 12, 0.1)',
+            showgrid=True,
+            zeroline=False
+        ),
+        yaxis=dict(
+            title='Calories Burned',
+            gridcolor='rgba(234, 88, 12, 0.1)',
+            showgrid=True,
+            zeroline=False,
+            range=[min_cal - y_padding, max_cal + y_padding]
+        ),
+        hovermode='x unified',
+        margin=dict(l=60, r=40, t=80, b=60),
+        height=450
+    )
+
+    totals = {
+        'workouts': len(df_history),
+        'calories': round(df_history['calories'].sum(), 0),
+        'avg_calories': round(df_history['calories'].mean(), 0),
+        'minutes': round(df_history['duration'].sum(), 0),
+    }
+    st.session_state.history_chart = (len(history), fig, totals)
+    return fig, totals
+
 # Initialize session state
 if 'history' not in st.session_state:
     st.session_state.history = []
@@ -416,52 +446,7 @@ elif st.session_state.page == 'tracker':
                     </h2>
                 """, unsafe_allow_html=True)
                 
-                # Convert to dataframe
-                df_history = pd.DataFrame(st.session_state.history)
-                
-                # Calculate y-axis range for better visualization
-                min_cal = df_history['calories'].min()
-                max_cal = df_history['calories'].max()
-                y_range = max_cal - min_cal
-                y_padding = max(y_range * 0.2, 10)  # At least 10 units padding
-                
-                # Chart with better styling
-                fig = px.line(df_history, x='timestamp', y='calories',
-                             title='Calories Burned Over Time')
-                fig.update_traces(
-                    line_color='#ea580c', 
-                    line_width=4,
-                    marker=dict(size=12, color='#dc2626', line=dict(width=2, color='white')),
-                    fill='tozeroy',
-                    fillcolor='rgba(234, 88, 12, 0.1)'
-                )
-                fig.update_layout(
-                    plot_bgcolor='rgba(255, 247, 237, 0.5)',
-                    paper_bgcolor='white',
-                    font=dict(family='Poppins', size=14, color='#292524'),
-                    title=dict(
-                        text='🔥 Calories Burned Over Time',
-                        font=dict(size=24, color='#ea580c', family='Poppins'),
-                        x=0.5,
-                        xanchor='center'
-                    ),
-                    xaxis=dict(
-                        title='Workout Sessions',
-                        gridcolor='rgba(234, 88, 12, 0.1)',
-                        showgrid=True,
-                        zeroline=False
-                    ),
-                    yaxis=dict(
-                        title='Calories Burned',
-                        gridcolor='rgba(234, 88, 12, 0.1)',
-                        showgrid=True,
-                        zeroline=False,
-                        range=[min_cal - y_padding, max_cal + y_padding]
-                    ),
-                    hovermode='x unified',
-                    margin=dict(l=60, r=40, t=80, b=60),
-                    height=450
-                )
+                fig, totals = history_chart(st.session_state.history)
                 
                 # Add a container for the chart
                 st.markdown("""
@@ -479,7 +464,7 @@ elif st.session_state.page == 'tracker':
                     st.markdown(f"""
                         <div class="metric-card">
                             <div style="color: #ea580c; font-size: 2rem; font-weight: 900;">
-                                {len(df_history)}
+                                {totals['workouts']}
                             </div>
                             <div style="color: #78716c;">Total Workouts</div>
                         </div>
@@ -488,7 +473,7 @@ elif st.session_state.page == 'tracker':
                     st.markdown(f"""
                         <div class="metric-card">
                             <div style="color: #ea580c; font-size: 2rem; font-weight: 900;">
-                                {round(df_history['calories'].sum(), 0)}
+                                {totals['calories']}
                             </div>
                             <div style="color: #78716c;">Total Calories</div>
                         </div>
@@ -497,7 +482,7 @@ elif st.session_state.page == 'tracker':
                     st.markdown(f"""
                         <div class="metric-card">
                             <div style="color: #ea580c; font-size: 2rem; font-weight: 900;">
-                                {round(df_history['calories'].mean(), 0)}
+                                {totals['avg_calories']}
                             </div>
                             <div style="color: #78716c;">Avg Calories</div>
                         </div>
@@ -506,7 +491,7 @@ elif st.session_state.page == 'tracker':
                     st.markdown(f"""
                         <div class="metric-card">
                             <div style="color: #ea580c; font-size: 2rem; font-weight: 900;">
-                                {round(df_history['duration'].sum(), 0)}
+                                {totals['minutes']}
                             </div>
                             <div style="color: #78716c;">Total Minutes</div>
                         </div>
@@ -542,6 +527,7 @@ elif st.session_state.page == 'tracker':
                 st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
                 if st.button("🗑️ Clear History", key="clear_hist"):
                     st.session_state.history = []
+                    st.session_state.pop('history_chart', None)
                     st.rerun()
             else:
                 st.info("📊 No workout history yet. Start calculating calories to see your progress!")
@@ -0,0 +1,179 @@
+"""
+Train-once artifact pipeline for the Streamlit tracker (app.py).
+
+The model and its LabelEncoder are trained once and saved under
+``artifacts/<fingerprint>/``:
+
+    model.joblib     GradientBoostingRegressor (uncompressed, so joblib can mmap it)
+    encoder.joblib   LabelEncoder for Gender
+    meta.json        fingerprint, hyperparameters, dataset, features, training time
+
+The fingerprint is a SHA-256 over the dataset content (the CSV bytes, or the
+rows the built-in sample generator produces, as CSV), the hyperparameters, the
+feature list and the scikit-learn version. load_artifacts() only retrains when
+no artifact with the current fingerprint exists. Otherwise it loads the saved
+one, which takes milliseconds instead of a full fit.
+
+Train ahead of time (e.g. at deploy), optionally on a real dataset:
+
+    python train_model.py [--data exercise.csv] [--force]
+
+The CSV needs Gender, Age, Height, Weight, Duration, Heart_Rate, Body_Temp and
+Calories columns. CALORIE_DATASET sets the same path for the Streamlit app.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.preprocessing import LabelEncoder
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')
+FEATURES = ['Gender_Encoded', 'Age', 'Height', 'Weight', 'Duration', 'Heart_Rate', 'Body_Temp']
+TARGET = 'Calories'
+HYPERPARAMS = {'n_estimators': 100, 'random_state': 42}
+
+# Built-in sample dataset, used when no CSV is given
+SAMPLE_DATA = {'seed': 42, 'n_samples': 1000}
+
+# Artifact versions kept on disk (the newest ones)
+KEEP_VERSIONS = 3
+
+
+def sample_dataset(seed, n_samples):
+    """Synthetic workouts with a made-up calorie formula (demo data)."""
+    np.random.seed(seed)
+
+    df = pd.DataFrame({
+        'Gender': np.random.choice(['male', 'female'], n_samples),
+        'Age': np.random.randint(18, 70, n_samples),
+        'Height': np.random.randint(150, 200, n_samples),
+        'Weight': np.random.randint(50, 120, n_samples),
+        'Duration': np.random.randint(10, 60, n_samples),
+        'Heart_Rate': np.random.randint(60, 180, n_samples),
+        'Body_Temp': np.random.uniform(36.5, 40.0, n_samples)
+    })
+
+    df['Calories'] = (
+        0.5 * df['Weight'] +
+        0.3 * df['Duration'] +
+        0.4 * df['Heart_Rate'] +
+        10 * (df['Gender'] == 'male').astype(int) +
+        np.random.normal(0, 20, n_samples)
+    )
+    return df
+
+
+def fingerprint(data_path=None, hyperparams=HYPERPARAMS):
+    """Content hash of everything the trained model depends on."""
+    digest = hashlib.sha256()
+    if data_path:
+        with open(data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        # The generated rows themselves, so editing sample_dataset() retrains too
+        digest.update(sample_dataset(**SAMPLE_DATA).to_csv(index=False).encode())
+    digest.update(json.dumps({
+        'hyperparams': hyperparams,
+        'features': FEATURES,
+        'sklearn': sklearn.__version__,
+    }, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def train(data_path=None, hyperparams=HYPERPARAMS):
+    """Fit the model and encoder; returns (model, encoder, n_rows)."""
+    if data_path:
+        df = pd.read_csv(data_path)
+    else:
+        df = sample_dataset(**SAMPLE_DATA)
+
+    le = LabelEncoder()
+    df['Gender_Encoded'] = le.fit_transform(df['Gender'])
+
+    model = GradientBoostingRegressor(**hyperparams)
+    model.fit(df[FEATURES], df[TARGET])
+    return model, le, len(df)
+
+
+def save_artifacts(model, le, meta, artifact_dir=ARTIFACT_DIR):
+    """Write one artifact version atomically (temp dir + rename)."""
+    target = os.path.join(artifact_dir, meta['fingerprint'])
+    tmp = f'{target}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    joblib.dump(model, os.path.join(tmp, 'model.joblib'))
+    joblib.dump(le, os.path.join(tmp, 'encoder.joblib'))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp, target)
+    prune_artifacts(artifact_dir, keep=meta['fingerprint'])
+    return target
+
+
+def prune_artifacts(artifact_dir=ARTIFACT_DIR, keep=None):
+    versions = sorted(
+        (os.path.join(artifact_dir, name) for name in os.listdir(artifact_dir)
+         if '.tmp' not in name),
+        key=os.path.getmtime
+    )
+    for path in versions[:-KEEP_VERSIONS]:
+        if os.path.basename(path) != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_artifacts(data_path=None, hyperparams=HYPERPARAMS, artifact_dir=ARTIFACT_DIR,
+                   force=False):
+    """
+    Return (model, encoder, meta) for the current dataset and hyperparameters,
+    training and saving them first only if no matching artifact exists.
+    The model's arrays are memory-mapped from disk.
+    """
+    data_path = data_path or os.environ.get('CALORIE_DATASET') or None
+    version = fingerprint(data_path, hyperparams)
+    path = os.path.join(artifact_dir, version)
+
+    if force or not os.path.exists(os.path.join(path, 'meta.json')):
+        start = time.perf_counter()
+        model, le, n_rows = train(data_path, hyperparams)
+        meta = {
+            'fingerprint': version,
+            'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'training_seconds': round(time.perf_counter() - start, 3),
+            'dataset': os.path.abspath(data_path) if data_path else {'sample': SAMPLE_DATA},
+            'rows': n_rows,
+            'features': FEATURES,
+            'hyperparams': hyperparams,
+            'sklearn': sklearn.__version__,
+        }
+        save_artifacts(model, le, meta, artifact_dir)
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    model = joblib.load(os.path.join(path, 'model.joblib'), mmap_mode='r')
+    le = joblib.load(os.path.join(path, 'encoder.joblib'))
+    return model, le, meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and save the Streamlit tracker model')
+    parser.add_argument('--data', help='training CSV (default: CALORIE_DATASET or the sample data)')
+    parser.add_argument('--force', action='store_true', help='retrain even if up to date')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    _, _, meta = load_artifacts(args.data, force=args.force)
+    print(f"Model {meta['fingerprint']} ready in {time.perf_counter() - start:.3f}s "
+          f"(trained {meta['trained_at']} on {meta['rows']} rows)")
+
+
+if __name__ == '__main__':
+    main()
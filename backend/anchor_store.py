@@ -0,0 +1,223 @@
+"""
+Memoized threshold anchors for the long-duration continuation branch.
+
+For Duration > DURATION_THRESHOLD the hybrid model returns
+
+    xgb(row with Duration = threshold) + slope * (Duration - threshold)
+
+The first term (the "anchor") depends only on the other features, so it is
+stored here keyed on those features and long workouts usually need no booster
+call at all.
+
+Two keying modes:
+  - exact (default): keys are the float32 feature values the booster sees, so a
+    hit returns exactly what the booster would.
+  - quantized: each feature listed in ``quantum`` is snapped to a grid
+    (e.g. Age to whole years, Body_Temp to 0.1) and the anchor is evaluated at
+    the grid point. Cells can be pre-warmed in one batched booster call. The
+    error this introduces is bounded by ``tolerance``: validate() measures it
+    and verify mode re-checks every hit against the exact path.
+"""
+import itertools
+import threading
+
+import numpy as np
+
+
+class AnchorStore:
+    """Bounded map from the non-duration features to the booster score at the threshold."""
+
+    def __init__(self, columns, threshold, score_fn, max_size=50000, quantum=None,
+                 tolerance=1.0, verify=False, duration_column='Duration'):
+        """
+        columns:   feature_columns of the loaded model
+        threshold: DURATION_THRESHOLD
+        score_fn:  callable(float32 matrix) -> booster predictions
+        quantum:   optional {column: step} for quantized keys
+        tolerance: largest accepted |anchor - exact| (kcal) in quantized mode
+        verify:    compare every hit with the exact path and correct violations
+        """
+        self.columns = list(columns)
+        self.threshold = float(threshold)
+        self.score_fn = score_fn
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.verify = verify
+        self.duration_idx = self.columns.index(duration_column)
+        self.key_idx = [i for i in range(len(self.columns)) if i != self.duration_idx]
+
+        self.quantum = np.zeros(len(self.columns), dtype=np.float64)
+        for col, step in (quantum or {}).items():
+            self.quantum[self.columns.index(col)] = step
+        self.quantized = bool(self.quantum.any())
+
+        self._anchors = {}       # memoized from traffic, FIFO-evicted at max_size
+        self._grid = {}          # pre-warmed cells, never evicted
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.verified = 0
+        self.violations = 0
+        self.max_abs_error = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 or bool(self._grid)
+
+    # ------------- keys -------------
+    def _anchor_rows(self, rows):
+        """float32 rows at which the anchors are evaluated (Duration clamped, snapped)."""
+        anchor_rows = np.array(rows, dtype=np.float64)
+        if self.quantized:
+            steps = self.quantum
+            snapped = np.round(anchor_rows / np.where(steps > 0, steps, 1)) * steps
+            anchor_rows = np.where(steps > 0, snapped, anchor_rows)
+        anchor_rows[:, self.duration_idx] = self.threshold
+        return anchor_rows.astype(np.float32)
+
+    def _keys(self, anchor_rows):
+        return [row.tobytes() for row in anchor_rows[:, self.key_idx]]
+
+    # ------------- lookup / update -------------
+    def lookup(self, rows):
+        """
+        rows: 2-D array of long-duration rows in feature_columns order
+
+        Returns (anchors, missing, anchor_rows, keys):
+          anchors     - float64 array, NaN where the anchor is not stored yet
+          missing     - indices of the NaN entries
+          anchor_rows - float32 rows the caller should score for the misses
+          keys        - keys to pass back to update() with those scores
+        """
+        rows = np.asarray(rows)
+        anchor_rows = self._anchor_rows(rows)
+        keys = self._keys(anchor_rows)
+        anchors = np.full(len(rows), np.nan, dtype=np.float64)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                value = self._grid.get(key)
+                if value is None:
+                    value = self._anchors.get(key)
+                if value is not None:
+                    anchors[i] = value
+            missing = np.flatnonzero(np.isnan(anchors))
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+
+        if self.verify and len(missing) < len(rows):
+            self._verify(rows, anchors)
+
+        return anchors, missing, anchor_rows[missing], [keys[i] for i in missing]
+
+    def update(self, keys, values):
+        """Store freshly scored anchors for keys returned by lookup()."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, value in zip(keys, values):
+                if key not in self._anchors and len(self._anchors) >= self.max_size:
+                    del self._anchors[next(iter(self._anchors))]
+                    self.evictions += 1
+                self._anchors[key] = float(value)
+
+    def _verify(self, rows, anchors):
+        """Check stored anchors against the exact path; replace any beyond tolerance."""
+        hit = np.flatnonzero(~np.isnan(anchors))
+        exact_rows = np.array(rows[hit], dtype=np.float32)
+        exact_rows[:, self.duration_idx] = self.threshold
+        exact = self.score_fn(exact_rows).astype(np.float64)
+        errors = np.abs(anchors[hit] - exact)
+        bad = errors > self.tolerance
+        anchors[hit[bad]] = exact[bad]
+        self.verified += len(hit)
+        self.violations += int(bad.sum())
+        if len(errors):
+            self.max_abs_error = max(self.max_abs_error, float(errors.max()))
+
+    def use_exact_keys(self):
+        """
+        Switch to exact keys (e.g. after validate() rejected the quantum). Anchors
+        memoized or pre-warmed under the quantized keys are dropped: they were
+        scored at grid points, not at the exact rows.
+        """
+        with self._lock:
+            self.quantum[:] = 0
+            self.quantized = False
+            self._anchors.clear()
+            self._grid.clear()
+
+    # ------------- quantized grid -------------
+    def prewarm(self, ranges, max_cells=1_000_000):
+        """
+        ranges: {column: (low, high)} for every non-duration column; each column
+                steps by its quantum (columns without a quantum need low == high,
+                e.g. a fixed value, or must be categorical like Gender: (0, 1)).
+
+        Scores every grid cell in one booster call. Returns the number of cells.
+        """
+        axes = []
+        for i in self.key_idx:
+            col = self.columns[i]
+            low, high = ranges[col]
+            step = self.quantum[i] or 1.0
+            axes.append(np.round(np.arange(low, high + step / 2, step) / step) * step)
+
+        cells = int(np.prod([len(axis) for axis in axes]))
+        if cells > max_cells:
+            raise ValueError(f'anchor grid has {cells} cells (max {max_cells})')
+
+        grid = np.empty((cells, len(self.columns)), dtype=np.float64)
+        grid[:, self.key_idx] = np.array(list(itertools.product(*axes)))
+        grid[:, self.duration_idx] = self.threshold
+        anchor_rows = self._anchor_rows(grid)
+        values = self.score_fn(anchor_rows)
+
+        with self._lock:
+            self._grid.update(zip(self._keys(anchor_rows), map(float, values)))
+        return cells
+
+    def validate(self, rows):
+        """
+        Max |stored-path anchor - exact anchor| over sample rows (any Duration).
+        Used to check a quantum against the tolerance before serving with it.
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        exact_rows = rows.astype(np.float32)
+        exact_rows[:, self.duration_idx] = self.threshold
+        exact = self.score_fn(exact_rows).astype(np.float64)
+        approx = self.score_fn(self._anchor_rows(rows)).astype(np.float64)
+        return float(np.abs(approx - exact).max()) if len(rows) else 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'mode': 'quantized' if self.quantized else 'exact',
+            'size': len(self._anchors),
+            'grid_size': len(self._grid),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'tolerance': self.tolerance,
+            'verify': self.verify,
+            'verified': self.verified,
+            'violations': self.violations,
+            'max_abs_error': round(self.max_abs_error, 6),
+        }
+
+
+def parse_column_spec(spec):
+    """'Age=1,Body_Temp=0.1' -> {'Age': 1.0, 'Body_Temp': 0.1}; values may be 'low:high' ranges."""
+    parsed = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        col, _, value = item.partition('=')
+        if ':' in value:
+            low, high = value.split(':', 1)
+            parsed[col.strip()] = (float(low), float(high))
+        else:
+            parsed[col.strip()] = float(value)
+    return parsed
@@ -1,191 +1,1011 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+import hashlib
+import codecs
+import hmac
 import numpy as np
 import os
-import pandas as pd
+import time
 
-from xgboost import XGBRegressor   # ✅ use real XGBRegressor
-import joblib                      # ✅ to load metadata
+from anchor_store import AnchorStore, parse_column_spec
+from auth import AuthBusyError, PasswordHasher, TokenSigner, load_secret
+from batching import MicroBatcher, QueueFullError
+import bulk_scoring
+from feature_schema import SchemaError
+from history_writer import HistoryWriter
+from inference_pool import InferencePool, PoolTimeoutError, WorkerCrashedError, model_spec
+from metrics import MetricsRegistry, SlowRequestProfiler
+from model_registry import ModelRegistry, hybrid_predict
+from prediction_cache import PredictionCache
+from serialization import FastJSONProvider, compress_response, supported_encodings
+from shadow import ShadowEvaluator
+from storage import GRANULARITIES, HistoryStore
 
 app = Flask(__name__)
 CORS(app)
 
+# JSON_PROVIDER=orjson (default) encodes responses with orjson when it is
+# installed; JSON_PROVIDER=stdlib keeps Flask's json-module provider.
+if os.environ.get("JSON_PROVIDER", "orjson") == "orjson":
+    app.json = FastJSONProvider(app)
+
+# Responses of at least COMPRESS_MIN_BYTES are gzip- or brotli-encoded when
+# the client accepts it (RESPONSE_COMPRESSION=0 leaves that to a proxy).
+COMPRESS_RESPONSES = os.environ.get("RESPONSE_COMPRESSION", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+
+# Upper bound on the number of workouts accepted by /api/predict/batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 10000))
+
+# Rows scored per vectorized call by /api/predict/stream
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", bulk_scoring.DEFAULT_CHUNK_SIZE))
+
+# Cache of hybrid predictions keyed on the model version and the rounded feature
+# vector; cleared whenever a new model version goes live. PREDICTION_CACHE_SIZE=0
+# disables it.
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get("PREDICTION_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL", 3600)),
+    decimals=int(os.environ.get("PREDICTION_CACHE_DECIMALS", 4)),
+)
+
+# Micro-batching of concurrent single-row predictions (PREDICT_BATCHING=1): rows
+# are flushed as one booster call per PREDICT_BATCH_SIZE rows or every
+# PREDICT_BATCH_WAIT_MS milliseconds, whichever comes first.
+batcher = None
+if os.environ.get("PREDICT_BATCHING") == "1":
+    batcher = MicroBatcher(
+        lambda features_list, bundle: _score_batch(features_list, bundle),
+        max_batch_size=int(os.environ.get("PREDICT_BATCH_SIZE", 32)),
+        max_wait_ms=float(os.environ.get("PREDICT_BATCH_WAIT_MS", 2)),
+        max_queue=int(os.environ.get("PREDICT_QUEUE_SIZE", 10000)),
+    )
+BATCH_RESULT_TIMEOUT = 30
+
+# Inference processes (INFERENCE_WORKERS > 0, see inference_pool.py): booster
+# calls are handed over shared memory to that many processes, pinned one per
+# core with one booster thread each, while this process only parses and
+# validates. Inputs are split into chunks of INFERENCE_SLOT_ROWS rows.
+inference_pool = None
+if int(os.environ.get("INFERENCE_WORKERS", 0)) > 0:
+    inference_pool = InferencePool(
+        workers=int(os.environ["INFERENCE_WORKERS"]),
+        slots=int(os.environ.get("INFERENCE_SLOTS", 0)) or None,
+        slot_rows=int(os.environ.get("INFERENCE_SLOT_ROWS", 1024)),
+        pin=os.environ.get("INFERENCE_PIN", "1") == "1",
+        timeout=float(os.environ.get("INFERENCE_TIMEOUT", 30)),
+    )
+
+# Scoring failures that mean "busy, retry later" and are answered with 503: a full
+# batching queue or pool, a crashed inference worker, or no answer in time
+SCORING_UNAVAILABLE = (QueueFullError, WorkerCrashedError, PoolTimeoutError, FutureTimeoutError)
+
+# Accounts and prediction history (SQLite, shared by all workers)
+store = HistoryStore(os.environ.get("HISTORY_DB", "history.db"))
+
+# Write-behind for /api/predict and /api/predict/batch history records
+# (HISTORY_WRITE_BEHIND=0 writes them inside the request): flushed every
+# HISTORY_FLUSH_SIZE records or HISTORY_FLUSH_MS milliseconds; beyond
+# HISTORY_QUEUE_SIZE queued submissions, requests wait up to
+# HISTORY_QUEUE_TIMEOUT seconds and then get 503.
+history_writer = None
+if os.environ.get("HISTORY_WRITE_BEHIND", "1") == "1":
+    history_writer = HistoryWriter(
+        store,
+        flush_size=int(os.environ.get("HISTORY_FLUSH_SIZE", 256)),
+        flush_interval_ms=float(os.environ.get("HISTORY_FLUSH_MS", 50)),
+        max_queue=int(os.environ.get("HISTORY_QUEUE_SIZE", 10000)),
+        put_timeout=float(os.environ.get("HISTORY_QUEUE_TIMEOUT", 1.0)),
+        id_block=int(os.environ.get("HISTORY_ID_BLOCK", 32)),
+    )
+
+# ------------- Authentication -------------
+# Password hashes run in a pool of AUTH_WORKERS threads; beyond AUTH_MAX_PENDING
+# queued hashes, logins get 503 instead of piling up behind a spike.
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get("AUTH_WORKERS", 2)),
+    max_pending=int(os.environ.get("AUTH_MAX_PENDING", 32)),
+)
+# AUTH_SECRET signs session tokens; without it a random secret is kept in
+# AUTH_SECRET_FILE so that every worker (and a restart) verifies the same tokens.
+token_signer = TokenSigner(
+    os.environ.get("AUTH_SECRET") or load_secret(os.environ.get("AUTH_SECRET_FILE", "auth_secret")),
+    ttl=int(os.environ.get("AUTH_TOKEN_TTL", 86400)),
+)
+# AUTH_REQUIRED=0 still accepts requests without a token (old clients)
+AUTH_REQUIRED = os.environ.get("AUTH_REQUIRED", "1") == "1"
+# After LOGIN_MAX_FAILURES wrong passwords within LOGIN_WINDOW seconds, further
+# logins to the account are refused (429) until the window ends
+LOGIN_MAX_FAILURES = int(os.environ.get("LOGIN_MAX_FAILURES", 5))
+LOGIN_WINDOW = float(os.environ.get("LOGIN_WINDOW", 300))
+
+
+def _authorize(username):
+    """
+    None if the request may act as username, else an error response. The
+    token comes from "Authorization: Bearer <token>".
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        if AUTH_REQUIRED:
+            return jsonify({'success': False, 'message': 'Authentication required'}), 401
+        return None
+    token_user = token_signer.verify(header[len('Bearer '):])
+    if token_user is None:
+        return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
+    if token_user != username:
+        return jsonify({'success': False, 'message': 'Token does not match user'}), 403
+    return None
+
+
+def _session(username):
+    token, expires_at = token_signer.issue(username)
+    return {'username': username, 'token': token, 'expires_at': expires_at}
+
+# ------------- Threshold anchors for long workouts -------------
+def build_anchor_store(bundle):
+    """
+    Memo of booster scores at Duration == threshold for one model version
+    (see anchor_store.py).
+
+    ANCHOR_CACHE_SIZE   - memoized anchors kept (0 disables the memo)
+    ANCHOR_QUANTUM      - e.g. 'Age=1,Height=1,Weight=1,Heart_Rate=1,Body_Temp=0.1';
+                          empty keeps exact keys (results identical to the booster)
+    ANCHOR_TOLERANCE    - accepted anchor error in kcal for quantized keys (default 1.0)
+    ANCHOR_PREWARM      - grid ranges, e.g. 'Gender=0:1,Age=18:80,...,Body_Temp=36:41.5'
+    ANCHOR_VERIFY=1     - check every hit against the exact path
+    """
+    store_ = AnchorStore(
+        bundle.columns, bundle.threshold, bundle.booster.inplace_predict,
+        max_size=int(os.environ.get("ANCHOR_CACHE_SIZE", 50000)),
+        quantum=parse_column_spec(os.environ.get("ANCHOR_QUANTUM")),
+        tolerance=float(os.environ.get("ANCHOR_TOLERANCE", 1.0)),
+        verify=os.environ.get("ANCHOR_VERIFY") == "1",
+    )
+
+    ranges = parse_column_spec(os.environ.get("ANCHOR_PREWARM"))
+    if ranges and store_.quantized:
+        try:
+            # Check the quantum against the tolerance on random rows in the grid
+            rng = np.random.default_rng(0)
+            sample = np.column_stack([
+                rng.uniform(*ranges.get(col, (0, 0)), 2000) for col in bundle.columns
+            ])
+            error = store_.validate(sample)
+            if error > store_.tolerance:
+                print(f"Anchor grid error {error:.3f} exceeds tolerance "
+                      f"{store_.tolerance}; using exact anchors")
+                store_.use_exact_keys()
+            else:
+                cells = store_.prewarm(ranges)
+                print(f"Pre-warmed {cells} threshold anchors (max error {error:.3f})")
+        except (KeyError, ValueError) as e:
+            print(f"Anchor pre-warm skipped: {e}")
+
+    bundle.anchor_store = store_
+
+
 # ------------- Load the ML model + metadata -------------
-try:
-    # ✅ Load XGBoost model saved as JSON
-    xgb = XGBRegressor()
-    xgb.load_model("xgb_model.json")
-
-    # ✅ Load metadata (threshold, slope, columns)
-    model_meta = joblib.load("model_meta.pkl")
-
-    DURATION_THRESHOLD = model_meta.get("threshold", 30)
-    slope = float(model_meta["slope"])
-    feature_columns = model_meta.get(
-        "columns",
-        ['Gender', 'Age', 'Height', 'Weight', 'Duration', 'Heart_Rate', 'Body_Temp']
+def _on_model_swap(new, old):
+    # Cached predictions belong to the old version
+    prediction_cache.clear()
+
+
+# The registry loads xgb_model.json + model_meta.pkl, validates them with a smoke
+# prediction and hot-swaps new versions found by its background watcher.
+# MODEL_POLL_INTERVAL=0 turns the watcher off; MODEL_NTHREAD caps booster threads.
+# MODEL_EVALUATOR=flat scores with the trees compiled to NumPy arrays (flat_model.py).
+registry = ModelRegistry(
+    model_dir=os.environ.get("MODEL_DIR", "."),
+    poll_interval=float(os.environ.get("MODEL_POLL_INTERVAL", 5)),
+    nthread=int(os.environ.get("MODEL_NTHREAD", 0)) or None,
+    evaluator=os.environ.get("MODEL_EVALUATOR", "xgboost"),
+    prepare=build_anchor_store,
+    on_swap=_on_model_swap,
+)
+registry.reload()
+
+
+# ------------- Instrumentation -------------
+# METRICS_DIR makes /metrics aggregate over all gunicorn workers (gunicorn.conf.py
+# sets it); without it the numbers are for the answering process only.
+metrics = MetricsRegistry(directory=os.environ.get("METRICS_DIR") or None)
+HTTP_REQUESTS = metrics.counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status',
+    ('endpoint', 'method', 'status'))
+HTTP_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint',))
+PREDICT_STAGE = metrics.histogram(
+    'predict_stage_seconds',
+    'Time spent in each stage of /api/predict; branch is long above the duration threshold',
+    ('stage', 'branch'))
+
+# Optional: profile a PROFILE_SAMPLE_RATE fraction of requests and keep the
+# profiles of those slower than PROFILE_SLOW_MS in PROFILE_DIR.
+slow_profiler = None
+if os.environ.get("PROFILE_SLOW_MS"):
+    slow_profiler = SlowRequestProfiler(
+        threshold_ms=float(os.environ["PROFILE_SLOW_MS"]),
+        sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0.01)),
+        directory=os.environ.get("PROFILE_DIR", "profiles"),
+        hook=lambda info: print(f"Slow request profiled: {info}"),
+    )
+
+# ------------- Shadow evaluation -------------
+# SHADOW_MODEL_DIR holds a candidate xgb_model.json + model_meta.pkl (watched and
+# hot-reloaded like the live model). A SHADOW_SAMPLE_RATE fraction of
+# /api/predict payloads is scored by the candidate in a background thread after
+# the response has been sent; the deltas are reported by /api/shadow.
+shadow = None
+if os.environ.get("SHADOW_MODEL_DIR"):
+    SHADOW_DELTA = metrics.histogram(
+        'shadow_abs_delta_kcal', '|shadow - primary| prediction for sampled requests',
+        ('branch',), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100))
+    shadow = ShadowEvaluator(
+        ModelRegistry(
+            model_dir=os.environ["SHADOW_MODEL_DIR"],
+            poll_interval=float(os.environ.get("MODEL_POLL_INTERVAL", 5)),
+            nthread=1,
+            evaluator=os.environ.get("MODEL_EVALUATOR", "xgboost"),
+        ),
+        lambda matrix, bundle: hybrid_predict_matrix(matrix, bundle),
+        sample_rate=float(os.environ.get("SHADOW_SAMPLE_RATE", 0.05)),
+        buffer_size=int(os.environ.get("SHADOW_BUFFER_SIZE", 10000)),
+        max_queue=int(os.environ.get("SHADOW_QUEUE_SIZE", 1000)),
+        on_delta=lambda delta, branch: SHADOW_DELTA.observe(abs(delta), branch),
     )
+    shadow.registry.reload()
+
+
+@app.before_request
+def _before_request():
+    # Started lazily so that a gunicorn master that preloads the app (and then
+    # forks) never owns the thread; this is a pid check once it is running.
+    registry.start_watcher()
+    if shadow is not None:
+        shadow.registry.start_watcher()
+    g.request_start = time.perf_counter()
+    g.profiler = slow_profiler.start() if slow_profiler is not None else None
+
 
-    print("XGBoost model and metadata loaded successfully!")
-except Exception as e:
-    print(f"Error loading model or metadata: {e}")
-    xgb = None
-    DURATION_THRESHOLD = 30
-    slope = 0.0
-    feature_columns = None
+@app.after_request
+def _after_request(response):
+    if COMPRESS_RESPONSES:
+        compress_response(response, request.accept_encodings, COMPRESS_MIN_BYTES,
+                          COMPRESS_GZIP_LEVEL, COMPRESS_BROTLI_QUALITY)
+    g.response_status = response.status_code
+    return response
 
-# Simple in-memory storage (use database in production)
-users = {}
-predictions_history = {}
 
-# ------------- Hybrid prediction helper -------------
-def hybrid_predict_from_features(features_dict):
+@app.teardown_request
+def _teardown_request(exc):
+    # Runs even when a view raised (after_request is then skipped), so every
+    # request is counted and a sampled profiler is always disabled again.
+    start = g.get('request_start')
+    if start is None:
+        return
+    g.request_start = None
+    duration = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    HTTP_REQUESTS.inc(endpoint, request.method, str(status))
+    HTTP_LATENCY.observe(duration, endpoint)
+    if slow_profiler is not None:
+        slow_profiler.finish(g.profiler, endpoint, duration)
+    metrics.maybe_flush()
+
+# ------------- Hybrid prediction helpers -------------
+def hybrid_predict_from_features(features_dict, bundle=None):
     """
     features_dict: dict with keys matching model input features
                    e.g. {'Gender': 0, 'Age': 61, 'Height': 179, ...}
+    bundle:        model version to use (defaults to the live one)
 
     Uses:
       - XGBoost for Duration <= threshold
       - Smooth continuation from XGBoost at threshold + slope * extra_time for Duration > threshold
+
+    The row is written by the model's FeatureSchema straight into a float32
+    buffer in feature_columns order (the booster works in float32 anyway) and
+    scored with inplace_predict, so no DataFrame is built on the request path.
     """
-    # Build single-row DataFrame from input dict
-    row_df = pd.DataFrame([features_dict])
+    bundle = bundle or registry.current
+    threshold = bundle.threshold
+    # Columns missing from features_dict get the schema default (0 unless the
+    # metadata says otherwise)
+    row = bundle.schema.encode(features_dict)
 
-    # Ensure all feature columns exist and are in correct order
-    for col in feature_columns:
-        if col not in row_df.columns:
-            # If some column was present during training but not in request, fill with 0
-            row_df[col] = 0
+    duration_value = float(features_dict.get('Duration', 0))
+    anchor_store = bundle.anchor_store
 
-    row_df = row_df[feature_columns]
+    if duration_value <= threshold:
+        return float(bundle.booster.inplace_predict(row)[0])
+    elif anchor_store is not None and anchor_store.enabled:
+        # Smooth continuation from the memoized XGBoost score at the threshold
+        anchors, missing, anchor_rows, keys = anchor_store.lookup(row)
+        if len(missing):
+            anchors[missing] = bundle.booster.inplace_predict(anchor_rows)
+            anchor_store.update(keys, anchors[missing])
+        extra_time = duration_value - threshold
+        return float(anchors[0]) + bundle.slope * extra_time
+    else:
+        # Smooth continuation from XGBoost at the threshold
+        row[0, bundle.duration_idx] = float(threshold)
+        base_at_thr = float(bundle.booster.inplace_predict(row)[0])
+        extra_time = duration_value - threshold
+        return base_at_thr + bundle.slope * extra_time
 
-    duration_value = float(row_df['Duration'].iloc[0])
 
-    if duration_value <= DURATION_THRESHOLD:
-        return float(xgb.predict(row_df)[0])
-    else:
-        # Smooth continuation from XGBoost at DURATION_THRESHOLD
-        row_thr = row_df.copy()
-        row_thr['Duration'] = float(DURATION_THRESHOLD)
-        base_at_thr = float(xgb.predict(row_thr)[0])
-        extra_time = duration_value - DURATION_THRESHOLD
-        return base_at_thr + slope * extra_time
+def cached_hybrid_predict(features_dict, bundle=None):
+    """
+    Single-row prediction behind the prediction cache. Misses are scored through
+    the micro-batcher when it is enabled, otherwise directly.
+    """
+    bundle = bundle or registry.current
+    if not prediction_cache.enabled:
+        return _score_single(features_dict, bundle)
+
+    key = (bundle.version,) + prediction_cache.make_key(features_dict, bundle.columns)
+    calories_burnt = prediction_cache.get(key)
+    if calories_burnt is None:
+        calories_burnt = _score_single(features_dict, bundle)
+        prediction_cache.put(key, calories_burnt)
+    return calories_burnt
+
+
+def _score_single(features_dict, bundle):
+    if batcher is not None:
+        return batcher.submit(features_dict, bundle).result(timeout=BATCH_RESULT_TIMEOUT)
+    if inference_pool is not None:
+        return float(_score_batch([features_dict], bundle)[0])
+    return hybrid_predict_from_features(features_dict, bundle)
+
+
+def _score_batch(features_list, bundle):
+    """MicroBatcher callback: one vectorized hybrid prediction per batch."""
+    return hybrid_predict_matrix(bundle.schema.encode_many(features_list), bundle)
+
+
+def _booster_scorer(bundle):
+    """Raw booster scoring for bundle: in the inference pool when it is enabled."""
+    if inference_pool is not None:
+        return inference_pool.scorer(model_spec(bundle))
+    return bundle.booster.inplace_predict
+
+
+def hybrid_predict_matrix(matrix, bundle=None):
+    """
+    matrix: 2-D float array, one workout per row, columns in bundle.columns order
+    bundle: model version to use (defaults to the live one)
+
+    Vectorized version of hybrid_predict_from_features. Short rows and the
+    threshold anchors that are not memoized yet are scored together in one
+    booster call (in the inference pool when it is enabled); the long rows are
+    then continued with slope * extra_time.
+    """
+    if len(matrix) == 0:
+        return np.empty(0, dtype=np.float64)
+
+    bundle = bundle or registry.current
+    score = _booster_scorer(bundle)
+    threshold = bundle.threshold
+    duration_idx = bundle.duration_idx
+    anchor_store = bundle.anchor_store
+    durations = matrix[:, duration_idx]
+    long_rows = durations > threshold
+
+    if anchor_store is None or not anchor_store.enabled or not long_rows.any():
+        return hybrid_predict(bundle, matrix, score)
+
+    short_idx = np.flatnonzero(~long_rows)
+    long_idx = np.flatnonzero(long_rows)
+    anchors, missing, anchor_rows, keys = anchor_store.lookup(matrix[long_idx])
+
+    scored = np.concatenate([matrix[short_idx].astype(np.float32), anchor_rows])
+    scores = score(scored) if len(scored) else np.empty(0)
+    if len(missing):
+        anchors[missing] = scores[len(short_idx):]
+        anchor_store.update(keys, scores[len(short_idx):])
+
+    predictions = np.empty(len(matrix), dtype=np.float64)
+    predictions[short_idx] = scores[:len(short_idx)]
+    predictions[long_idx] = anchors + bundle.slope * (durations[long_idx] - threshold)
+    return predictions
+
+
+def hybrid_predict_grid(matrix, bundle=None):
+    """
+    Hybrid predictions for a grid of workouts that share most features (sweeps).
+
+    Long rows are clamped to the threshold and identical rows are scored once,
+    so every long point of a duration curve shares one anchor prediction and
+    the whole grid is a single booster call over its distinct rows. Returns
+    (predictions, booster_rows).
+    """
+    bundle = bundle or registry.current
+    threshold = bundle.threshold
+    durations = np.asarray(matrix[:, bundle.duration_idx], dtype=np.float64)
+    long_rows = durations > threshold
+
+    scored = np.array(matrix, dtype=np.float32)
+    scored[long_rows, bundle.duration_idx] = threshold
+    distinct, inverse = np.unique(scored, axis=0, return_inverse=True)
+    predictions = _booster_scorer(bundle)(distinct).astype(np.float64)[inverse.ravel()]
+    predictions[long_rows] += bundle.slope * (durations[long_rows] - threshold)
+    return predictions, len(distinct)
+
+
+def parse_workout(data, bundle=None):
+    """
+    Convert a workout payload (as sent to /api/predict) into the model feature dict,
+    validated against the feature schema of the given model version (default: live).
+
+    Returns (features, gender_str). Raises SchemaError (a ValueError) naming the
+    field that is missing, non-numeric, out of range or not a known category.
+    """
+    return (bundle or registry.current).schema.parse(data)
+
+
+def make_prediction_record(gender_str, features, calories_burnt, model_version):
+    """Build the history entry stored for one prediction ('id' is set by the store or writer)."""
+    return {
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'gender': gender_str,
+        'age': features['Age'],
+        'height': features['Height'],
+        'weight': features['Weight'],
+        'duration': features['Duration'],
+        'heart_rate': features['Heart_Rate'],
+        'body_temp': features['Body_Temp'],
+        'calories_burnt': round(float(calories_burnt), 2),
+        'model_version': model_version
+    }
 
 
 @app.route('/api/register', methods=['POST'])
 def register():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Body must be a JSON object'}), 400
     username = data.get('username')
     password = data.get('password')
     
-    if username in users:
+    if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+        return jsonify({'success': False, 'message': 'Username and password are required'}), 400
+    
+    # Cheap existence check first so that duplicates don't cost a hash
+    if store.get_password(username) is not None:
+        return jsonify({'success': False, 'message': 'User already exists'}), 400
+    
+    try:
+        password_hash = password_hasher.hash(password)
+    except AuthBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
+    
+    if not store.create_user(username, password_hash):
         return jsonify({'success': False, 'message': 'User already exists'}), 400
     
-    users[username] = password
-    predictions_history[username] = []
-    return jsonify({'success': True, 'message': 'Registration successful'}), 201
+    return jsonify({'success': True, 'message': 'Registration successful',
+                    **_session(username)}), 201
 
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Body must be a JSON object'}), 400
     username = data.get('username')
     password = data.get('password')
     
-    if username not in users:
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({'success': False, 'message': 'Username and password are required'}), 400
+    
+    stored_password = store.get_password(username)
+    if stored_password is None:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    if users[username] != password:
+    # Rate limit before hashing, so that guessing costs the server nothing. The
+    # attempt counts as a failure until the password checks out.
+    now = time.time()
+    allowed, window_start = store.begin_login_attempt(username, now, LOGIN_WINDOW,
+                                                      LOGIN_MAX_FAILURES)
+    if not allowed:
+        retry_after = int(window_start + LOGIN_WINDOW - now) + 1
+        return jsonify({
+            'success': False,
+            'message': f'Too many failed logins, try again in {retry_after} seconds'
+        }), 429, {'Retry-After': str(retry_after)}
+    
+    try:
+        valid = password_hasher.verify(password, stored_password)
+        if valid and password_hasher.needs_rehash(stored_password):
+            # Accounts created before hashing (or with older parameters)
+            store.set_password(username, password_hasher.hash(password))
+    except AuthBusyError as e:
+        store.cancel_login_attempt(username)
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
+    
+    if not valid:
         return jsonify({'success': False, 'message': 'Invalid password'}), 401
     
-    return jsonify({'success': True, 'message': 'Login successful', 'username': username}), 200
+    store.clear_login_failures(username)
+    
+    return jsonify({'success': True, 'message': 'Login successful', **_session(username)}), 200
 
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
     # lin is no longer needed, we use slope from metadata
-    if xgb is None or feature_columns is None:
+    bundle = registry.current
+    if bundle is None:
         return jsonify({'success': False, 'message': 'Model not loaded'}), 500
     
     try:
-        data = request.json
-        username = data.get('username')
+        t_start = time.perf_counter()
+        data = request.get_json(silent=True)
+        username = data.get('username') if isinstance(data, dict) else None
+        t_parsed = time.perf_counter()
         
-        # Extract features from request
-        gender_str = data.get('gender')
-        # NOTE: make sure this matches your training encoding:
-        # here: male -> 0, female -> 1
-        gender = 0 if gender_str == 'male' else 1
-
-        age = float(data.get('age'))
-        height = float(data.get('height'))
-        weight = float(data.get('weight'))
-        duration = float(data.get('duration'))
-        heart_rate = float(data.get('heart_rate'))
-        body_temp = float(data.get('body_temp'))
+        if username is not None:
+            denied = _authorize(username)
+            if denied is not None:
+                return denied
         
-        # Create feature dict (names must match training columns)
-        features = {
-            'Gender': gender,
-            'Age': age,
-            'Height': height,
-            'Weight': weight,
-            'Duration': duration,
-            'Heart_Rate': heart_rate,
-            'Body_Temp': body_temp
-        }
+        # Extract features from request
+        features, gender_str = parse_workout(data, bundle)
+        branch = 'long' if features['Duration'] > bundle.threshold else 'short'
+        t_features = time.perf_counter()
         
         # Make prediction using hybrid model
-        calories_burnt = hybrid_predict_from_features(features)
+        calories_burnt = cached_hybrid_predict(features, bundle)
+        t_predicted = time.perf_counter()
         
         # Store prediction in history
-        prediction_record = {
-            'id': len(predictions_history.get(username, [])) + 1,
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'gender': gender_str,
-            'age': age,
-            'height': height,
-            'weight': weight,
-            'duration': duration,
-            'heart_rate': heart_rate,
-            'body_temp': body_temp,
-            'calories_burnt': round(float(calories_burnt), 2)
-        }
-        
-        if username not in predictions_history:
-            predictions_history[username] = []
+        prediction_record = make_prediction_record(
+            gender_str, features, calories_burnt, bundle.version
+        )
         
-        predictions_history[username].append(prediction_record)
+        if username is not None:
+            if history_writer is not None:
+                # Gets its id now; written by the background writer
+                history_writer.submit(username, [prediction_record])
+            else:
+                store.add_predictions(username, [prediction_record])
+        t_stored = time.perf_counter()
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'calories_burnt': round(float(calories_burnt), 2),
             'prediction': prediction_record
-        }), 200
+        })
+        if shadow is not None and shadow.should_sample():
+            # Runs once the response has been sent; only queues the payload
+            response.call_on_close(lambda: shadow.submit(data, calories_burnt, bundle))
+        t_serialized = time.perf_counter()
+
+        PREDICT_STAGE.observe(t_parsed - t_start, 'parse', branch)
+        PREDICT_STAGE.observe(t_features - t_parsed, 'features', branch)
+        PREDICT_STAGE.observe(t_predicted - t_features, 'predict', branch)
+        PREDICT_STAGE.observe(t_stored - t_predicted, 'history', branch)
+        PREDICT_STAGE.observe(t_serialized - t_stored, 'serialize', branch)
+        return response, 200
         
+    except SchemaError as e:
+        return jsonify({'success': False, 'message': str(e), 'field': e.field}), 400
+    except SCORING_UNAVAILABLE as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/api/history/<username>', methods=['GET'])
-def get_history(username):
-    if username not in predictions_history:
-        return jsonify({'success': True, 'history': []}), 200
-    
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Score many workouts in one vectorized booster call.
+
+    Body: {"username": "...", "workouts": [{gender, age, height, ...}, ...]}
+    Each workout gets its own entry in "results"; rows that fail to parse are
+    reported there with success=False and do not stop the rest of the batch.
+    """
+    bundle = registry.current
+    if bundle is None:
+        return jsonify({'success': False, 'message': 'Model not loaded'}), 500
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Body must be a JSON object'}), 400
+    username = data.get('username')
+    workouts = data.get('workouts')
+
+    if username is not None:
+        denied = _authorize(username)
+        if denied is not None:
+            return denied
+
+    if not isinstance(workouts, list):
+        return jsonify({'success': False, 'message': "'workouts' must be a list"}), 400
+    if len(workouts) > MAX_BATCH_SIZE:
+        return jsonify({
+            'success': False,
+            'message': f'Batch too large (max {MAX_BATCH_SIZE} workouts)'
+        }), 413
+
+    try:
+        results = [None] * len(workouts)
+        parsed = []          # (index, features, gender_str) for valid rows
+        for i, workout in enumerate(workouts):
+            try:
+                features, gender_str = parse_workout(workout, bundle)
+                parsed.append((i, features, gender_str))
+            except SchemaError as e:
+                results[i] = {'index': i, 'success': False, 'message': str(e), 'field': e.field}
+
+        matrix = bundle.schema.encode_many([features for _, features, _ in parsed])
+        calories = hybrid_predict_matrix(matrix, bundle)
+
+        records = []
+        for (i, features, gender_str), calories_burnt in zip(parsed, calories):
+            record = make_prediction_record(gender_str, features, calories_burnt, bundle.version)
+            records.append(record)
+            results[i] = {
+                'index': i,
+                'success': True,
+                'calories_burnt': record['calories_burnt'],
+                'prediction': record
+            }
+
+        # Ids are filled in now; the records are written together, in one
+        # transaction, by the background writer or right here
+        if username is not None:
+            if history_writer is not None:
+                history_writer.submit(username, records)
+            else:
+                store.add_predictions(username, records)
+
+        return jsonify({
+            'success': True,
+            'count': len(records),
+            'errors': len(workouts) - len(records),
+            'results': results
+        }), 200
+
+    except SCORING_UNAVAILABLE as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+STREAM_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+@app.route('/api/predict/stream', methods=['POST'])
+def predict_stream():
+    """
+    Score a CSV or NDJSON body of any size; see bulk_scoring.py.
+
+    The input format comes from ?format=csv|ndjson or the Content-Type
+    (text/csv, application/x-ndjson); ?output= picks the response format
+    (default: same as the input). The body is read and answered in chunks of
+    STREAM_CHUNK_SIZE rows, and predictions are not added to any history.
+    """
+    bundle = registry.current
+    if bundle is None:
+        return jsonify({'success': False, 'message': 'Model not loaded'}), 500
+
+    input_format = request.args.get('format')
+    if input_format is None:
+        input_format = 'ndjson' if 'json' in (request.mimetype or '') else 'csv'
+    output_format = request.args.get('output', input_format)
+    if input_format not in STREAM_MIMETYPES or output_format not in STREAM_MIMETYPES:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+
+    # Line by line straight off the WSGI input, never the whole body at once
+    lines = codecs.iterdecode(iter(request.stream.readline, b''), 'utf-8', 'replace')
+    try:
+        rows = bulk_scoring.READERS[input_format](lines, bundle.schema.required_fields)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    chunks = bulk_scoring.score_stream(
+        rows, lambda payload: parse_workout(payload, bundle),
+        lambda features_list: _score_batch(features_list, bundle),
+        output_format=output_format, chunk_size=STREAM_CHUNK_SIZE,
+    )
+    return app.response_class(
+        stream_with_context(chunks), mimetype=STREAM_MIMETYPES[output_format],
+        headers={'X-Model-Version': bundle.version}
+    )
+
+
+# Request fields a sweep may vary, and the largest grid it may ask for
+SWEEP_FIELDS = ('duration', 'heart_rate')
+SWEEP_MAX_POINTS = int(os.environ.get("SWEEP_MAX_POINTS", 2500))
+
+
+def _sweep_values(field, spec):
+    """Axis values from [v, ...], {"values": [...]} or {"start", "stop", "step"} (stop inclusive)."""
+    try:
+        if isinstance(spec, dict) and 'values' not in spec:
+            start, stop = float(spec['start']), float(spec['stop'])
+            step = float(spec.get('step', 1))
+            if not step > 0:
+                raise SchemaError(field, f"Invalid sweep for '{field}': step must be positive")
+            ratio = (stop - start) / step
+            if not np.isfinite(ratio):
+                raise SchemaError(field, f"Invalid sweep for '{field}': start, stop and step "
+                                         f"must give a finite number of points")
+            count = int(np.floor(ratio + 1e-9)) + 1
+            if count < 1:
+                raise SchemaError(field, f"Invalid sweep for '{field}': stop is below start")
+            if count > SWEEP_MAX_POINTS:
+                raise SchemaError(field, f"Sweep too large (max {SWEEP_MAX_POINTS} points)")
+            return np.round(start + step * np.arange(count), 6)
+        values = spec['values'] if isinstance(spec, dict) else spec
+        if not isinstance(values, list) or not values:
+            raise SchemaError(field, f"Invalid sweep for '{field}': values must be a non-empty list")
+        values = np.array([float(v) for v in values], dtype=np.float64)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        if isinstance(e, SchemaError):
+            raise
+        raise SchemaError(field, f"Invalid sweep for '{field}': {e}") from None
+    if len(values) > SWEEP_MAX_POINTS:
+        raise SchemaError(field, f"Sweep too large (max {SWEEP_MAX_POINTS} points)")
+    return values
+
+
+@app.route('/api/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """
+    What-if curves: predictions for a base profile over one or two swept fields.
+
+    Body: {"profile": {gender, age, height, weight, body_temp, ...},
+           "sweep": {"duration": {"start": 10, "stop": 90, "step": 5},
+                     "heart_rate": [90, 110, 130]}}
+
+    Returns "axes" in request order and "calories", a list (one axis) or a list
+    of lists indexed [first axis][second axis]. Read-only: nothing is written
+    to the history.
+    """
+    bundle = registry.current
+    if bundle is None:
+        return jsonify({'success': False, 'message': 'Model not loaded'}), 500
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('profile'), dict) \
+            or not isinstance(data.get('sweep'), dict):
+        return jsonify({'success': False,
+                        'message': "Body must have a 'profile' object and a 'sweep' object"}), 400
+    sweep = data['sweep']
+    unknown = [field for field in sweep if field not in SWEEP_FIELDS]
+    if unknown or not 1 <= len(sweep) <= 2:
+        return jsonify({'success': False, 'message':
+                        f"'sweep' takes one or two of: {', '.join(SWEEP_FIELDS)}"}), 400
+
+    try:
+        axes = [(field, _sweep_values(field, spec)) for field, spec in sweep.items()]
+        if np.prod([len(values) for _, values in axes]) > SWEEP_MAX_POINTS:
+            raise SchemaError(None, f'Sweep too large (max {SWEEP_MAX_POINTS} points)')
+        # The schema's limits are ranges, so checking both ends of every axis
+        # validates the whole grid
+        base = dict(data['profile'], **{field: values[0] for field, values in axes})
+        for field, values in axes:
+            parse_workout(dict(base, **{field: values.min()}), bundle)
+            parse_workout(dict(base, **{field: values.max()}), bundle)
+        features, _ = parse_workout(base, bundle)
+    except SchemaError as e:
+        return jsonify({'success': False, 'message': str(e), 'field': e.field}), 400
+
+    try:
+        grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+        matrix = np.repeat(bundle.schema.encode_many([features]), grids[0].size, axis=0)
+        field_columns = dict(zip(bundle.schema.fields, bundle.columns))
+        for (field, _), grid in zip(axes, grids):
+            matrix[:, bundle.columns.index(field_columns[field])] = grid.ravel()
+        predictions, booster_rows = hybrid_predict_grid(matrix, bundle)
+    except SCORING_UNAVAILABLE as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
     return jsonify({
         'success': True,
-        'history': predictions_history[username]
+        'model_version': bundle.version,
+        'threshold': bundle.threshold,
+        'axes': [{'field': field, 'values': values.tolist()} for field, values in axes],
+        'calories': np.round(predictions, 2).reshape(grids[0].shape).tolist(),
+        'points': int(grids[0].size),
+        'booster_rows': booster_rows
     }), 200
 
 
+@app.route('/api/history/<username>', methods=['GET'])
+def get_history(username):
+    """
+    Optional query parameters:
+      limit    - page size; the response then carries next_cursor (null on the last page)
+      order    - asc (default, oldest first) or desc (newest first)
+      cursor   - next_cursor of the previous page: records with seq > cursor,
+                 or seq < cursor with order=desc (alias: since_id)
+      from, to - inclusive date bounds, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'
+
+    Records come in commit order. Their seq numbers that order (see
+    storage.py), and cursors refer to it rather than to ids: with several
+    workers, ids reserved ahead can commit out of order. Records still queued
+    in this process carry seq null; they follow the last page, or lead the
+    first one with order=desc (any that do not fit it show up once committed).
+
+    Responses carry an ETag derived from the user's newest record id, so an
+    unchanged history answers If-None-Match with 304 and no body (compared
+    weakly: a compressed response carries the ETag as W/"...").
+    """
+    denied = _authorize(username)
+    if denied is not None:
+        return denied
+
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'success': False, 'message': 'order must be asc or desc'}), 400
+    descending = order == 'desc'
+    try:
+        limit = _query_arg('limit', _positive_int)
+        cursor = _query_arg('cursor', _non_negative_int)
+        if cursor is None:
+            cursor = _query_arg('since_id', _non_negative_int)
+        date_from = _query_arg('from', _date_bound)
+        date_to = _query_arg('to', _date_bound_end)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # Read-your-writes: this process's queued records are merged in. Taken
+    # before the query, so a record committed in between shows up once, not never.
+    pending = history_writer.pending(username) if history_writer is not None else []
+    last_id, count = store.get_history_version(username)
+    pending_ids = ','.join(str(r['id']) for r in pending)
+    etag = hashlib.sha1(
+        f'{username}:{last_id}:{count}:{pending_ids}:{request.query_string.decode()}'.encode()
+    ).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    stored = store.get_history(username, limit=limit, date_from=date_from, date_to=date_to,
+                               after_seq=None if descending else cursor,
+                               before_seq=cursor if descending else None,
+                               descending=descending)
+    history = stored
+    if pending:
+        history = _merge_pending(stored, pending, limit, date_from, date_to,
+                                 descending, first_page=cursor is None)
+    payload = {'success': True, 'history': history}
+    if limit is not None:
+        payload['next_cursor'] = _next_cursor(stored, history, limit)
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
+
+
+def _merge_pending(stored, pending, limit, date_from, date_to, descending, first_page):
+    """
+    Stored records plus matching queued ones. Queued records commit after
+    everything stored: they follow the last stored page, or lead the first
+    page newest first.
+    """
+    ids = {r['id'] for r in stored}         # committed since pending() was read
+    queued = [dict(r, seq=None) for r in pending
+              if r['id'] not in ids
+              and (date_from is None or r['date'] >= date_from)
+              and (date_to is None or r['date'] <= date_to)]
+    if descending:
+        merged = queued[::-1] + stored if first_page else stored
+    elif limit is None or len(stored) < limit:
+        merged = stored + queued
+    else:
+        merged = stored
+    return merged[:limit] if limit is not None else merged
+
+
+def _next_cursor(stored, page, limit):
+    """Cursor continuing after page; None once the stored records are exhausted."""
+    shown = [r for r in page if r['seq'] is not None]
+    if len(shown) < len(stored):
+        # Queued records pushed stored ones off a newest-first page: resume there
+        return shown[-1]['seq'] if shown else stored[0]['seq'] + 1
+    return stored[-1]['seq'] if len(stored) == limit else None
+
+
+def _query_arg(name, convert):
+    """Converted query parameter, None if absent; ValueError names the bad parameter."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        raise ValueError(f"invalid value for '{name}': {value!r}")
+
+
+def _positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise ValueError(value)
+    return number
+
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+
+def _date_bound(value):
+    """Validate a 'YYYY-MM-DD[ HH:MM:SS]' bound and return it as a comparable string."""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            datetime.strptime(value, fmt)
+            return value
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+
+def _date_bound_end(value):
+    """Upper bound: a bare date covers the whole day."""
+    value = _date_bound(value)
+    return value + ' 23:59:59' if len(value) == 10 else value
+
+
+# Largest ?days= accepted by /api/statistics (about ten years of daily totals)
+MAX_STATISTICS_DAYS = 3660
+
+
+def _statistics_days(value):
+    days = _non_negative_int(value)
+    if days > MAX_STATISTICS_DAYS:
+        raise ValueError(value)
+    return days
+
+
 @app.route('/api/statistics/<username>', methods=['GET'])
 def get_statistics(username):
-    if username not in predictions_history or not predictions_history[username]:
+    """
+    Served from running aggregates kept by the store, so the cost does not grow
+    with the size of the history. ?days=N (0 to MAX_STATISTICS_DAYS) adds
+    per-day totals for the last N days.
+
+    ?from= / ?to= ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS', inclusive) restrict the
+    statistics to a date range; those are reduced over the range's columns
+    (HistoryColumns.summary) since the running aggregates cover all time.
+    """
+    denied = _authorize(username)
+    if denied is not None:
+        return denied
+
+    try:
+        date_from = _query_arg('from', _date_bound)
+        date_to = _query_arg('to', _date_bound_end)
+        days = _query_arg('days', _statistics_days)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if date_from is None and date_to is None:
+        aggregates = store.get_statistics(username)
+    else:
+        aggregates = store.get_history_columns(username, date_from=date_from,
+                                               date_to=date_to).summary()
+    if aggregates is None:
         return jsonify({
             'success': True,
             'statistics': {
                 'total_predictions': 0,
+                'total_calories': 0,
                 'avg_calories': 0,
                 'max_calories': 0,
                 'min_calories': 0,
@@ -193,22 +1013,166 @@ def get_statistics(username):
             }
         }), 200
     
-    history = predictions_history[username]
-    calories = [p['calories_burnt'] for p in history]
-    durations = [p['duration'] for p in history]
-    
+    count = aggregates['count']
     statistics = {
-        'total_predictions': len(history),
-        'avg_calories': round(sum(calories) / len(calories), 2),
-        'max_calories': round(max(calories), 2),
-        'min_calories': round(min(calories), 2),
-        'total_duration': round(sum(durations), 2),
-        'avg_duration': round(sum(durations) / len(durations), 2)
+        'total_predictions': count,
+        'total_calories': round(aggregates['sum_calories'], 2),
+        'avg_calories': round(aggregates['sum_calories'] / count, 2),
+        'max_calories': round(aggregates['max_calories'], 2),
+        'min_calories': round(aggregates['min_calories'], 2),
+        'total_duration': round(aggregates['sum_duration'], 2),
+        'avg_duration': round(aggregates['sum_duration'] / count, 2),
+        'std_calories': round(aggregates['var_calories'] ** 0.5, 2)
     }
+
+    if days:
+        since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        statistics['daily'] = [
+            {
+                'day': d['day'],
+                'total_predictions': d['count'],
+                'total_calories': round(d['sum_calories'], 2),
+                'total_duration': round(d['sum_duration'], 2)
+            }
+            for d in store.get_daily_totals(username, since)
+        ]
     
     return jsonify({'success': True, 'statistics': statistics}), 200
 
 
+# Buckets returned by /api/timeseries when no limit is given
+TIMESERIES_DEFAULT_LIMIT = 366
+
+
+@app.route('/api/timeseries/<username>', methods=['GET'])
+def get_timeseries(username):
+    """
+    Calories over time from the store's rollups (one point per bucket).
+
+    Query parameters:
+      granularity - day (default), week or month; buckets start on the day,
+                    the Monday or the 1st
+      from, to    - 'YYYY-MM-DD' bounds (the buckets containing them are included)
+      limit       - most recent buckets to return (default 366)
+    """
+    denied = _authorize(username)
+    if denied is not None:
+        return denied
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({
+            'success': False,
+            'message': f"granularity must be one of {', '.join(GRANULARITIES)}"
+        }), 400
+    try:
+        limit = _query_arg('limit', _positive_int)
+        date_from = _query_arg('from', _date_bound)
+        date_to = _query_arg('to', _date_bound)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    buckets = store.get_timeseries(
+        username, granularity, date_from, date_to,
+        limit if limit is not None else TIMESERIES_DEFAULT_LIMIT
+    )
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'points': [
+            {
+                'bucket': b['bucket'],
+                'total_predictions': b['count'],
+                'total_calories': round(b['sum_calories'], 2),
+                'avg_calories': round(b['sum_calories'] / b['count'], 2),
+                'total_duration': round(b['sum_duration'], 2)
+            }
+            for b in buckets
+        ]
+    }), 200
+
+
+@app.route('/api/runtime', methods=['GET'])
+def get_runtime():
+    """Counters for the in-process serving components."""
+    return jsonify({
+        'success': True,
+        'prediction_cache': prediction_cache.stats(),
+        'anchor_store': (registry.current.anchor_store.stats()
+                         if registry.current is not None else None),
+        'model': registry.info(),
+        'batching': batcher.stats() if batcher is not None else None,
+        'inference_pool': inference_pool.stats() if inference_pool is not None else None,
+        'auth': password_hasher.stats(),
+        'history_writer': history_writer.stats() if history_writer is not None else None,
+        'serialization': {
+            'json': getattr(app.json, 'encoder', 'stdlib'),
+            'encodings': list(supported_encodings()) if COMPRESS_RESPONSES else []
+        }
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition, summed over all workers sharing METRICS_DIR."""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ------------- Model administration -------------
+def _admin_allowed():
+    """Model admin endpoints require ADMIN_TOKEN to be set and sent as X-Admin-Token."""
+    token = os.environ.get("ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(
+        request.headers.get('X-Admin-Token', ''), token
+    )
+
+
+@app.route('/api/model', methods=['GET'])
+def get_model():
+    return jsonify({'success': True, 'model': registry.info()}), 200
+
+
+@app.route('/api/model/reload', methods=['POST'])
+def reload_model():
+    if not _admin_allowed():
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    swapped = registry.reload(force=True)
+    if registry.last_error:
+        return jsonify({'success': False, 'message': registry.last_error}), 500
+    return jsonify({'success': True, 'swapped': swapped, 'model': registry.info()}), 200
+
+
+@app.route('/api/model/rollback', methods=['POST'])
+def rollback_model():
+    if not _admin_allowed():
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    if registry.rollback() is None:
+        return jsonify({'success': False, 'message': 'No previous model version'}), 409
+    return jsonify({'success': True, 'model': registry.info()}), 200
+
+
+@app.route('/api/shadow', methods=['GET'])
+def get_shadow():
+    """Candidate vs live deltas; ?recent=N also returns the last N comparisons."""
+    if shadow is None:
+        return jsonify({'success': False, 'message': 'Shadow evaluation is disabled'}), 404
+    try:
+        recent = min(max(int(request.args.get('recent', 0)), 0), shadow.ring.capacity)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'recent must be an integer'}), 400
+    return jsonify({'success': True, 'shadow': shadow.summary(recent)}), 200
+
+
+@app.route('/api/shadow/reset', methods=['POST'])
+def reset_shadow():
+    if not _admin_allowed():
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    if shadow is None:
+        return jsonify({'success': False, 'message': 'Shadow evaluation is disabled'}), 404
+    shadow.reset()
+    return jsonify({'success': True}), 200
+
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
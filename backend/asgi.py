@@ -0,0 +1,208 @@
+"""
+ASGI entry point: the same Flask app (app.py) served from an event loop.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+
+Every route, status code and JSON body is the one app.py produces. The bridge
+only changes where the waiting happens:
+
+- The event loop reads request bodies (up to ASGI_BUFFER_BYTES) and writes
+  responses. A slow upload or a slow history download costs a suspended
+  coroutine, not a thread.
+- Flask runs in thread pools once a request is fully read, so nothing ever
+  blocks the loop. /api/predict* routes (parsing, validation, booster calls)
+  go to the CPU pool of ASGI_CPU_THREADS threads. Everything else (history,
+  statistics, auth, model admin) goes to the I/O pool of ASGI_IO_THREADS
+  threads, so a burst of predictions cannot starve the dashboard reads and
+  vice versa. With INFERENCE_WORKERS > 0 the booster calls still leave the
+  process (inference_pool.py).
+- Responses with a Content-Length are collected in the pool thread and sent
+  from the loop. Streamed responses (/api/predict/stream) are pulled one chunk
+  at a time: each next() on the body runs as its own pool task, and the loop
+  awaits the send before asking for the next chunk. While a slow reader
+  drains a chunk, no pool thread is held, so it holds back its own stream
+  and nothing else. All of a request's pool tasks run in one
+  contextvars.Context, which keeps Flask's request context (pushed by
+  stream_with_context) valid from chunk to chunk.
+- Bodies larger than ASGI_BUFFER_BYTES are not held in memory: the pool thread
+  pulls the rest from the loop as Flask reads it.
+- Lifespan shutdown drains the history write-behind queue, as gunicorn's
+  worker_exit hook does.
+
+With several workers, set METRICS_DIR to a shared directory so that /metrics
+sums over them (gunicorn.conf.py does this for gunicorn).
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+
+# Routes that run in the CPU pool; every other path runs in the I/O pool
+CPU_PATH_PREFIXES = ('/api/predict',)
+
+
+class _ReceiveStream(io.RawIOBase):
+    """wsgi.input: the buffered start of the body, then the rest from the loop."""
+
+    def __init__(self, head, more, receive, loop):
+        self._chunk = memoryview(head)
+        self._more = more
+        self._receive = receive
+        self._loop = loop
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                raise OSError('client disconnected')
+            self._chunk = memoryview(message.get('body', b''))
+            self._more = message.get('more_body', False)
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+
+class AsgiBridge:
+    """ASGI application running a WSGI app in CPU / I/O thread pools."""
+
+    def __init__(self, wsgi_app, cpu_threads=None, io_threads=32, buffer_bytes=1 << 20):
+        self.wsgi_app = wsgi_app
+        self.cpu_executor = ThreadPoolExecutor(cpu_threads or os.cpu_count() or 1,
+                                               thread_name_prefix='asgi-cpu')
+        self.io_executor = ThreadPoolExecutor(io_threads, thread_name_prefix='asgi-io')
+        self.buffer_bytes = buffer_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                loop = asyncio.get_running_loop()
+                if app_module.history_writer is not None:
+                    await loop.run_in_executor(self.io_executor, app_module.history_writer.close)
+                self.cpu_executor.shutdown(wait=False)
+                self.io_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body, more = [], True
+        size = 0
+        while more and size < self.buffer_bytes:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            size += len(body[-1])
+            more = message.get('more_body', False)
+        environ = self._environ(scope, _ReceiveStream(b''.join(body), more, receive, loop))
+
+        executor = (self.cpu_executor if scope['path'].startswith(CPU_PATH_PREFIXES)
+                    else self.io_executor)
+        # Every pool task of this request runs in the same context (see above)
+        context = contextvars.copy_context()
+
+        def in_pool(fn, *args):
+            return loop.run_in_executor(executor, context.run, fn, *args)
+
+        status, headers, chunks, iterator = await in_pool(self._run, environ)
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if iterator is None:
+                await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+                return
+            while True:
+                chunk = await in_pool(next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                await in_pool(close)
+
+    def _run(self, environ):
+        """
+        Call the WSGI app in a pool thread. A response with a Content-Length is
+        collected and returned as (status, headers, chunks, None); any other is
+        returned as (status, headers, iterable, iterator) for _http to pull.
+        """
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                  for name, value in response_headers]
+            return lambda data: None             # write() is not used by Flask
+
+        iterable = self.wsgi_app(environ, start_response)
+        if any(name == b'content-length' for name, _ in started['headers']):
+            return started['status'], started['headers'], _Chunks(iterable), None
+        return started['status'], started['headers'], iterable, iter(iterable)
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BufferedReader(body),
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for raw_name, raw_value in scope['headers']:
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name in environ:
+                value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+            environ[name] = value
+        return environ
+
+
+class _Chunks(list):
+    """A buffered response body that still closes the app's iterable (call_on_close)."""
+
+    def __init__(self, iterable):
+        super().__init__(iterable)
+        self.close = getattr(iterable, 'close', None)
+
+
+application = AsgiBridge(
+    app_module.app,
+    cpu_threads=int(os.environ.get("ASGI_CPU_THREADS", 0)) or None,
+    io_threads=int(os.environ.get("ASGI_IO_THREADS", 32)),
+    buffer_bytes=int(os.environ.get("ASGI_BUFFER_BYTES", 1 << 20)),
+)
@@ -0,0 +1,194 @@
+"""
+Password hashing and stateless session tokens.
+
+Passwords are hashed with scrypt (``hashlib.scrypt``, backed by OpenSSL). One
+hash costs tens of milliseconds of CPU. To keep a spike of logins from starving
+prediction traffic, hashes run in a small bounded thread pool:
+
+- hashlib.scrypt releases the GIL, so other request threads keep running
+  while a hash is computed;
+- at most ``workers`` hashes run at the same time, whatever the number of
+  concurrent logins;
+- when ``max_pending`` hashes are already queued, new ones fail at once with
+  AuthBusyError rather than queueing behind the spike; a hash that does not
+  finish within ``timeout`` seconds fails with AuthBusyError too.
+
+Session tokens are ``<payload>.<signature>``. The payload is url-safe base64 of
+``{"u": username, "exp": unix_time}`` and the signature is an HMAC-SHA256 of it
+with the server secret. Verifying a token is one base64 decode and one HMAC,
+with no store lookup.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+SCHEME = 'scrypt'
+
+
+class AuthBusyError(Exception):
+    """Raised when the hashing pool is full (max_pending jobs queued) or too slow (timeout)."""
+
+
+class PasswordHasher:
+    """scrypt hashing in a bounded pool. Stored form: scrypt$n$r$p$salt$hash."""
+
+    def __init__(self, n=2 ** 14, r=8, p=1, workers=2, max_pending=32, timeout=30.0):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.max_pending = max_pending
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()          # pool creation and the counters
+
+        self.hashes = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+
+    # ------------- pool -------------
+    def _executor(self):
+        # Threads don't survive fork(): one pool per process, created on first use
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='kdf')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _derive(self, password, salt, n, r, p):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise AuthBusyError('too many password checks in progress')
+        try:
+            future = self._executor().submit(self._scrypt, password, salt, n, r, p)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                # The hash keeps running in the pool; the caller answers 503
+                with self._lock:
+                    self.timeouts += 1
+                raise AuthBusyError('password check timed out') from None
+        finally:
+            self._slots.release()
+
+    def _scrypt(self, password, salt, n, r, p):
+        start = time.perf_counter()
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                                maxmem=256 * n * r + (1 << 20), dklen=32)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.hashes += 1
+            self.total_seconds += elapsed
+        return digest
+
+    # ------------- hashing -------------
+    def hash(self, password):
+        """Encoded hash of password, with a fresh random salt."""
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return '$'.join((SCHEME, str(self.n), str(self.r), str(self.p),
+                         _b64encode(salt), _b64encode(digest)))
+
+    def verify(self, password, encoded):
+        """
+        True if password matches encoded. Values stored before hashing was
+        introduced (plain text) are compared directly; see needs_rehash().
+        """
+        if not encoded.startswith(SCHEME + '$'):
+            return hmac.compare_digest(password.encode(), encoded.encode())
+        try:
+            _, n, r, p, salt, digest = encoded.split('$')
+            expected = _b64decode(digest)
+            actual = self._derive(password, _b64decode(salt), int(n), int(r), int(p))
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, encoded):
+        """True for plain-text values and hashes made with other parameters."""
+        prefix = '$'.join((SCHEME, str(self.n), str(self.r), str(self.p))) + '$'
+        return not encoded.startswith(prefix)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'hashes': self.hashes,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'avg_hash_ms': (round(self.total_seconds / self.hashes * 1000.0, 3)
+                            if self.hashes else 0.0),
+        }
+
+
+class TokenSigner:
+    """Issues and verifies HMAC-signed session tokens."""
+
+    def __init__(self, secret, ttl=86400):
+        self._key = secret.encode() if isinstance(secret, str) else secret
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, username):
+        """Return (token, expires_at) for username."""
+        expires_at = int(time.time()) + self.ttl
+        payload = _b64encode(json.dumps({'u': username, 'exp': expires_at},
+                                        separators=(',', ':')).encode())
+        return f'{payload}.{self._sign(payload)}', expires_at
+
+    def verify(self, token):
+        """Username the token was issued to, or None if it is forged or expired."""
+        payload, _, signature = token.partition('.')
+        # Compared as bytes: compare_digest rejects str with non-ASCII characters
+        if not signature or not hmac.compare_digest(signature.encode(),
+                                                    self._sign(payload).encode()):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if claims.get('exp', 0) < time.time():
+            return None
+        return claims.get('u')
+
+
+def load_secret(path):
+    """
+    Read the token secret from path, creating it on first use. O_EXCL makes
+    workers that start at the same time agree on a single secret.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path) as f:
+                secret = f.read().strip()
+            if secret:
+                return secret
+            time.sleep(0.01)    # the creating process hasn't written it yet
+        raise RuntimeError(f'token secret file {path} is empty')
+    secret = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secret)
+    return secret
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
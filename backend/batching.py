@@ -0,0 +1,122 @@
+"""
+Micro-batching scheduler for single-row predictions.
+
+Concurrent /api/predict requests each submit one feature dict and wait on a
+Future. A background thread drains the queue into batches and flushes a batch
+when it reaches ``max_batch_size`` or when ``max_wait_ms`` has passed since its
+first item arrived. Each batch is scored with one vectorized call, grouped by
+model version so that a hot-swap never mixes versions inside one call, and
+every waiting request then gets its own result back.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the pending queue is at capacity."""
+
+
+class MicroBatcher:
+    """Collects single rows into batches for score_fn(features_list, bundle) -> sequence."""
+
+    def __init__(self, score_fn, max_batch_size=32, max_wait_ms=2.0, max_queue=10000):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self.submitted = 0
+        self.batches = 0
+        self.items = 0
+        self.full_flushes = 0
+        self.deadline_flushes = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+
+    def submit(self, features, bundle):
+        """Queue one feature dict; returns a Future resolving to its prediction."""
+        self._ensure_worker()
+        future = Future()
+        try:
+            self._queue.put_nowait((features, bundle, future, time.perf_counter()))
+        except queue.Full:
+            raise QueueFullError('prediction queue is full') from None
+        self.submitted += 1
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return future
+
+    def _ensure_worker(self):
+        # Threads don't survive fork(): start one per process on first use
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher',
+                                                daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if len(batch) >= self.max_batch_size:
+                self.full_flushes += 1
+            else:
+                self.deadline_flushes += 1
+            self._flush(batch)
+
+    def _flush(self, batch):
+        now = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        self.total_wait += sum(now - enqueued for _, _, _, enqueued in batch)
+
+        by_bundle = {}
+        for item in batch:
+            by_bundle.setdefault(id(item[1]), []).append(item)
+        for items in by_bundle.values():
+            try:
+                results = self.score_fn([features for features, _, _, _ in items], items[0][1])
+            except Exception as e:
+                self.errors += 1
+                for _, _, future, _ in items:
+                    future.set_exception(e)
+                continue
+            for (_, _, future, _), result in zip(items, results):
+                future.set_result(float(result))
+
+    def stats(self):
+        batches = self.batches
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'submitted': self.submitted,
+            'batches': batches,
+            'avg_batch_size': round(self.items / batches, 3) if batches else 0.0,
+            'batch_fill_ratio': (round(self.items / (batches * self.max_batch_size), 4)
+                                 if batches else 0.0),
+            'full_flushes': self.full_flushes,
+            'deadline_flushes': self.deadline_flushes,
+            'avg_queue_wait_ms': round(self.total_wait / self.items * 1000.0, 3) if self.items else 0.0,
+            'errors': self.errors,
+        }
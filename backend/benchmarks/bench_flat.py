@@ -0,0 +1,138 @@
+"""
+Flat-array evaluator (flat_model.py) against the xgboost booster.
+
+Loads the model twice, once per evaluator, and reports:
+
+  parity   - max |flat - booster| on raw scores over rows covering every split,
+             and on hybrid predictions (short and long workouts)
+  latency  - mean / p50 / p99 per call for one row, raw and through
+             hybrid_predict_from_features (short and long branch)
+  batch    - raw rows per second for several batch sizes: booster, flat arrays
+             alone, and the served flat evaluator (booster above FLAT_MAX_ROWS)
+
+Anchor memoization and the prediction cache are left out, so each call really
+evaluates the trees.
+
+Run from backend/:
+
+    python benchmarks/bench_flat.py [--iterations 5000] [--output results/flat.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZES = (8, 32, 128, 1024, 100000)
+
+
+def timed(fn, iterations):
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    samples *= 1e6
+    return {'mean_us': round(float(samples.mean()), 2),
+            'p50_us': round(float(np.percentile(samples, 50)), 2),
+            'p99_us': round(float(np.percentile(samples, 99)), 2)}
+
+
+def random_features(rng, long):
+    return {
+        'Gender': rng.randint(0, 1), 'Age': rng.randint(18, 80),
+        'Height': rng.randint(150, 200), 'Weight': rng.randint(45, 120),
+        'Duration': rng.randint(31, 120) if long else rng.randint(1, 30),
+        'Heart_Rate': rng.randint(70, 130), 'Body_Temp': round(rng.uniform(36.5, 41.0), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                                         'flat.json'))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-flat-')
+    os.environ.update(HISTORY_DB=os.path.join(workdir, 'history.db'), MODEL_POLL_INTERVAL='0',
+                      AUTH_SECRET_FILE=os.path.join(workdir, 'auth_secret'))
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    try:
+        import app as app_module
+        from model_registry import load_bundle
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    bundles = {name: load_bundle('xgb_model.json', 'model_meta.pkl', evaluator=name)
+               for name in ('xgboost', 'flat')}
+    if bundles['flat'].evaluator != 'flat':
+        sys.exit('flat evaluator failed its parity check')
+    booster, flat = bundles['xgboost'].booster, bundles['flat'].booster.flat
+
+    rng = random.Random(args.seed)
+    workouts = [random_features(rng, i % 2 == 1) for i in range(2000)]
+    matrix = bundles['xgboost'].schema.encode_many(workouts)
+    # One row at a time, so that the flat bundle really uses the flat arrays
+    hybrid = {name: np.array([app_module.hybrid_predict_from_features(w, bundle)
+                              for w in workouts])
+              for name, bundle in bundles.items()}
+    parity = {
+        'raw_max_abs': flat.max_error(booster, flat.parity_rows(20000, args.seed)),
+        'hybrid_max_abs': float(np.max(np.abs(hybrid['flat'] - hybrid['xgboost']))),
+    }
+
+    row = matrix[:1].astype(np.float32)
+    short, long = workouts[0], workouts[1]
+    latency = {}
+    for name, bundle in bundles.items():
+        latency[name] = {
+            'raw_single': timed(lambda: bundle.booster.inplace_predict(row), args.iterations),
+            'hybrid_short': timed(lambda: app_module.hybrid_predict_from_features(short, bundle),
+                                  args.iterations),
+            'hybrid_long': timed(lambda: app_module.hybrid_predict_from_features(long, bundle),
+                                 args.iterations),
+        }
+
+    batch = {}
+    np_rng = np.random.default_rng(args.seed)
+    scorers = {'xgboost': booster.inplace_predict, 'flat_only': flat.predict,
+               'flat': bundles['flat'].booster.inplace_predict}
+    for size in BATCH_SIZES:
+        rows = matrix[np_rng.integers(0, len(matrix), size)].astype(np.float32)
+        repeats = max(3, min(200, 200000 // size))
+        batch[size] = {}
+        for name, score in scorers.items():
+            start = time.perf_counter()
+            for _ in range(repeats):
+                score(rows)
+            elapsed = time.perf_counter() - start
+            batch[size][name] = round(size * repeats / elapsed)
+
+    print(f"parity: raw max |diff| {parity['raw_max_abs']:.3g}, "
+          f"hybrid max |diff| {parity['hybrid_max_abs']:.3g} kcal")
+    print(f"\n{'call':<14} {'xgb_mean_us':>12} {'flat_mean_us':>13} {'speedup':>8}")
+    for call in latency['xgboost']:
+        x, f = latency['xgboost'][call]['mean_us'], latency['flat'][call]['mean_us']
+        print(f"{call:<14} {x:>12} {f:>13} {x / f:>7.2f}x")
+    print(f"\n{'batch':>7} {'xgb_rows_s':>12} {'flat_only_rows_s':>17} {'flat_rows_s':>12}")
+    for size, rates in batch.items():
+        print(f"{size:>7} {rates['xgboost']:>12} {rates['flat_only']:>17} {rates['flat']:>12}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'benchmark': 'flat', 'flat': flat.info(), 'parity': parity,
+                   'latency': latency, 'batch_rows_per_s': batch}, f, indent=2)
+    print(f"\nSaved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Memory and statistics cost of a user's history: one dict per record against
+HistoryColumns (history_columns.py).
+
+For each history size it fills a fresh store with one user's records and reports:
+
+  memory  - bytes per record held in Python (tracemalloc) for the list of dicts
+            get_history() returns and for the HistoryColumns get_history_columns()
+            returns
+  disk    - bytes per record in SQLite for the pre-7 row layout (date string,
+            gender label) and the compact one (epoch seconds, gender code)
+  stats   - time to compute count / sum / min / max / variance of calories and
+            total duration with a Python loop over the dicts and with
+            HistoryColumns.summary()
+
+Run from backend/:
+
+    python benchmarks/bench_history.py [--records 1000 100000] [--output results/history.json]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from storage import MIGRATIONS, HistoryStore  # noqa: E402
+
+
+def random_records(n, rng):
+    return [{
+        'date': '2026-%02d-%02d %02d:%02d:%02d' % (rng.randint(1, 12), rng.randint(1, 28),
+                                                   rng.randint(0, 23), rng.randint(0, 59),
+                                                   rng.randint(0, 59)),
+        'gender': rng.choice(['male', 'female']), 'age': float(rng.randint(18, 80)),
+        'height': float(rng.randint(150, 200)), 'weight': float(rng.randint(45, 120)),
+        'duration': float(rng.randint(1, 120)), 'heart_rate': float(rng.randint(70, 130)),
+        'body_temp': round(rng.uniform(36.5, 41.0), 1),
+        'calories_burnt': round(rng.uniform(5, 300), 2), 'model_version': '153a4e38a933',
+    } for _ in range(n)]
+
+
+def allocated(build):
+    """(result, bytes still allocated by build())."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def file_bytes(path):
+    conn = sqlite3.connect(path)
+    conn.execute('VACUUM')
+    size = conn.execute('PRAGMA page_count').fetchone()[0] * \
+        conn.execute('PRAGMA page_size').fetchone()[0]
+    conn.close()
+    return size
+
+
+def legacy_disk_bytes(workdir, records):
+    """Bytes per record of the predictions table as it was before migration 7."""
+    path = os.path.join(workdir, 'legacy.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    for script in MIGRATIONS[:6]:
+        conn.executescript(script)
+    conn.close()
+    empty = file_bytes(path)
+    fields = ('id', 'date', 'gender', 'age', 'height', 'weight', 'duration', 'heart_rate',
+              'body_temp', 'calories_burnt', 'model_version')
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        f'INSERT INTO predictions (username, {", ".join(fields)}) '
+        f'VALUES (?, {", ".join("?" * len(fields))})',
+        [('user', i + 1, *(r[f] for f in fields[1:])) for i, r in enumerate(records)]
+    )
+    conn.commit()
+    conn.close()
+    return (file_bytes(path) - empty) / len(records)
+
+
+def loop_statistics(history):
+    count, total, total_sq, duration = 0, 0.0, 0.0, 0.0
+    lowest, highest = float('inf'), float('-inf')
+    for record in history:
+        calories = record['calories_burnt']
+        count += 1
+        total += calories
+        total_sq += calories * calories
+        lowest = min(lowest, calories)
+        highest = max(highest, calories)
+        duration += record['duration']
+    mean = total / count
+    return {'count': count, 'sum_calories': total, 'min_calories': lowest,
+            'max_calories': highest, 'sum_duration': duration,
+            'var_calories': total_sq / count - mean * mean}
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(n, rng, workdir):
+    records = random_records(n, rng)
+    path = os.path.join(workdir, f'history-{n}.db')
+    store = HistoryStore(path)
+    empty = file_bytes(path)
+    store.add_predictions('user', [dict(r) for r in records])
+    compact_disk = (file_bytes(path) - empty) / n
+
+    history, dict_bytes = allocated(lambda: store.get_history('user'))
+    columns, column_bytes = allocated(lambda: store.get_history_columns('user'))
+    assert columns.id.tolist() == [record['id'] for record in history]
+
+    repeat = max(3, 200000 // n)
+    loop_s = best_of(lambda: loop_statistics(history), repeat)
+    column_s = best_of(columns.summary, repeat)
+    return {
+        'memory_bytes_per_record': {
+            'dicts': round(dict_bytes / n, 1),
+            'columns': round(column_bytes / n, 1),
+            'column_arrays_only': round(columns.nbytes / n, 1),
+            'saving': round(dict_bytes / column_bytes, 1),
+        },
+        'disk_bytes_per_record': {
+            'legacy': round(legacy_disk_bytes(workdir, records), 1),
+            'compact': round(compact_disk, 1),
+        },
+        'statistics_ms': {
+            'dict_loop': round(loop_s * 1000, 4),
+            'columns': round(column_s * 1000, 4),
+            'speedup': round(loop_s / column_s, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                                         'history.json'))
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {}
+    for n in args.records:
+        with tempfile.TemporaryDirectory(prefix='bench-history-') as workdir:
+            results[n] = run(n, rng, workdir)
+
+    print(f"{'records':>8} {'dict_B':>8} {'cols_B':>8} {'saving':>7} {'disk_old':>9} "
+          f"{'disk_new':>9} {'loop_ms':>9} {'cols_ms':>9} {'speedup':>8}")
+    for n, r in results.items():
+        m, d, s = r['memory_bytes_per_record'], r['disk_bytes_per_record'], r['statistics_ms']
+        print(f"{n:>8} {m['dicts']:>8} {m['columns']:>8} {m['saving']:>6}x {d['legacy']:>9} "
+              f"{d['compact']:>9} {s['dict_loop']:>9} {s['columns']:>9} {s['speedup']:>7}x")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'benchmark': 'history', 'results': results}, f, indent=2)
+    print(f"\nSaved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
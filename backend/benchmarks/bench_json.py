@@ -0,0 +1,131 @@
+"""
+Serialization cost of /api/history responses: Flask's stdlib JSON provider
+against FastJSONProvider (serialization.py, orjson), and what gzip / brotli
+compression costs and saves on top.
+
+For each history size (default 10, 1k and 100k records) one user's history is
+written to a fresh store and the script reports:
+
+  encode  - best-of-N time for the provider's response() on the history payload
+            and the body size (the two bodies are checked to be identical)
+  compress - time and compressed size for gzip and brotli at the levels the app
+            uses (brotli only when the package is installed)
+  request - best-of-N time for a full GET /api/history/<user> through the test
+            client (store read + encode), per provider, uncompressed
+
+Run from backend/:
+
+    python benchmarks/bench_json.py [--records 10 1000 100000] [--output results/json.json]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(app_module, n, rng):
+    from flask.json.provider import DefaultJSONProvider
+    from serialization import FastJSONProvider, brotli, orjson
+    from bench_history import random_records
+
+    app, store = app_module.app, app_module.store
+    username = f'bench-{n}'
+    store.add_predictions(username, random_records(n, rng))
+    payload = {'success': True, 'history': store.get_history(username)}
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = FastJSONProvider(app)
+    repeat = max(3, 20000 // n)
+
+    result = {'encode': {}, 'compress': {}, 'request': {}}
+    bodies = {}
+    with app.app_context():
+        for name, provider in providers.items():
+            bodies[name] = provider.response(payload).get_data()
+            result['encode'][name] = {
+                'ms': round(best_of(lambda: provider.response(payload), repeat), 4),
+                'bytes': len(bodies[name]),
+            }
+    if len(set(bodies.values())) != 1:
+        raise SystemExit(f'{n} records: providers produced different bodies')
+    if 'orjson' in providers:
+        result['encode']['speedup'] = round(
+            result['encode']['stdlib']['ms'] / result['encode']['orjson']['ms'], 1)
+
+    body = bodies['stdlib']
+    compressors = {'gzip': lambda: gzip.compress(body, app_module.COMPRESS_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        compressors['br'] = lambda: brotli.compress(
+            body, quality=app_module.COMPRESS_BROTLI_QUALITY)
+    for name, compress in compressors.items():
+        result['compress'][name] = {
+            'ms': round(best_of(compress, repeat), 4),
+            'bytes': len(compress()),
+            'ratio': round(len(body) / len(compress()), 1),
+        }
+
+    client = app.test_client()
+    for name, provider in providers.items():
+        app.json = provider
+        result['request'][name] = {
+            'ms': round(best_of(lambda: client.get(f'/api/history/{username}').close(),
+                                repeat), 4)
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--records', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                                         'json.json'))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-json-')
+    os.environ.update(HISTORY_DB=os.path.join(workdir, 'history.db'), MODEL_POLL_INTERVAL='0',
+                      AUTH_SECRET_FILE=os.path.join(workdir, 'auth_secret'), AUTH_REQUIRED='0',
+                      RESPONSE_COMPRESSION='0')
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    try:
+        import app as app_module
+        rng = random.Random(args.seed)
+        results = {n: run(app_module, n, rng) for n in args.records}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'records':>8} {'bytes':>10} {'stdlib_ms':>10} {'orjson_ms':>10} {'speedup':>8} "
+          f"{'gzip_ms':>9} {'gzip_x':>7} {'br_ms':>9} {'br_x':>6} {'req_std':>9} {'req_orj':>9}")
+    for n, r in results.items():
+        e, c, q = r['encode'], r['compress'], r['request']
+        print(f"{n:>8} {e['stdlib']['bytes']:>10} {e['stdlib']['ms']:>10} "
+              f"{e.get('orjson', {}).get('ms', '-'):>10} {e.get('speedup', '-'):>8} "
+              f"{c['gzip']['ms']:>9} {c['gzip']['ratio']:>7} "
+              f"{c.get('br', {}).get('ms', '-'):>9} {c.get('br', {}).get('ratio', '-'):>6} "
+              f"{q['stdlib']['ms']:>9} {q.get('orjson', {}).get('ms', '-'):>9}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'benchmark': 'json', 'results': results}, f, indent=2)
+    print(f"\nSaved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
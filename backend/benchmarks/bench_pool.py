@@ -0,0 +1,166 @@
+"""
+Throughput of the inference process pool (inference_pool.py) across core counts.
+
+For each pool size, --clients threads play the web process: they parse and
+validate --rows workouts per request (parse_workout) and score them through
+_score_batch, which hands the booster call to the pool. The run lasts --seconds
+per configuration and reports requests and rows per second, p50 / p99 request
+latency and the speedup over a one-process pool. The baseline is the same
+clients scoring in-process with a one-thread booster (INFERENCE_WORKERS=0).
+
+--kill-after S kills one inference process S seconds into each run, to show
+that the pool restarts it; requests that were on it fail and are counted.
+
+The prediction cache and micro-batcher are off, so each request really reaches
+the booster. Scaling needs free cores: pool sizes beyond the CPUs available to
+this process share cores and stop improving.
+
+Run from backend/:
+
+    python benchmarks/bench_pool.py [--workers 1 2 4 8] [--rows 1 64] [--output results/pool.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_workout(rng):
+    return {
+        'gender': rng.choice(['male', 'female']), 'age': rng.randint(18, 80),
+        'height': rng.randint(150, 200), 'weight': rng.randint(45, 120),
+        'duration': rng.randint(1, 120), 'heart_rate': rng.randint(70, 130),
+        'body_temp': round(rng.uniform(36.5, 41.0), 1),
+    }
+
+
+def run(app_module, bundle, workouts, rows, clients, seconds, kill_after=None):
+    """Closed loop: each client sends its next request as soon as one returns."""
+    stop = time.perf_counter() + seconds
+    latencies = [[] for _ in range(clients)]
+    failures = [0] * clients
+
+    def client(k):
+        rng = random.Random(k)
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                batch = [app_module.parse_workout(w, bundle)[0]
+                         for w in rng.sample(workouts, rows)]
+                app_module._score_batch(batch, bundle)
+            except Exception:
+                failures[k] += 1
+                continue
+            latencies[k].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    if kill_after is not None and app_module.inference_pool is not None:
+        time.sleep(kill_after)
+        os.kill(app_module.inference_pool.stats()['processes'][0]['pid'], signal.SIGKILL)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    samples = np.concatenate([np.array(l) for l in latencies]) * 1000
+    requests = len(samples)
+    return {
+        'requests_per_s': round(requests / elapsed, 1),
+        'rows_per_s': round(requests * rows / elapsed, 1),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3) if requests else None,
+        'p99_ms': round(float(np.percentile(samples, 99)), 3) if requests else None,
+        'failed': sum(failures),
+    }
+
+
+def main():
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    default_workers = sorted({1, 2, 4, 8, cores} & set(range(1, max(cores, 1) + 1))) or [1]
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 64],
+                        help='workouts per request')
+    parser.add_argument('--clients', type=int, default=None,
+                        help='concurrent clients (default: 2 per pool process, at least 4)')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--kill-after', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                                         'pool.json'))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-pool-')
+    os.environ.update(HISTORY_DB=os.path.join(workdir, 'history.db'), MODEL_POLL_INTERVAL='0',
+                      AUTH_SECRET_FILE=os.path.join(workdir, 'auth_secret'),
+                      PREDICTION_CACHE_SIZE='0', MODEL_NTHREAD='1', INFERENCE_WORKERS='0')
+    os.environ.pop('PREDICT_BATCHING', None)
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    try:
+        import app as app_module
+        from inference_pool import InferencePool, model_spec
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    bundle = app_module.registry.current
+    rng = random.Random(args.seed)
+    workouts = [random_workout(rng) for _ in range(5000)]
+
+    results = {}
+    for rows in args.rows:
+        results[rows] = {}
+        configs = [('in_process', None)] + [(f'pool_{n}', n) for n in args.workers]
+        for name, size in configs:
+            clients = args.clients or max(4, 2 * (size or 1))
+            pool = None
+            if size is not None:
+                pool = InferencePool(workers=size)
+                app_module.inference_pool = pool
+                # Spawn the processes and load the model in each before timing:
+                # one slot-sized chunk per process
+                pool.predict(np.zeros((pool.slot_rows * size, len(bundle.columns)), np.float32),
+                             model_spec(bundle))
+            try:
+                result = run(app_module, bundle, workouts, rows, clients, args.seconds,
+                             args.kill_after if pool is not None else None)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    app_module.inference_pool = None
+            result['clients'] = clients
+            result['crashes'] = pool.crashes if pool is not None else 0
+            results[rows][name] = result
+
+        base = results[rows].get('pool_1', {}).get('rows_per_s')
+        print(f"\n{rows} workout(s) per request, {args.seconds:g}s per configuration "
+              f"({cores} core(s) available)")
+        print(f"{'config':<12} {'clients':>7} {'req_s':>9} {'rows_s':>10} {'p50_ms':>8} "
+              f"{'p99_ms':>8} {'vs_pool_1':>9} {'failed':>6}")
+        for name, r in results[rows].items():
+            r['speedup_vs_pool_1'] = round(r['rows_per_s'] / base, 2) if base else None
+            print(f"{name:<12} {r['clients']:>7} {r['requests_per_s']:>9} {r['rows_per_s']:>10} "
+                  f"{r['p50_ms']:>8} {r['p99_ms']:>8} {r['speedup_vs_pool_1'] or '-':>9} "
+                  f"{r['failed']:>6}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'benchmark': 'pool', 'cores': cores, 'seconds': args.seconds,
+                   'results': results}, f, indent=2)
+    print(f"\nSaved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Startup time and memory of gunicorn with 1, 4 and 16 workers.
+
+Compares the per-worker import (GUNICORN_PRELOAD=0) with the preloaded,
+copy-on-write shared model (GUNICORN_PRELOAD=1), and the JSON booster with the
+archived UBJSON copy. For each configuration it starts gunicorn on a local port,
+waits until every worker has logged "Worker ready", and then records:
+
+  startup_s  - seconds from launch until all workers are ready
+  rss_mb     - summed RSS of master + workers (counts shared pages once per process)
+  pss_mb     - summed PSS (shared pages split between the processes sharing them);
+               this is the number that shows the copy-on-write savings
+
+Run from backend/:
+
+    python benchmarks/bench_workers.py [--workers 1 4 16] [--output results/workers.json]
+
+Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY = re.compile(rb'Worker ready \(pid: (\d+)\)')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid):
+    """(rss, pss) in kB for one process."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values.get('Rss', 0), values.get('Pss', 0)
+
+
+def model_dir(binary):
+    """Temporary MODEL_DIR with the model files, with or without an archived UBJSON copy."""
+    path = tempfile.mkdtemp(prefix='bench-model-')
+    for name in ('xgb_model.json', 'model_meta.pkl'):
+        shutil.copy2(os.path.join(BACKEND_DIR, name), path)
+    if binary:
+        # One load populates model_versions/<version>/xgb_model.ubj
+        sys.path.insert(0, BACKEND_DIR)
+        from model_registry import ModelRegistry
+        ModelRegistry(model_dir=path, poll_interval=0).reload()
+    return path
+
+
+def run(workers, preload, binary, timeout=120):
+    models = model_dir(binary)
+    db = os.path.join(models, 'history.db')
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(free_port()),
+               GUNICORN_PRELOAD='1' if preload else '0', MODEL_DIR=models,
+               HISTORY_DB=db, MODEL_POLL_INTERVAL='0')
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    ready, log = set(), b''
+    try:
+        os.set_blocking(proc.stderr.fileno(), False)
+        while len(ready) < workers:
+            if time.perf_counter() - start > timeout or proc.poll() is not None:
+                raise RuntimeError(f'gunicorn did not start:\n{log.decode(errors="replace")}')
+            chunk = proc.stderr.read() or b''
+            log += chunk
+            ready.update(int(pid) for pid in READY.findall(log))
+            time.sleep(0.01)
+        startup = time.perf_counter() - start
+
+        time.sleep(1.0)   # let the workers settle before sampling memory
+        rss = pss = 0
+        for pid in [proc.pid, *ready]:
+            r, p = memory_kb(pid)
+            rss += r
+            pss += p
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+        shutil.rmtree(models, ignore_errors=True)
+
+    return {
+        'workers': workers,
+        'preload': preload,
+        'model_format': 'ubj' if binary else 'json',
+        'startup_s': round(startup, 3),
+        'rss_mb': round(rss / 1024, 1),
+        'pss_mb': round(pss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                                         'workers.json'))
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'workers':>7} {'preload':>7} {'format':>6} {'startup_s':>9} {'rss_mb':>8} {'pss_mb':>8}")
+    for workers in args.workers:
+        for preload, binary in ((False, False), (True, False), (True, True)):
+            result = run(workers, preload, binary)
+            results.append(result)
+            print(f"{workers:>7} {str(preload):>7} {result['model_format']:>6} "
+                  f"{result['startup_s']:>9} {result['rss_mb']:>8} {result['pss_mb']:>8}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'benchmark': 'workers', 'results': results}, f, indent=2)
+    print(f"Saved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+Load test and latency benchmark for the Flask API.
+
+Drives backend/app.py with a mixed, seeded workload and reports throughput plus
+p50/p95/p99 latency per endpoint:
+
+  register / login           - account traffic
+  predict_short              - /api/predict with Duration <= threshold
+  predict_long               - /api/predict with Duration > threshold (slope continuation)
+  history / statistics       - dashboard reads
+
+Targets (no outside network is used):
+  --target flask     in-process, through Flask's test client
+  --target gunicorn  a gunicorn started on 127.0.0.1 with gunicorn.conf.py
+  --target asgi      uvicorn serving asgi.py (the ASGI bridge) on 127.0.0.1
+
+--slow-clients N keeps N extra connections busy for the whole run with
+/api/predict requests whose bodies trickle in one byte every --slow-interval
+seconds. This is how slow mobile clients look to the server. Their requests
+are not part of the measured plan. What they cost is the drop in everyone
+else's throughput and latency: a sync gunicorn worker is stuck reading such a
+body, while the ASGI bridge reads it on the event loop.
+
+It also times the stages of one prediction in-process (JSON parsing, feature
+building, booster call, response serialization) so that a regression can be
+attributed to a stage.
+
+Results are written as JSON. Pass --compare with an earlier result file to print
+the deltas; the exit code is non-zero when a p50/p99 latency or the throughput
+regresses by more than --max-regression.
+
+Run from backend/:
+
+    python benchmarks/loadtest.py --target flask --requests 5000 --output results/flask.json
+    python benchmarks/loadtest.py --target gunicorn --workers 4 --compare results/baseline.json
+    python benchmarks/loadtest.py --target asgi --workers 2 --concurrency 64 --slow-clients 16 \
+        --compare results/gunicorn.json
+"""
+import abc
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+# Share of each request type in the workload
+DEFAULT_MIX = {
+    'register': 0.02,
+    'login': 0.05,
+    'predict_short': 0.38,
+    'predict_long': 0.25,
+    'history': 0.15,
+    'statistics': 0.15,
+}
+THRESHOLD = 30
+
+
+# ------------- workload -------------
+def random_workout(rng, long):
+    return {
+        'gender': rng.choice(['male', 'female']),
+        'age': rng.randint(18, 80),
+        'height': rng.randint(150, 200),
+        'weight': rng.randint(45, 120),
+        'duration': rng.randint(THRESHOLD + 1, 120) if long else rng.randint(1, THRESHOLD),
+        'heart_rate': rng.randint(70, 130),
+        'body_temp': round(rng.uniform(36.5, 41.0), 1),
+    }
+
+
+def build_plan(requests, users, mix, seed, new_user_prefix='new'):
+    """
+    List of (kind, method, path, body, user) drawn from the mix; user's token is
+    sent. Registrations create f'{new_user_prefix}{seed}-{i}', so two plans with
+    different prefixes never register the same name.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    plan = []
+    for i in range(requests):
+        kind = rng.choices(kinds, weights)[0]
+        user = f'bench{rng.randrange(users)}'
+        if kind == 'register':
+            plan.append((kind, 'POST', '/api/register',
+                         {'username': f'{new_user_prefix}{seed}-{i}', 'password': 'pw'},
+                         None))
+        elif kind == 'login':
+            plan.append((kind, 'POST', '/api/login', {'username': user, 'password': 'pw'}, None))
+        elif kind in ('predict_short', 'predict_long'):
+            body = dict(random_workout(rng, kind == 'predict_long'), username=user)
+            plan.append((kind, 'POST', '/api/predict', body, user))
+        else:
+            plan.append((kind, 'GET', f'/api/{kind}/{user}', None, user))
+    return plan
+
+
+# ------------- targets -------------
+class FlaskTarget:
+    """In-process: one test client per thread."""
+
+    def __init__(self, env):
+        os.environ.update(env)
+        sys.path.insert(0, BACKEND_DIR)
+        os.chdir(BACKEND_DIR)
+        import app as app_module
+        self.app_module = app_module
+        self._local = threading.local()
+
+    def request(self, method, path, body, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app_module.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        data = response.get_data()
+        return response.status_code, data
+
+    def close(self):
+        pass
+
+
+class ServerTarget(abc.ABC):
+    """A local server process; one keep-alive HTTP connection per thread."""
+
+    def __init__(self, env, workers, timeout=120):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ, **env, PORT=str(self.port), WEB_CONCURRENCY=str(workers))
+        self.proc = subprocess.Popen(
+            self.command(workers), cwd=BACKEND_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self._local = threading.local()
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if self.request('GET', '/api/model', None)[0] == 200:
+                    break
+            except OSError:
+                self._local.conn = None
+            if time.time() > deadline or self.proc.poll() is not None:
+                self.close()
+                raise RuntimeError(f'{type(self).__name__} server did not start')
+            time.sleep(0.1)
+
+    @abc.abstractmethod
+    def command(self, workers):
+        """argv that starts the server on self.port with the given worker count."""
+
+    def request(self, method, path, body, token=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            conn.request(method, path, payload, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            raise
+        return response.status, data
+
+    def close(self):
+        self.proc.send_signal(signal.SIGTERM)
+        self.proc.wait(timeout=30)
+
+
+class GunicornTarget(ServerTarget):
+    """gunicorn with gunicorn.conf.py (sync workers unless GUNICORN_THREADS is set)."""
+
+    def command(self, workers):
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+
+
+class AsgiTarget(ServerTarget):
+    """uvicorn serving the ASGI bridge (asgi.py)."""
+
+    def __init__(self, env, workers, timeout=120):
+        if workers > 1:
+            # As gunicorn.conf.py does: one booster thread per worker
+            env = dict(env, MODEL_NTHREAD=os.environ.get('MODEL_NTHREAD', '1'))
+        super().__init__(env, workers, timeout)
+
+    def command(self, workers):
+        return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                '--port', str(self.port), '--workers', str(workers), '--no-access-log',
+                '--log-level', 'warning']
+
+
+def slow_client(port, interval, stop, completed):
+    """Send /api/predict requests whose body arrives one byte per interval, until stop."""
+    body = json.dumps(dict(random_workout(random.Random(), False))).encode()
+    head = (f'POST /api/predict HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                sock.sendall(head)
+                for i in range(len(body)):
+                    if stop.wait(interval):
+                        return
+                    sock.sendall(body[i:i + 1])
+                response = http.client.HTTPResponse(sock)
+                response.begin()
+                response.read()
+                completed.append(response.status)
+        except OSError:
+            stop.wait(interval)
+
+
+# ------------- measurement -------------
+def percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    values = np.array(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3), 'mean_ms': round(float(values.mean()), 3)}
+
+
+def run_load(target, plan, concurrency, tokens, slow_clients=0, slow_interval=0.05):
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+
+    def send(item):
+        kind, method, path, body, user = item
+        start = time.perf_counter()
+        try:
+            status, _ = target.request(method, path, body, tokens.get(user))
+            failed = status >= 500
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.setdefault(kind, []).append(elapsed)
+            if failed:
+                errors[kind] = errors.get(kind, 0) + 1
+
+    stop = threading.Event()
+    slow_completed = []
+    slow_threads = [threading.Thread(target=slow_client,
+                                     args=(target.port, slow_interval, stop, slow_completed))
+                    for _ in range(slow_clients)]
+    for t in slow_threads:
+        t.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(send, plan))
+    finally:
+        wall = time.perf_counter() - start
+        stop.set()
+        for t in slow_threads:
+            t.join()
+
+    endpoints = {}
+    for kind, samples in sorted(latencies.items()):
+        endpoints[kind] = dict(
+            requests=len(samples), errors=errors.get(kind, 0),
+            throughput_rps=round(len(samples) / wall, 1), **percentiles(samples)
+        )
+    return {
+        'requests': len(plan),
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(plan) / wall, 1),
+        'errors': sum(errors.values()),
+        'slow_clients': slow_clients,
+        'slow_requests_completed': len(slow_completed),
+        'endpoints': endpoints,
+    }
+
+
+def stage_breakdown(iterations, seed):
+    """Per-stage cost of one /api/predict, timed in-process (microseconds)."""
+    sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+    from flask import jsonify
+
+    rng = random.Random(seed)
+    bodies = [json.dumps(dict(random_workout(rng, i % 2 == 1), username='stage'))
+              for i in range(iterations)]
+    bundle = app_module.registry.current
+    timings = {'json_parse': [], 'feature_build': [], 'booster': [], 'serialize': []}
+
+    with app_module.app.app_context():
+        for body in bodies:
+            t0 = time.perf_counter()
+            data = app_module.app.json.loads(body)
+            t1 = time.perf_counter()
+            features, gender_str = app_module.parse_workout(data, bundle)
+            row = bundle.schema.encode(features)
+            row[0, bundle.duration_idx] = min(row[0, bundle.duration_idx], bundle.threshold)
+            t2 = time.perf_counter()
+            score = float(bundle.booster.inplace_predict(row)[0])
+            t3 = time.perf_counter()
+            record = app_module.make_prediction_record(gender_str, features, score, bundle.version)
+            jsonify({'success': True, 'calories_burnt': score, 'prediction': record}).get_data()
+            t4 = time.perf_counter()
+            for stage, elapsed in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                timings[stage].append(elapsed)
+
+    breakdown = {}
+    for stage, samples in timings.items():
+        values = np.array(samples) * 1e6
+        breakdown[stage] = {'mean_us': round(float(values.mean()), 2),
+                            'p50_us': round(float(np.percentile(values, 50)), 2),
+                            'p99_us': round(float(np.percentile(values, 99)), 2)}
+    return breakdown
+
+
+# ------------- comparison -------------
+def compare(result, baseline, max_regression):
+    """Print deltas against baseline; returns True when within max_regression."""
+    ok = True
+    print(f"\n{'endpoint':<16} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    rows = [('overall', 'throughput_rps', baseline.get('throughput_rps'), result['throughput_rps'])]
+    for kind, current in result['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(kind)
+        if base:
+            for metric in ('p50_ms', 'p99_ms', 'throughput_rps'):
+                rows.append((kind, metric, base[metric], current[metric]))
+    for kind, metric, base, current in rows:
+        if not base or current is None:
+            continue
+        change = (current - base) / base
+        worse = -change if metric == 'throughput_rps' else change
+        flag = ' !' if worse > max_regression else ''
+        ok = ok and not flag
+        print(f"{kind:<16} {metric:<15} {base:>10} {current:>10} {change:>+7.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the Flask API')
+    parser.add_argument('--target', choices=('flask', 'gunicorn', 'asgi'), default='flask')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn / uvicorn workers')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='extra connections trickling request bodies (server targets)')
+    parser.add_argument('--slow-interval', type=float, default=0.05,
+                        help='seconds between the bytes a slow client sends')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stage-iterations', type=int, default=2000)
+    parser.add_argument('--output', help='result file (default results/<target>.json)')
+    parser.add_argument('--compare', help='baseline result file to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+    if args.slow_clients and args.target == 'flask':
+        parser.error('--slow-clients needs a server target (gunicorn or asgi)')
+
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    env = {'HISTORY_DB': os.path.join(workdir, 'history.db'), 'MODEL_POLL_INTERVAL': '0',
+           'AUTH_SECRET_FILE': os.path.join(workdir, 'auth_secret')}
+    try:
+        if args.target == 'flask':
+            target = FlaskTarget(env)
+        elif args.target == 'gunicorn':
+            target = GunicornTarget(env, args.workers)
+        else:
+            target = AsgiTarget(env, args.workers)
+        try:
+            tokens = {}
+            for i in range(args.users):
+                _, data = target.request('POST', '/api/register',
+                                         {'username': f'bench{i}', 'password': 'pw'})
+                tokens[f'bench{i}'] = json.loads(data)['token']
+            # Warm-up with its own registrations: replaying the measured plan's
+            # would make those hit the "already exists" 400 path in the run
+            warmup = build_plan(min(200, args.requests), args.users, DEFAULT_MIX, args.seed,
+                                new_user_prefix='warm')
+            run_load(target, warmup, args.concurrency, tokens)
+            plan = build_plan(args.requests, args.users, DEFAULT_MIX, args.seed)
+            load = run_load(target, plan, args.concurrency, tokens, args.slow_clients,
+                            args.slow_interval)
+        finally:
+            target.close()
+        os.environ.update(env)
+        stages = stage_breakdown(args.stage_iterations, args.seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = dict(
+        target=args.target, concurrency=args.concurrency,
+        workers=args.workers if args.target != 'flask' else None,
+        created=time.strftime('%Y-%m-%d %H:%M:%S'), **load, stages=stages
+    )
+
+    print(f"{args.target}: {result['requests']} requests in {result['wall_s']} s "
+          f"({result['throughput_rps']} req/s, {result['errors']} errors)")
+    if args.slow_clients:
+        print(f"{args.slow_clients} slow clients, {result['slow_requests_completed']} "
+              f"of their requests completed")
+    print(f"{'endpoint':<16} {'reqs':>6} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+    for kind, stats in result['endpoints'].items():
+        print(f"{kind:<16} {stats['requests']:>6} {stats['throughput_rps']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    print(f"\n{'stage':<16} {'mean_us':>8} {'p50_us':>8} {'p99_us':>8}")
+    for stage, stats in stages.items():
+        print(f"{stage:<16} {stats['mean_us']:>8} {stats['p50_us']:>8} {stats['p99_us']:>8}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{args.target}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Streaming bulk scoring of CSV / NDJSON workout exports.
+
+Input rows use the training schema (Gender, Age, Height, Weight, Duration,
+Heart_Rate, Body_Temp, or whatever the model's feature schema lists). Column
+names are lower-cased, so they match the API field names (gender, heart_rate,
+...), and extra columns such as User_ID are ignored. Rows are read lazily and handled in chunks of
+``chunk_size``: each chunk is validated row by row, scored with one vectorized
+hybrid call, and written out before the next chunk is read. Memory therefore
+stays flat however long the input is. A row that fails to parse becomes an
+error line in the output and does not stop the stream. If scoring a chunk
+raises, that chunk's rows become error lines and the next chunk is scored; if
+the input itself cannot be read any further, a final error line says so.
+
+Output has one line per input row, in input order:
+
+  ndjson: {"index": 0, "success": true, "calories_burnt": 231.4}
+          {"index": 1, "success": false, "message": "..."}
+  csv:    index,success,calories_burnt,message
+
+Served by POST /api/predict/stream in app.py. Also usable from the command line
+(run from backend/):
+
+    python bulk_scoring.py exercise.csv -o scored.csv
+    python bulk_scoring.py - --format ndjson < rows.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from model_registry import ModelLoadError, ModelRegistry, file_version, hybrid_predict, load_bundle
+
+DEFAULT_CHUNK_SIZE = 4096
+FORMATS = ('csv', 'ndjson')
+
+
+def read_csv(lines, required=()):
+    """
+    Iterator of (payload, error) per data row of a CSV with a header line. The
+    header is read and checked right away against the required field names
+    (ValueError if a column is missing).
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return iter(())
+    fields = [name.strip().lower() for name in header]
+    missing = set(required) - set(fields)
+    if missing:
+        raise ValueError(f"CSV header is missing column(s): {', '.join(sorted(missing))}")
+    return _csv_rows(reader, fields)
+
+
+def _csv_rows(reader, fields):
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield None, f'malformed CSV row: {e}'
+            continue
+        if not values:
+            continue
+        if len(values) != len(fields):
+            yield None, f'expected {len(fields)} fields, got {len(values)}'
+            continue
+        yield {field: value for field, value in zip(fields, values) if field}, None
+
+
+def read_ndjson(lines, required=()):
+    """Yield (payload, error) per non-blank line of newline-delimited JSON."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(obj, dict):
+            yield None, 'row must be a JSON object'
+            continue
+        yield {str(key).lower(): value for key, value in obj.items()}, None
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def score_stream(rows, parse_fn, score_fn, output_format='ndjson',
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield output text, one chunk at a time.
+
+    rows:     (payload, error) pairs from READERS[input_format](lines, required)
+    parse_fn: payload dict -> (features, gender_str); raises ValueError
+    score_fn: list of feature dicts -> sequence of predictions (one vectorized call)
+    """
+    if output_format == 'csv':
+        yield 'index,success,calories_burnt,message\n'
+
+    index = 0
+    rows = iter(rows)
+    while True:
+        results = []        # (index, calories or None, message or None)
+        valid = []          # (position in results, features)
+        read_error = None
+        while len(results) < chunk_size:
+            try:
+                payload, error = next(rows)
+            except StopIteration:
+                break
+            except (OSError, ValueError) as e:
+                # Unreadable input (bad encoding, dropped upload): report it as a
+                # last error line instead of cutting the output short
+                read_error = f'input stopped: {e}'
+                break
+            if error is None:
+                try:
+                    features, _ = parse_fn(payload)
+                    valid.append((len(results), features))
+                except (TypeError, ValueError) as e:
+                    error = str(e)
+            results.append([index, None, error])
+            index += 1
+
+        if valid:
+            try:
+                calories = score_fn([features for _, features in valid])
+            except Exception as e:
+                # Scoring failed for this chunk: its rows get error lines and the
+                # stream carries on with the next chunk
+                for position, _ in valid:
+                    results[position][2] = f'scoring failed: {e}'
+            else:
+                for (position, _), value in zip(valid, calories):
+                    results[position][1] = round(float(value), 2)
+        if read_error is not None:
+            results.append([index, None, read_error])
+        if results:
+            yield _format(results, output_format)
+
+        if len(results) < chunk_size or read_error is not None:
+            return
+
+
+def _format(results, output_format):
+    out = io.StringIO()
+    if output_format == 'csv':
+        writer = csv.writer(out, lineterminator='\n')
+        for index, calories, message in results:
+            if message is None:
+                writer.writerow((index, 'true', calories, ''))
+            else:
+                writer.writerow((index, 'false', '', message))
+    else:
+        for index, calories, message in results:
+            if message is None:
+                line = {'index': index, 'success': True, 'calories_burnt': calories}
+            else:
+                line = {'index': index, 'success': False, 'message': message}
+            out.write(json.dumps(line))
+            out.write('\n')
+    return out.getvalue()
+
+
+def detect_format(path, default='csv'):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return 'csv' if extension == 'csv' else default
+
+
+def load_model(model_dir, nthread=None, evaluator='xgboost'):
+    """
+    Load the live model files of model_dir as one ModelBundle, using the
+    registry's archived binary copy when there is one. Nothing is written.
+    """
+    model_path = os.path.join(model_dir, 'xgb_model.json')
+    meta_path = os.path.join(model_dir, 'model_meta.pkl')
+    version = file_version(model_path, meta_path)
+    archived = os.path.join(model_dir, ModelRegistry.ARCHIVE_DIR, version)
+    return load_bundle(model_path, meta_path, version=version,
+                       binary_path=os.path.join(archived, ModelRegistry.BINARY_FILE),
+                       nthread=nthread, evaluator=evaluator,
+                       flat_path=os.path.join(archived, ModelRegistry.FLAT_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV/NDJSON workout file with the live model')
+    parser.add_argument('input', help="input file, or '-' for stdin")
+    parser.add_argument('-o', '--output', help='output file (default stdout)')
+    parser.add_argument('--format', choices=FORMATS, help='input format (default: from extension)')
+    parser.add_argument('--output-format', choices=FORMATS, help='default: same as the input')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Only the model is loaded: importing app.py would open the history store,
+    # run migrations and start the writer and hasher for nothing
+    try:
+        bundle = load_model(os.environ.get('MODEL_DIR', '.'),
+                            nthread=int(os.environ.get('MODEL_NTHREAD', 0)) or None,
+                            evaluator=os.environ.get('MODEL_EVALUATOR', 'xgboost'))
+    except (OSError, ModelLoadError) as e:
+        sys.exit(f'Model not loaded: {e}')
+
+    input_format = args.format or detect_format(args.input)
+    source = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+              if args.input == '-' else open(args.input, encoding='utf-8', newline=''))
+    target = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        try:
+            rows = READERS[input_format](source, bundle.schema.required_fields)
+        except ValueError as e:
+            sys.exit(str(e))
+        for text in score_stream(
+            rows, bundle.schema.parse,
+            lambda features_list: hybrid_predict(bundle, bundle.schema.encode_many(features_list)),
+            output_format=args.output_format or input_format, chunk_size=args.chunk_size,
+        ):
+            target.write(text)
+    finally:
+        source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
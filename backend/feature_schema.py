@@ -0,0 +1,160 @@
+"""
+Request validation and feature encoding driven by the model metadata.
+
+A FeatureSchema is compiled once per model version from ``model_meta.pkl``:
+
+  columns      model input columns, in training order (required)
+  categorical  optional {column: {label: code}}; default {'Gender': {'male': 0, 'female': 1}}
+  ranges       optional {column: (min, max)}, merged over DEFAULT_RANGES
+  defaults     optional {column: value} for columns a request may leave out
+  fields       optional {column: request field}; default is the lower-cased
+               column name ('Heart_Rate' -> 'heart_rate')
+
+A retrained model that adds a column therefore only needs its metadata updated.
+The new column is read from the request under its field name, and it is
+required unless the metadata gives it a default.
+
+parse() turns a request payload into the feature dict used across app.py and
+raises SchemaError, which names the offending field, for missing, non-numeric,
+non-finite, out-of-range or unknown categorical values. encode() and
+encode_many() write feature dicts into float32 buffers in column order for the
+booster.
+"""
+import math
+import threading
+
+import numpy as np
+
+DEFAULT_CATEGORICAL = {'Gender': {'male': 0, 'female': 1}}
+
+# Physically plausible bounds; anything outside is a client error
+DEFAULT_RANGES = {
+    'Age': (1, 120),
+    'Height': (50, 272),
+    'Weight': (10, 500),
+    'Duration': (0, 1440),
+    'Heart_Rate': (20, 250),
+    'Body_Temp': (30, 45),
+}
+
+
+class SchemaError(ValueError):
+    """A request field failed validation; ``field`` is its request name."""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+class FeatureSchema:
+    """Compiled validation and encoding for one model version's feature columns."""
+
+    def __init__(self, columns, categorical=None, ranges=None, defaults=None, fields=None):
+        self.columns = list(columns)
+        self.categorical = {
+            col: {str(label).lower(): code for label, code in mapping.items()}
+            for col, mapping in (DEFAULT_CATEGORICAL if categorical is None else categorical).items()
+            if col in self.columns
+        }
+        self.ranges = {col: bounds for col, bounds in {**DEFAULT_RANGES, **(ranges or {})}.items()
+                       if col in self.columns}
+        self.defaults = dict(defaults or {})
+        fields = fields or {}
+        self.fields = [fields.get(col, col.lower()) for col in self.columns]
+        self.required_fields = [field for col, field in zip(self.columns, self.fields)
+                                if col not in self.defaults]
+
+        # One (column, field, kind, bounds, default) entry per column, in order
+        self._plan = []
+        for col, field in zip(self.columns, self.fields):
+            kind = 'categorical' if col in self.categorical else 'numeric'
+            self._plan.append((col, field, kind, self.ranges.get(col), self.defaults.get(col)))
+        self._defaults_row = np.array([float(self.defaults.get(col, 0)) for col in self.columns],
+                                      dtype=np.float32)
+        self._local = threading.local()
+
+    @classmethod
+    def from_meta(cls, meta, columns):
+        return cls(columns, categorical=meta.get('categorical'), ranges=meta.get('ranges'),
+                   defaults=meta.get('defaults'), fields=meta.get('fields'))
+
+    # ------------- validation -------------
+    def parse(self, data):
+        """
+        Validate a request payload. Returns (features, gender_str): features maps
+        every model column to its encoded value; gender_str is the normalized
+        'gender' label (None if the model has no such field).
+        """
+        if not isinstance(data, dict):
+            raise SchemaError(None, 'workout must be a JSON object')
+        features = {}
+        gender_str = None
+        for col, field, kind, bounds, default in self._plan:
+            value = data.get(field)
+            if value is None or value == '':
+                if default is None:
+                    raise SchemaError(field, f"Missing required field '{field}'")
+                features[col] = default
+                continue
+            if kind == 'categorical':
+                label = str(value).strip().lower()
+                code = self.categorical[col].get(label)
+                if code is None:
+                    choices = ', '.join(self.categorical[col])
+                    raise SchemaError(field, f"Invalid '{field}': must be one of {choices}")
+                features[col] = code
+                if field == 'gender':
+                    gender_str = label
+                continue
+            features[col] = self._number(field, value, bounds)
+        return features, gender_str
+
+    @staticmethod
+    def _number(field, value, bounds):
+        if isinstance(value, bool):
+            raise SchemaError(field, f"Invalid '{field}': must be a number")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise SchemaError(field, f"Invalid '{field}': must be a number") from None
+        if not math.isfinite(number):
+            raise SchemaError(field, f"Invalid '{field}': must be finite")
+        if bounds is not None and not bounds[0] <= number <= bounds[1]:
+            raise SchemaError(field, f"Invalid '{field}': must be between {bounds[0]} and {bounds[1]}")
+        return number
+
+    # ------------- encoding -------------
+    def encode(self, features):
+        """
+        Feature dict -> (1, n_columns) float32 row in column order. The row is a
+        per-thread buffer reused by the next call on the same thread; columns
+        absent from the dict get their default (0 if none).
+        """
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(self.columns)), dtype=np.float32)
+        row[0] = self._defaults_row
+        for j, col in enumerate(self.columns):
+            value = features.get(col)
+            if value is not None:
+                row[0, j] = value
+        return row
+
+    def encode_many(self, features_list, dtype=np.float64):
+        """List of feature dicts -> (n, n_columns) matrix in column order."""
+        matrix = np.empty((len(features_list), len(self.columns)), dtype=dtype)
+        matrix[:] = self._defaults_row
+        for j, col in enumerate(self.columns):
+            default = self._defaults_row[j]
+            matrix[:, j] = [f.get(col, default) for f in features_list]
+        return matrix
+
+    def info(self):
+        return {
+            'columns': self.columns,
+            'fields': self.fields,
+            'required': self.required_fields,
+            'categorical': self.categorical,
+            'ranges': self.ranges,
+            'defaults': self.defaults,
+        }
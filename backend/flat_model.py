@@ -0,0 +1,220 @@
+"""
+XGBoost trees compiled into flat NumPy arrays.
+
+All trees of ``xgb_model.json`` are concatenated into one set of node arrays
+(feature index, threshold, left/right child, default direction, leaf value).
+Leaves point to themselves. Scoring walks every tree in lock-step: each level
+is a few ``take`` gathers over an (n_rows, n_trees) array of node ids, and
+after ``max_depth`` levels every row sits on a leaf in every tree. A single row
+therefore costs max_depth small NumPy operations rather than a call into the
+xgboost runtime, and a batch costs the same number of larger ones.
+
+Split semantics follow XGBoost: the row goes left when
+``float32(x) < float32(threshold)``, and missing values (NaN) follow
+default_left. The tree outputs are summed in float64 and added to base_score,
+so results differ from the booster only by float32 rounding (see max_error()).
+
+Only numerical splits with an identity link are supported: regression
+objectives such as reg:squarederror, as trained for this app.
+
+Export a compiled copy (no xgboost needed to load it):
+
+    python flat_model.py xgb_model.json -o xgb_model.flat.npz
+"""
+import argparse
+import json
+
+import numpy as np
+
+# Objectives whose prediction is the raw margin
+IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror',
+                       'reg:quantileerror', 'reg:linear'}
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'default_left', 'value', 'roots')
+
+
+class FlatTreeModel:
+    """Tree ensemble as flat arrays; predict() mirrors Booster.inplace_predict."""
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 base_score, max_depth, num_feature):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+        self.num_feature = int(num_feature)
+        # children[2 * node + go_left]: one gather picks the next node
+        self._children = np.stack([right, left], axis=1).ravel()
+
+    # ------------- construction -------------
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, model):
+        """Compile the parsed JSON of a saved XGBoost model."""
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f'unsupported objective {objective}')
+        params = learner['learner_model_param']
+        if int(params.get('num_target', 1)) != 1 or int(params.get('num_class', 0)) > 1:
+            raise ValueError('only single-output models are supported')
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f"unsupported booster {booster['name']}")
+        trees = booster['model']['trees']
+
+        feature, threshold, left, right, default_left, value, roots = ([] for _ in range(7))
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree.get('split_type', [])):
+                raise ValueError('categorical splits are not supported')
+            lefts = tree['left_children']
+            n = len(lefts)
+            roots.append(offset)
+            depth = [0] * n
+            for i in range(n):
+                leaf = lefts[i] == -1
+                feature.append(0 if leaf else tree['split_indices'][i])
+                threshold.append(tree['split_conditions'][i])
+                left.append(offset + (i if leaf else lefts[i]))
+                right.append(offset + (i if leaf else tree['right_children'][i]))
+                default_left.append(bool(tree['default_left'][i]))
+                # For leaves XGBoost stores the output in split_conditions
+                value.append(tree['split_conditions'][i] if leaf else 0.0)
+                if not leaf:
+                    depth[lefts[i]] = depth[tree['right_children'][i]] = depth[i] + 1
+            max_depth = max(max_depth, max(depth))
+            offset += n
+
+        return cls(
+            feature=np.array(feature, dtype=np.intp),
+            threshold=np.array(threshold, dtype=np.float32),
+            left=np.array(left, dtype=np.intp),
+            right=np.array(right, dtype=np.intp),
+            default_left=np.array(default_left, dtype=bool),
+            value=np.array(value, dtype=np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            base_score=_parse_base_score(params['base_score']),
+            max_depth=max_depth,
+            num_feature=int(params['num_feature']),
+        )
+
+    def save(self, path):
+        np.savez(path, base_score=self.base_score, max_depth=self.max_depth,
+                 num_feature=self.num_feature, **{name: getattr(self, name) for name in ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(base_score=float(data['base_score']), max_depth=int(data['max_depth']),
+                       num_feature=int(data['num_feature']),
+                       **{name: data[name] for name in ARRAYS})
+
+    # ------------- scoring -------------
+    def predict(self, X):
+        """X: 2-D array, one row per sample, columns in training order."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        values = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            x = values.take(row_start + self.feature.take(node))
+            go_left = x < self.threshold.take(node)
+            missing = np.isnan(x)
+            if missing.any():
+                go_left = np.where(missing, self.default_left.take(node), go_left)
+            node = self._children.take(node * 2 + go_left)
+        return (self.value.take(node).sum(axis=1) + self.base_score).astype(np.float32)
+
+    # Drop-in for Booster.inplace_predict on the hybrid prediction paths
+    inplace_predict = predict
+
+    def max_error(self, booster, X):
+        """Largest |flat - booster| over the rows of X."""
+        X = np.asarray(X, dtype=np.float32)
+        return float(np.max(np.abs(
+            self.predict(X).astype(np.float64) - booster.inplace_predict(X).astype(np.float64)
+        ))) if len(X) else 0.0
+
+    def parity_rows(self, n=2000, seed=0):
+        """
+        Random rows spanning every feature's split thresholds (plus a margin on
+        both sides), so that parity checks reach all branches of the trees.
+        """
+        rng = np.random.default_rng(seed)
+        splits = self.left != np.arange(len(self.left))
+        columns = []
+        for j in range(self.num_feature):
+            cuts = self.threshold[splits & (self.feature == j)]
+            if len(cuts) == 0:
+                columns.append(np.zeros(n))
+                continue
+            low, high = float(cuts.min()), float(cuts.max())
+            margin = max(high - low, 1.0) * 0.1
+            columns.append(rng.uniform(low - margin, high + margin, n))
+        return np.column_stack(columns).astype(np.float32)
+
+    def info(self):
+        return {
+            'trees': len(self.roots),
+            'nodes': len(self.feature),
+            'max_depth': self.max_depth,
+            'num_feature': self.num_feature,
+            'base_score': self.base_score,
+        }
+
+
+class FlatWithFallback:
+    """
+    Flat trees for inputs of up to max_rows rows, the xgboost booster above.
+    The flat walk costs O(rows * trees * depth) in NumPy, so for large batches
+    the booster's multi-threaded C++ predictor is faster again.
+    """
+
+    def __init__(self, flat, booster, max_rows=32):
+        self.flat = flat
+        self.booster = booster
+        self.max_rows = max_rows
+
+    def inplace_predict(self, X):
+        if len(X) <= self.max_rows:
+            return self.flat.predict(X)
+        return self.booster.inplace_predict(X)
+
+
+def _parse_base_score(text):
+    # XGBoost >= 2 writes e.g. '[8.949567E1]'; older versions a plain number
+    return float(str(text).strip('[]'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile an XGBoost JSON model into flat arrays')
+    parser.add_argument('model', help='xgb_model.json')
+    parser.add_argument('-o', '--output', default='xgb_model.flat.npz')
+    parser.add_argument('--check', action='store_true',
+                        help='compare with the xgboost booster on random rows')
+    args = parser.parse_args()
+
+    flat = FlatTreeModel.from_json(args.model)
+    flat.save(args.output)
+    print(f"Saved {args.output}: {flat.info()}")
+    if args.check:
+        from xgboost import Booster
+        booster = Booster(model_file=args.model)
+        print(f"Max |flat - booster|: {flat.max_error(booster, flat.parity_rows()):.6g}")
+
+
+if __name__ == '__main__':
+    main()
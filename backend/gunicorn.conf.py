@@ -0,0 +1,72 @@
+"""
+Gunicorn settings for the backend. Run from backend/:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+With GUNICORN_PRELOAD=1 (the default) app.py is imported once in the master:
+the booster, metadata and anchor grid are built there and shared copy-on-write
+with every forked worker instead of being parsed again per worker.
+
+- gc.freeze() moves everything allocated at import into the permanent GC
+  generation, so collections in the workers don't write to (and un-share) those
+  pages.
+- With more than one worker each booster is limited to one thread
+  (MODEL_NTHREAD=1) unless set explicitly. This avoids oversubscribing cores, and
+  the master never starts an OpenMP thread pool that forked children would inherit.
+- The model registry's watcher thread starts in each worker on its first request.
+- With the inference pool (INFERENCE_WORKERS > 0, see inference_pool.py) the
+  booster runs in the pool's processes, so one web worker (WEB_CONCURRENCY=1)
+  with GUNICORN_THREADS threads is the default: it only parses and validates.
+- worker_exit drains the history write-behind queue (history_writer.py) before
+  a worker goes away, e.g. on a graceful restart, and removes the worker's
+  metric snapshot.
+- METRICS_DIR (a fresh per-master directory by default) is where workers drop
+  their metric snapshots so that /metrics reports totals for the whole server.
+"""
+import gc
+import os
+import shutil
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+pool_enabled = int(os.environ.get("INFERENCE_WORKERS", 0)) > 0
+workers = int(os.environ.get("WEB_CONCURRENCY", 1 if pool_enabled else 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 16 if pool_enabled else 1))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+if workers > 1:
+    os.environ.setdefault("MODEL_NTHREAD", "1")
+
+os.environ.setdefault(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"backend-metrics-{os.getpid()}")
+)
+
+
+def on_starting(server):
+    # Drop snapshots left by an earlier server that used the same directory
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def when_ready(server):
+    if preload_app:
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker ready (pid: %s)", worker.pid)
+
+
+def worker_exit(server, worker):
+    app_module = sys.modules.get("app")
+    if app_module is None:
+        return
+    if app_module.history_writer is not None:
+        app_module.history_writer.close()
+    # The worker's counts leave /metrics with it
+    app_module.metrics.close()
@@ -0,0 +1,96 @@
+"""
+Compact, column-oriented form of a user's prediction history.
+
+The store keeps a record's date as epoch seconds and its gender as a small
+integer code (storage.py, migration 7). HistoryColumns holds a history the
+same way in memory: one typed NumPy array per field instead of one dict per
+record.
+
+- Timestamps are wall-clock seconds (the naive 'YYYY-MM-DD HH:MM:SS' date read
+  as if it were UTC, like SQLite's strftime('%s')), so converting back never
+  depends on the server's time zone.
+- Gender and model_version are stored as codes into a short tuple of labels;
+  code -1 means NULL.
+- summary() computes statistics with NumPy reductions over the columns.
+
+Response dicts are not built from here: HistoryStore.get_history() reads them
+straight from SQL.
+"""
+from datetime import datetime
+
+import numpy as np
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Measurement columns, float64 so values round-trip exactly to what was stored
+MEASUREMENTS = ('age', 'height', 'weight', 'duration', 'heart_rate', 'body_temp',
+                'calories_burnt')
+
+
+def to_epoch(date):
+    """'YYYY-MM-DD[ HH:MM:SS]' -> wall-clock epoch seconds."""
+    return int((datetime.fromisoformat(date) - _EPOCH).total_seconds())
+
+
+class HistoryColumns:
+    def __init__(self, ids, ts, gender, gender_labels, model_version, version_labels,
+                 measurements):
+        self.id = ids
+        self.ts = ts
+        self.gender = gender
+        self.gender_labels = gender_labels
+        self.model_version = model_version
+        self.version_labels = version_labels
+        for name in MEASUREMENTS:
+            setattr(self, name, measurements[name])
+
+    @classmethod
+    def from_rows(cls, rows, gender_labels):
+        """
+        rows: (id, ts, gender code, *MEASUREMENTS, model_version) tuples
+        gender_labels: label of each gender code (index = code)
+        """
+        n = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * (4 + len(MEASUREMENTS))
+        versions = {None: -1}
+        version_codes = np.fromiter(
+            (versions.setdefault(v, len(versions) - 1) for v in columns[-1]), np.int16, n
+        )
+        return cls(
+            np.fromiter(columns[0], np.int64, n),
+            np.fromiter(columns[1], np.int64, n),
+            np.fromiter((-1 if g is None else g for g in columns[2]), np.int8, n),
+            tuple(gender_labels),
+            version_codes,
+            tuple(v for v in versions if v is not None),
+            {name: np.array(columns[3 + i], dtype=np.float64)
+             for i, name in enumerate(MEASUREMENTS)},
+        )
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays."""
+        return sum(getattr(self, name).nbytes
+                   for name in ('id', 'ts', 'gender', 'model_version', *MEASUREMENTS))
+
+    def summary(self):
+        """
+        Same keys as HistoryStore.get_statistics() (count, sum_calories,
+        min_calories, max_calories, sum_duration, var_calories), or None when
+        there are no records.
+        """
+        if not len(self):
+            return None
+        calories = self.calories_burnt
+        return {
+            'count': len(self),
+            'sum_calories': float(calories.sum()),
+            'min_calories': float(calories.min()),
+            'max_calories': float(calories.max()),
+            'sum_duration': float(self.duration.sum()),
+            'var_calories': float(calories.var()),
+        }
+
@@ -0,0 +1,290 @@
+"""
+Write-behind queue for prediction history.
+
+/api/predict and /api/predict/batch hand their records to
+HistoryWriter.submit() and return without waiting for them to be written. A
+background thread drains the queue and writes the records with
+HistoryStore.add_prediction_groups(): one transaction per batch, flushed once
+``flush_size`` records are waiting or ``flush_interval_ms`` after the first one
+arrived, whichever comes first.
+
+- Ids are handed out at submit time, so the response still carries the
+  record's id. They come from per-user blocks of ``id_block`` ids reserved in
+  the store (hi/lo) and are counted off in memory. While a user's ids come
+  from the last block reserved for them, the writer thread reserves the next
+  one, so in steady state submit() runs no SQL at all. Only a user's first record in this
+  process (or one that outruns the writer) reserves a block on the request
+  thread. Ids are unique and increase within a process; with several gunicorn
+  workers each draws from its own block, so one user's ids can commit out of
+  order across workers. History pages therefore follow the commit-order
+  ``seq`` the store assigns on insert, not the ids (see storage.py).
+- Backpressure: when ``max_queue`` submissions are waiting, submit() blocks for
+  up to ``put_timeout`` seconds and then raises QueueFullError (503). A
+  submission's records are queued together or not at all.
+- Read-your-writes: pending(username) returns the records this process has
+  queued but not yet committed. /api/history merges them into its answer.
+- A failed flush is retried with backoff. Only records the database rejects
+  outright (integrity errors) are dropped, and they are logged. close() (at
+  exit, and from gunicorn's worker_exit hook) stops the thread and writes
+  whatever is still queued.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from batching import QueueFullError
+
+_STOP = object()
+
+
+class HistoryWriter:
+    def __init__(self, store, flush_size=256, flush_interval_ms=50.0, max_queue=10000,
+                 put_timeout=1.0, id_block=32):
+        self.store = store
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.put_timeout = put_timeout
+        self.id_block = id_block
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()          # id blocks + enqueue order
+        self._pending_lock = threading.Lock()
+        self._pending = {}                     # username -> {id: record}
+        self._blocks = {}                      # username -> [next id, end of block]
+        self._spare = {}                       # username -> [(first, end)] reserved ahead
+        self._refills = set()                  # users the writer reserves a next block for
+        self._worker = None
+        self._worker_pid = None
+        self._closed = False
+
+        self.submitted = 0
+        self.written = 0
+        self.flushes = 0
+        self.size_flushes = 0
+        self.time_flushes = 0
+        self.blocks_reserved = 0
+        self.blocks_reserved_inline = 0
+        self.backpressure_waits = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_error = None
+
+    # ------------- producers -------------
+    def submit(self, username, records):
+        """Assign the records their ids and queue them together; returns the records."""
+        if not records:
+            return records
+        self._ensure_worker()
+        while True:
+            with self._lock:
+                if self._take_ids(username, records):
+                    self._enqueue(username, records)
+                    return records
+            # Not enough ids left for username in this process: its first
+            # submission, or the writer has not reserved the next block yet
+            count = max(self.id_block, len(records))
+            first = self.store.reserve_ids(username, count)
+            with self._lock:
+                self._spare.setdefault(username, []).append((first, first + count))
+                self.blocks_reserved_inline += 1
+
+    def _take_ids(self, username, records):
+        """Number the records from username's blocks; False if they run out (nothing taken)."""
+        block = self._blocks.get(username)
+        spare = self._spare.get(username, [])
+        available = (block[1] - block[0] if block else 0) + sum(end - first for first, end in spare)
+        if available < len(records):
+            return False
+        for record in records:
+            if block is None or block[0] >= block[1]:
+                first, end = spare.pop(0)
+                block = self._blocks[username] = [first, end]
+            record['id'] = block[0]
+            block[0] += 1
+        if not spare:
+            # Drawing on the last reserved block: have the writer reserve the next
+            self._spare.pop(username, None)
+            self._refills.add(username)
+        return True
+
+    def _enqueue(self, username, records):
+        with self._pending_lock:
+            pending = self._pending.setdefault(username, {})
+            for record in records:
+                pending[record['id']] = record
+        try:
+            self._queue.put_nowait((username, records))
+        except queue.Full:
+            self.backpressure_waits += 1
+            try:
+                self._queue.put((username, records), timeout=self.put_timeout)
+            except queue.Full:
+                self.rejected += len(records)
+                self._forget(username, records)
+                raise QueueFullError('history write queue is full') from None
+        self.submitted += len(records)
+
+    def pending(self, username):
+        """Copies of username's queued, not yet committed records, by id."""
+        with self._pending_lock:
+            records = self._pending.get(username)
+            return [dict(r) for _, r in sorted(records.items())] if records else []
+
+    def _forget(self, username, records):
+        with self._pending_lock:
+            pending = self._pending.get(username)
+            if pending is None:
+                return
+            for record in records:
+                pending.pop(record['id'], None)
+            if not pending:
+                del self._pending[username]
+
+    # ------------- background writer -------------
+    def _ensure_worker(self):
+        # Threads don't survive fork(): start one per process on first use
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='history-writer',
+                                                daemon=True)
+                self._worker_pid = os.getpid()
+                self._closed = False
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            self._refill()
+            batch = [item]
+            size = len(item[1])
+            deadline = time.perf_counter() + self.flush_interval
+            while size < self.flush_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if self._refills:
+                    self._refill()
+                batch.append(item)
+                size += len(item[1])
+            if size >= self.flush_size:
+                self.size_flushes += 1
+            else:
+                self.time_flushes += 1
+            self._write(batch)
+
+    def _refill(self):
+        """Reserve the next id block of every user drawing on their last one."""
+        with self._lock:
+            # Users stay in the set until their block is in place, so that
+            # submits meanwhile do not ask for a second one
+            usernames = list(self._refills)
+        for username in usernames:
+            try:
+                first = self.store.reserve_ids(username, self.id_block)
+            except sqlite3.Error as e:
+                # submit() reserves on the request thread if this block is missing
+                self.errors += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                with self._lock:
+                    self._refills.discard(username)
+                continue
+            with self._lock:
+                self._spare.setdefault(username, []).append((first, first + self.id_block))
+                self._refills.discard(username)
+                self.blocks_reserved += 1
+
+    def _write(self, batch, retries=None):
+        groups = {}
+        for username, records in batch:
+            groups.setdefault(username, []).extend(records)
+        delay = 0.05
+        attempt = 0
+        while True:
+            try:
+                self.store.add_prediction_groups(groups)
+                break
+            except sqlite3.IntegrityError as e:
+                # Not transient: write the users one by one and drop what still fails
+                self.errors += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                self._write_each(groups)
+                return
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                attempt += 1
+                if retries is not None and attempt > retries:
+                    print(f"History writer gave up on {len(batch)} records: {self.last_error}")
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+        self.flushes += 1
+        self.written += sum(len(records) for records in groups.values())
+        for username, records in groups.items():
+            self._forget(username, records)
+
+    def _write_each(self, groups):
+        for username, records in groups.items():
+            try:
+                self.store.add_predictions(username, records)
+                self.written += len(records)
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"History writer dropped {len(records)} records of {username}: {e}")
+            self._forget(username, records)
+
+    def close(self, timeout=10.0):
+        """Stop the writer thread and write everything still queued."""
+        if self._closed or self._worker_pid != os.getpid():
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            self._worker.join(timeout)
+        except queue.Full:
+            pass
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch, retries=3)
+
+    def stats(self):
+        with self._pending_lock:
+            pending = sum(len(records) for records in self._pending.values())
+        return {
+            'queue_depth': self._queue.qsize(),
+            'pending': pending,
+            'submitted': self.submitted,
+            'written': self.written,
+            'flushes': self.flushes,
+            'size_flushes': self.size_flushes,
+            'time_flushes': self.time_flushes,
+            'avg_flush_size': round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            'blocks_reserved': self.blocks_reserved,
+            'blocks_reserved_inline': self.blocks_reserved_inline,
+            'backpressure_waits': self.backpressure_waits,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,365 @@
+"""
+Pool of inference processes fed through shared memory.
+
+With INFERENCE_WORKERS > 0 the web process only parses, validates and encodes
+requests; the booster calls run in separate processes, so they neither hold
+the web process's GIL nor tie up a web worker's CPU.
+
+  - Rows travel through one shared-memory slab of ``slots`` slots, each holding
+    up to ``slot_rows`` float32 rows plus their float32 scores. Only small
+    descriptors (slot, rows, columns, model spec) go over each worker's pipe.
+  - Every process is pinned to one core (``os.sched_setaffinity``) and loads
+    its own booster with ``nthread=1``; OMP_NUM_THREADS is set to 1 before
+    xgboost is imported in the child.
+  - Inputs larger than one slot are split into slot-sized chunks and spread
+    over the least-busy workers, so one big batch uses several cores.
+  - A collector thread in the web process waits on the pipes. A worker that
+    dies closes its end, so the collector sees EOF: the requests it was
+    holding fail with WorkerCrashedError at once, and a separate thread
+    restarts it on the same core (after a pause if it died right after
+    starting). The collector keeps serving the other workers meanwhile.
+
+Workers are separate interpreters started as ``python -m inference_worker``
+(see inference_worker.main()), with their end of the pipe passed as an
+inherited file descriptor. They never inherit the web process's threads or an
+initialized OpenMP runtime, and unlike multiprocessing's spawn they never
+re-import the web process's main module. They load each model version on
+first use from the bundle's archived files (see model_spec()). The pool starts
+lazily once per process, like the micro-batcher, so a gunicorn master that
+preloads app.py never owns it.
+"""
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+from batching import QueueFullError
+
+# Everything a worker needs to load one model version on its own
+ModelSpec = namedtuple('ModelSpec', 'version model_path meta_path binary_path flat_path evaluator')
+
+# A worker that dies this soon after starting is restarted after a pause
+MIN_UPTIME = 1.0
+
+# inference_worker.py lives here; children import it from this directory
+WORKER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class WorkerCrashedError(Exception):
+    """The inference process scoring a request exited before answering."""
+
+
+class PoolTimeoutError(TimeoutError):
+    """The inference processes did not answer within the pool's timeout."""
+
+
+def model_spec(bundle, binary_file='xgb_model.ubj', flat_file='xgb_model.flat.npz'):
+    """
+    ModelSpec for a bundle. Archived copies are preferred: they stay in place
+    when the live files are replaced by a newer version. The file names match
+    ModelRegistry.BINARY_FILE / FLAT_FILE.
+    """
+    root = bundle.archive_dir
+    if not root:
+        return ModelSpec(bundle.version, bundle.model_path, bundle.meta_path,
+                         None, None, bundle.evaluator)
+    return ModelSpec(bundle.version,
+                     os.path.join(root, os.path.basename(bundle.model_path)),
+                     os.path.join(root, os.path.basename(bundle.meta_path)),
+                     os.path.join(root, binary_file), os.path.join(root, flat_file),
+                     bundle.evaluator)
+
+
+class _Worker:
+    """Web-process handle of one inference process."""
+
+    def __init__(self, index, cpu):
+        self.index = index
+        self.cpu = cpu
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.inflight = {}          # slot -> Future
+        self.started_at = 0.0
+        self.tasks = 0
+        self.restarts = 0
+        self.restarting = False     # exited; a restart thread is bringing it back
+
+
+class InferencePool:
+    """Scores float32 row matrices in worker processes; see predict()."""
+
+    def __init__(self, workers=None, slots=None, slot_rows=1024, max_columns=32, pin=True,
+                 timeout=30.0, nthread=1):
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+        self.size = workers or (len(cpus) if cpus else os.cpu_count() or 1)
+        self.slots = slots or 4 * self.size
+        self.slot_rows = slot_rows
+        self.max_columns = max_columns
+        self.timeout = timeout
+        self.nthread = nthread
+        self.cpus = [cpus[i % len(cpus)] for i in range(self.size)] if pin and cpus else \
+            [None] * self.size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._shm = None
+        self._inputs = None
+        self._outputs = None
+        self._free = None
+        self._orphans = set()       # slots whose caller timed out; freed on reply
+        self._workers = []
+        self._collector = None
+        self._wakeup = None         # (reader, writer): a restarted worker joins the wait
+        self._closing = False
+
+        self.submitted = 0
+        self.chunks = 0
+        self.rows = 0
+        self.errors = 0
+        self.crashes = 0
+        self.timeouts = 0
+
+    # ------------- lifecycle -------------
+    def _ensure_started(self):
+        # Processes and threads don't survive fork(): one pool per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            slot_floats = self.slot_rows * self.max_columns
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=self.slots * (slot_floats + self.slot_rows) * 4)
+            buffer = np.ndarray((self.slots * (slot_floats + self.slot_rows),), dtype=np.float32,
+                                buffer=self._shm.buf)
+            self._inputs = buffer[:self.slots * slot_floats].reshape(self.slots, slot_floats)
+            self._outputs = buffer[self.slots * slot_floats:].reshape(self.slots, self.slot_rows)
+            self._free = queue.Queue()
+            for slot in range(self.slots):
+                self._free.put(slot)
+            self._wakeup = connection.Pipe(duplex=False)
+            self._workers = [_Worker(i, cpu) for i, cpu in enumerate(self.cpus)]
+            for worker in self._workers:
+                self._spawn(worker)
+            self._collector = threading.Thread(target=self._collect, name='inference-pool',
+                                               daemon=True)
+            self._pid = os.getpid()
+            self._closing = False
+            self._collector.start()
+            # Before multiprocessing's own exit hook terminates the children
+            atexit.register(self.close)
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = connection.Pipe()
+        config = json.dumps({'shm_name': self._shm.name, 'slots': self.slots,
+                             'slot_rows': self.slot_rows, 'max_columns': self.max_columns,
+                             'cpu': worker.cpu, 'nthread': self.nthread})
+        path = os.environ.get('PYTHONPATH')
+        env = dict(os.environ, PYTHONPATH=f'{WORKER_DIR}{os.pathsep}{path}' if path else WORKER_DIR)
+        worker.process = subprocess.Popen(
+            [sys.executable, '-m', 'inference_worker', str(child_conn.fileno()), config],
+            pass_fds=(child_conn.fileno(),), env=env)
+        # Only the child holds the other end now: its exit reads as EOF here
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.started_at = time.monotonic()
+
+    def close(self):
+        if self._pid != os.getpid() or self._closing:
+            return
+        self._closing = True
+        self._collector.join(timeout=5)
+        for worker in self._workers:
+            with worker.send_lock:
+                try:
+                    worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+        for worker in self._workers:
+            try:
+                worker.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+        self._pid = None
+        self._inputs = self._outputs = None
+        self._shm.close()
+        self._shm.unlink()
+
+    # ------------- scoring -------------
+    def predict(self, X, spec):
+        """
+        X: 2-D array, one row per sample, columns in training order.
+        spec: ModelSpec (see model_spec()) of the version to score with.
+
+        Returns float32 scores, like Booster.inplace_predict. Raises
+        QueueFullError when no slot frees up within the timeout,
+        PoolTimeoutError when the workers do not answer within it and
+        WorkerCrashedError when a worker dies while holding the rows.
+        """
+        self._ensure_started()
+        n_rows, n_columns = X.shape
+        if n_columns > self.max_columns:
+            raise ValueError(f'{n_columns} columns exceed the pool limit of {self.max_columns}')
+        self.submitted += 1
+        result = np.empty(n_rows, dtype=np.float32)
+        pending = []                # (start, stop, slot, future)
+        try:
+            for start in range(0, n_rows, self.slot_rows):
+                stop = min(start + self.slot_rows, n_rows)
+                try:
+                    slot = self._free.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise QueueFullError('inference pool is full') from None
+                pending.append((start, stop, slot, None))
+                self._inputs[slot, :(stop - start) * n_columns] = X[start:stop].ravel()
+                pending[-1] = (start, stop, slot, self._dispatch(slot, stop - start, n_columns, spec))
+
+            deadline = time.monotonic() + self.timeout
+            for start, stop, slot, future in pending:
+                try:
+                    future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeoutError:
+                    self.timeouts += 1
+                    raise PoolTimeoutError('inference pool did not answer in time') from None
+                result[start:stop] = self._outputs[slot, :stop - start]
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release(slot for _, _, slot, _ in pending)
+        self.chunks += len(pending)
+        self.rows += n_rows
+        return result
+
+    # Drop-in for Booster.inplace_predict once bound to a spec
+    def scorer(self, spec):
+        return lambda X: self.predict(np.asarray(X, dtype=np.float32), spec)
+
+    def _dispatch(self, slot, n_rows, n_columns, spec):
+        future = Future()
+        # Least loaded running worker; read without a lock (a hint only)
+        worker = min((w for w in self._workers if not w.restarting), default=self._workers[0],
+                     key=lambda w: len(w.inflight))
+        with worker.send_lock:
+            worker.inflight[slot] = future
+            worker.tasks += 1
+            try:
+                worker.conn.send((slot, n_rows, n_columns, spec))
+            except (OSError, ValueError):
+                # Broken pipe or closed on exit: the worker is being restarted
+                worker.inflight.pop(slot, None)
+                future.set_exception(WorkerCrashedError(
+                    f'inference worker {worker.index} is not running'))
+        return future
+
+    def _release(self, slots):
+        with self._lock:
+            for slot in slots:
+                future = None
+                for worker in self._workers:
+                    future = worker.inflight.get(slot) or future
+                if future is not None and not future.done():
+                    # Still being scored; the collector frees it on the reply
+                    self._orphans.add(slot)
+                else:
+                    self._free.put(slot)
+
+    # ------------- collector -------------
+    def _collect(self):
+        wakeup = self._wakeup[0]
+        while not self._closing:
+            by_conn = {w.conn: w for w in self._workers if not w.restarting}
+            for conn in connection.wait([wakeup, *by_conn], timeout=1.0):
+                if conn is wakeup:
+                    while wakeup.poll():
+                        wakeup.recv_bytes()
+                elif not self._receive(by_conn[conn]):
+                    self._exited(by_conn[conn])
+
+    def _receive(self, worker):
+        """Hand out the worker's replies; False once its pipe is closed (it exited)."""
+        try:
+            while worker.conn.poll():
+                slot, error = worker.conn.recv()
+                with self._lock:
+                    future = worker.inflight.pop(slot, None)
+                    if slot in self._orphans:
+                        self._orphans.discard(slot)
+                        self._free.put(slot)
+                if future is None:
+                    continue
+                if error is None:
+                    future.set_result(slot)
+                else:
+                    future.set_exception(RuntimeError(error))
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def _exited(self, worker):
+        """Fail what the worker held and restart it without blocking the collector."""
+        self.crashes += 1
+        with worker.send_lock:
+            worker.restarting = True
+            failed, worker.inflight = worker.inflight, {}
+            worker.conn.close()
+        with self._lock:
+            for slot in failed:
+                if slot in self._orphans:
+                    self._orphans.discard(slot)
+                    self._free.put(slot)
+        for future in failed.values():
+            future.set_exception(WorkerCrashedError(f'inference worker {worker.index} exited'))
+        threading.Thread(target=self._restart, args=(worker,),
+                         name=f'inference-restart-{worker.index}', daemon=True).start()
+
+    def _restart(self, worker):
+        try:
+            code = worker.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            # Closed its pipe but kept running: replace it anyway
+            worker.process.kill()
+            code = worker.process.wait()
+        if time.monotonic() - worker.started_at < MIN_UPTIME:
+            time.sleep(MIN_UPTIME)
+        with worker.send_lock:
+            if self._closing:
+                return
+            self._spawn(worker)
+            worker.restarts += 1
+            worker.restarting = False
+        self._wakeup[1].send_bytes(b'')
+        print(f"Inference worker {worker.index} exited with code {code}; restarted "
+              f"(pid {worker.process.pid})")
+
+    def stats(self):
+        running = self._pid == os.getpid()
+        return {
+            'workers': self.size,
+            'running': running,
+            'slots': self.slots,
+            'free_slots': self._free.qsize() if running else self.slots,
+            'slot_rows': self.slot_rows,
+            'submitted': self.submitted,
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'crashes': self.crashes,
+            'processes': [
+                {'index': w.index, 'cpu': w.cpu, 'pid': w.process.pid if w.process else None,
+                 'alive': bool(w.process and w.process.poll() is None), 'inflight': len(w.inflight),
+                 'tasks': w.tasks, 'restarts': w.restarts}
+                for w in (self._workers if running else [])
+            ],
+        }
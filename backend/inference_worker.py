@@ -0,0 +1,89 @@
+"""
+Entry point of the inference processes started by inference_pool.py.
+
+The pool runs each worker as ``python -m inference_worker <fd> <config>``: a
+fresh interpreter that imports this module as its main module, takes its end
+of the pool's pipe from the inherited file descriptor and calls worker_main()
+with the JSON config. Nothing of the web process is imported: no app.py, no
+history store, auth secret, model archive, migrations or background threads.
+It loads xgboost, and through model_registry the model it is asked for, and
+nothing else.
+"""
+import json
+import os
+import signal
+import sys
+from collections import OrderedDict
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+# Model versions kept loaded per worker (current + previous + shadow candidate)
+WORKER_MODEL_CACHE = 3
+
+
+def worker_main(conn, shm_name, slots, slot_rows, max_columns, cpu, nthread):
+    # Ctrl-C reaches the whole process group; the web process decides when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    # One thread per process; must be set before xgboost loads OpenMP
+    os.environ['OMP_NUM_THREADS'] = str(nthread)
+    from model_registry import file_version, load_bundle
+
+    shm = _attach(shm_name)
+    slot_floats = slot_rows * max_columns
+    buffer = np.ndarray((slots * (slot_floats + slot_rows),), dtype=np.float32, buffer=shm.buf)
+    inputs = buffer[:slots * slot_floats].reshape(slots, slot_floats)
+    outputs = buffer[slots * slot_floats:].reshape(slots, slot_rows)
+    boosters = OrderedDict()        # version -> booster (or flat evaluator)
+
+    def booster_for(spec):
+        booster = boosters.get(spec.version)
+        if booster is None:
+            version = file_version(spec.model_path, spec.meta_path)
+            if version != spec.version:
+                raise RuntimeError(f'model files for {spec.version} now hold {version}')
+            booster = load_bundle(spec.model_path, spec.meta_path, version=version,
+                                  binary_path=spec.binary_path, nthread=nthread,
+                                  evaluator=spec.evaluator, flat_path=spec.flat_path).booster
+            boosters[spec.version] = booster
+            while len(boosters) > WORKER_MODEL_CACHE:
+                boosters.popitem(last=False)
+        return booster
+
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                return              # web process went away
+            if task is None:
+                return
+            slot, n_rows, n_columns, spec = task
+            try:
+                rows = inputs[slot, :n_rows * n_columns].reshape(n_rows, n_columns)
+                outputs[slot, :n_rows] = booster_for(spec).inplace_predict(rows)
+                conn.send((slot, None))
+            except Exception as e:
+                conn.send((slot, f'{type(e).__name__}: {e}'))
+    finally:
+        del inputs, outputs, buffer
+        shm.close()
+
+
+def _attach(name):
+    # The web process owns (and unlinks) the segment; Python < 3.13 has no track=
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def main(argv=None):
+    fd, config = argv or sys.argv[1:]
+    worker_main(connection.Connection(int(fd)), **json.loads(config))
+
+
+if __name__ == '__main__':
+    main()
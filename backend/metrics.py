@@ -0,0 +1,273 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms are plain Python objects guarded by a lock. Recording
+one observation costs a bisect and two additions, cheap enough to leave on in
+production.
+
+Multi-process aggregation (gunicorn): when ``directory`` is set, every process
+writes a JSON snapshot of its metrics to
+``<directory>/metrics-<pid>-<start>.json`` (start: when the process first
+flushed, so a recycled pid never overwrites a dead worker's file), at most
+once per ``flush_interval`` seconds. render() sums all snapshots in the
+directory with the live values of the current process, so any worker answering
+/metrics reports totals for the whole server.
+
+Only running processes count. A process removes its own snapshot at exit
+(close(), also called from gunicorn's worker_exit hook). render() drops the
+files of pids that are no longer alive (a worker that was killed) and, when a
+pid has been recycled, the older file of that pid. A worker restart therefore
+lowers the totals, which Prometheus reads as a counter reset.
+"""
+import atexit
+import bisect
+import cProfile
+import glob
+import json
+import os
+import random
+import threading
+import time
+
+# Seconds; wide enough for 10 us stages up to multi-second requests
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}         # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(series)] for labels, series in self._values.items()]
+
+
+class MetricsRegistry:
+    """Named metrics of one process plus the cross-process snapshot files."""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._next_flush = 0.0
+        self._owner = None              # (pid, start) naming this process's snapshot
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.close)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    # ------------- cross-process snapshots -------------
+    def _snapshot_path(self):
+        # Forked workers inherit the master's registry: take a new name per process
+        if self._owner is None or self._owner[0] != os.getpid():
+            self._owner = (os.getpid(), time.time_ns())
+        pid, start = self._owner
+        return os.path.join(self.directory, f'metrics-{pid}-{start}.json')
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def maybe_flush(self):
+        """Write this process's snapshot if flush_interval has passed."""
+        if self.directory and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._next_flush = time.monotonic() + self.flush_interval
+        path = self._snapshot_path()
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Remove this process's snapshot; its counts leave the totals with it."""
+        if not self.directory or self._owner is None or self._owner[0] != os.getpid():
+            return
+        try:
+            os.remove(self._snapshot_path())
+        except OSError:
+            pass
+
+    def _live_snapshot_paths(self):
+        """Snapshot files of running processes (newest per pid); removes the rest."""
+        newest = {}                     # pid -> (start, path)
+        stale = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                pid, start = map(int, os.path.basename(path)[8:-5].split('-'))
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                stale.append(path)
+            elif pid in newest and newest[pid][0] > start:
+                stale.append(path)
+            else:
+                if pid in newest:
+                    stale.append(newest[pid][1])
+                newest[pid] = (start, path)
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return [path for _, path in newest.values()]
+
+    def _collect(self):
+        """Merged {name: {labels: values}} over all running processes."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = self._snapshot_path()
+            for path in self._live_snapshot_paths():
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {}
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                target = merged.setdefault(name, {})
+                for labels, values in series:
+                    key = tuple(labels)
+                    if isinstance(values, list):
+                        current = target.get(key)
+                        target[key] = (values if current is None
+                                       else [a + b for a, b in zip(current, values)])
+                    else:
+                        target[key] = target.get(key, 0) + values
+        return merged
+
+    # ------------- exposition -------------
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        merged = self._collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            series = merged.get(name, {})
+            kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, values in sorted(series.items()):
+                pairs = [f'{k}="{v}"' for k, v in zip(metric.labelnames, labels)]
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(pairs)} {values}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), values[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    le_pair = 'le="' + le + '"'
+                    lines.append(f'{name}_bucket{_labels(pairs + [le_pair])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {values[-1]}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass                            # exists, owned by someone else
+    return True
+
+
+def _labels(pairs):
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler hook for slow requests.
+
+    A sample_rate fraction of requests run under cProfile. When a sampled request
+    takes longer than threshold_ms, its stats are written to
+    ``<directory>/<timestamp>-<endpoint>-<ms>ms.prof`` (if a directory is set) and
+    ``hook(info)`` is called with the endpoint, duration, and profile path.
+    """
+
+    def __init__(self, threshold_ms, sample_rate=0.01, directory=None, hook=None):
+        self.threshold = threshold_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.hook = hook
+        self.captured = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Return a running profiler for this request, or None if not sampled."""
+        if random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active (only one can run at a time)
+            return None
+        return profiler
+
+    def finish(self, profiler, endpoint, duration):
+        if profiler is None:
+            return
+        profiler.disable()
+        if duration < self.threshold:
+            return
+        self.captured += 1
+        path = None
+        if self.directory:
+            path = os.path.join(
+                self.directory,
+                f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{int(duration * 1000)}ms.prof'
+            )
+            profiler.dump_stats(path)
+        if self.hook is not None:
+            self.hook({'endpoint': endpoint, 'duration_ms': round(duration * 1000, 3),
+                       'profile': path, 'pid': os.getpid()})
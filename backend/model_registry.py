@@ -0,0 +1,385 @@
+"""
+Versioned model registry with background hot-reload.
+
+A ``ModelBundle`` is one immutable model version: the XGBoost booster plus the
+metadata it was trained with (threshold, slope, columns). Request handlers take
+``registry.current`` once and use that bundle for the whole request, so a swap
+never mixes two versions inside one prediction.
+
+The registry polls the model files. When they change it loads the new pair in
+a background thread, checks it with a smoke prediction and only then swaps it
+in. The version being replaced stays in memory for rollback. Every version that
+loads successfully is also copied to ``<model_dir>/model_versions/<version>/``.
+Because of that copy, a rollback can restore the previous files on disk and
+every other worker watching the same directory follows.
+
+The archive also keeps a UBJSON copy of each booster. UBJSON parses several
+times faster than the JSON file, so once a version has been archived, later
+starts load the binary copy instead. The model is identified by the hash of the
+JSON file, so the binary copy cannot go stale.
+
+With evaluator='flat', the trees are compiled into flat NumPy arrays
+(flat_model.py). ``bundle.booster`` then scores inputs of up to FLAT_MAX_ROWS
+rows with those arrays and hands larger batches to the xgboost Booster. A
+version only switches to the flat evaluator if it matches the booster within
+FLAT_TOLERANCE on rows covering every split; otherwise it stays on the booster.
+The compiled arrays are archived next to the UBJSON copy.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+from xgboost import XGBRegressor
+
+from feature_schema import FeatureSchema
+from flat_model import FlatTreeModel, FlatWithFallback
+
+DEFAULT_COLUMNS = ['Gender', 'Age', 'Height', 'Weight', 'Duration', 'Heart_Rate', 'Body_Temp']
+
+# Typical workout used to smoke-test a freshly loaded model
+SMOKE_ROW = {'Gender': 0, 'Age': 30, 'Height': 175, 'Weight': 75,
+             'Duration': 20, 'Heart_Rate': 100, 'Body_Temp': 39.5}
+
+# Largest accepted |flat - booster| (kcal) before the flat evaluator is used
+FLAT_TOLERANCE = 0.01
+# Above this many rows per call the booster is faster than the flat evaluator
+FLAT_MAX_ROWS = 32
+
+
+class ModelLoadError(Exception):
+    """Raised when a model version cannot be loaded or fails validation."""
+
+
+class ModelBundle:
+    """One loaded model version. Treat as read-only once published."""
+
+    def __init__(self, version, xgb, meta, model_path, meta_path):
+        self.version = version
+        self.xgb = xgb
+        # Raw booster handle for inplace_predict (skips the sklearn wrapper per call);
+        # wrapped in a FlatWithFallback when the flat evaluator is enabled
+        self.booster = xgb.get_booster()
+        self.evaluator = 'xgboost'
+        self.meta = meta
+        self.threshold = meta.get("threshold", 30)
+        self.slope = float(meta["slope"])
+        self.columns = list(meta.get("columns", DEFAULT_COLUMNS))
+        self.duration_idx = self.columns.index('Duration')
+        # Request validation / encoding compiled from the metadata
+        self.schema = FeatureSchema.from_meta(meta, self.columns)
+        self.model_path = model_path
+        self.meta_path = meta_path
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.archive_dir = None
+        # Per-version helpers attached by the registry's prepare hook
+        self.anchor_store = None
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'threshold': self.threshold,
+            'slope': self.slope,
+            'columns': self.columns,
+            'model_path': self.model_path,
+            'evaluator': self.evaluator,
+            'schema': self.schema.info(),
+        }
+
+
+def file_version(*paths):
+    """Short content hash identifying a model + metadata pair."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def load_bundle(model_path, meta_path, version=None, binary_path=None, nthread=None,
+                evaluator='xgboost', flat_path=None):
+    """
+    Load and validate a model version. Raises ModelLoadError.
+
+    binary_path: optional UBJSON copy of model_path, loaded instead when it exists
+    nthread:     booster thread count (1 per process when running many workers)
+    evaluator:   'xgboost', or 'flat' to score with the compiled flat trees
+    flat_path:   optional compiled copy (.npz), loaded instead of compiling when it exists
+    """
+    try:
+        version = version or file_version(model_path, meta_path)
+        xgb = XGBRegressor()
+        if binary_path and os.path.exists(binary_path):
+            xgb.load_model(binary_path)
+        else:
+            xgb.load_model(model_path)
+        if nthread:
+            xgb.get_booster().set_param({'nthread': nthread})
+        meta = joblib.load(meta_path)
+        bundle = ModelBundle(version, xgb, meta, model_path, meta_path)
+    except Exception as e:
+        raise ModelLoadError(f'cannot load {model_path} / {meta_path}: {e}') from e
+
+    smoke_test(bundle)
+    if evaluator == 'flat':
+        use_flat_evaluator(bundle, flat_path)
+    return bundle
+
+
+def use_flat_evaluator(bundle, flat_path=None):
+    """Switch bundle.booster to the flat evaluator if it passes the parity check."""
+    try:
+        if flat_path and os.path.exists(flat_path):
+            flat = FlatTreeModel.load(flat_path)
+        else:
+            flat = FlatTreeModel.from_json(bundle.model_path)
+        error = flat.max_error(bundle.booster, flat.parity_rows())
+    except Exception as e:
+        print(f"Flat evaluator unavailable for {bundle.version}: {e}")
+        return
+    if error > FLAT_TOLERANCE:
+        print(f"Flat evaluator for {bundle.version} differs from the booster by "
+              f"{error:.4g}; keeping the booster")
+        return
+    bundle.booster = FlatWithFallback(flat, bundle.booster, FLAT_MAX_ROWS)
+    bundle.evaluator = 'flat'
+
+
+def smoke_test(bundle):
+    """Score a typical workout below and at the threshold; both must be finite."""
+    row = np.array([[SMOKE_ROW.get(col, 0) for col in bundle.columns]] * 2, dtype=np.float32)
+    row[1, bundle.duration_idx] = bundle.threshold
+    try:
+        scores = bundle.booster.inplace_predict(row)
+    except Exception as e:
+        raise ModelLoadError(f'smoke prediction failed: {e}') from e
+    if scores.shape != (2,) or not np.all(np.isfinite(scores)) or not np.isfinite(bundle.slope):
+        raise ModelLoadError(f'smoke prediction returned {scores!r}')
+
+
+def hybrid_predict(bundle, matrix, score=None):
+    """
+    Hybrid predictions for a 2-D matrix (columns in bundle.columns order)
+    without any anchor cache: rows past the threshold are scored at the
+    threshold and continued with slope * extra_time.
+
+    score: raw booster scoring function (default bundle.booster.inplace_predict)
+    """
+    score = score or bundle.booster.inplace_predict
+    threshold = bundle.threshold
+    durations = matrix[:, bundle.duration_idx]
+    long_rows = durations > threshold
+    scored = matrix
+    if long_rows.any():
+        scored = matrix.copy()
+        scored[long_rows, bundle.duration_idx] = float(threshold)
+
+    predictions = score(scored).astype(np.float64)
+    predictions[long_rows] += bundle.slope * (durations[long_rows] - threshold)
+    return predictions
+
+
+class ModelRegistry:
+    """Holds the live ModelBundle and the previous one, and hot-reloads from disk."""
+
+    ARCHIVE_DIR = 'model_versions'
+    BINARY_FILE = 'xgb_model.ubj'
+    FLAT_FILE = 'xgb_model.flat.npz'
+
+    def __init__(self, model_dir='.', model_file='xgb_model.json', meta_file='model_meta.pkl',
+                 poll_interval=5.0, keep_versions=5, nthread=None, evaluator='xgboost',
+                 prepare=None, on_swap=None):
+        """
+        nthread: booster thread count; None keeps XGBoost's default (all cores)
+        evaluator: 'xgboost' or 'flat' (see flat_model.py)
+        prepare: callable(bundle) run on a new bundle before it is published
+                 (e.g. to build per-version caches)
+        on_swap: callable(new, old) run after the live bundle changes
+        """
+        self.model_dir = model_dir
+        self.model_path = os.path.join(model_dir, model_file)
+        self.meta_path = os.path.join(model_dir, meta_file)
+        self.poll_interval = poll_interval
+        self.keep_versions = keep_versions
+        self.nthread = nthread
+        self.evaluator = evaluator
+        self.prepare = prepare
+        self.on_swap = on_swap
+
+        self.current = None
+        self.previous = None
+        self.last_error = None
+        self.reloads = 0
+        self.failed_reloads = 0
+
+        self._signature = None
+        self._lock = threading.Lock()      # serializes loads and swaps
+        self._watcher = None
+        self._watcher_pid = None
+        self._stop = threading.Event()
+        self._watcher_lock = threading.Lock()   # start_watcher only
+
+    # ------------- loading -------------
+    def _files_signature(self):
+        try:
+            return tuple((st.st_mtime_ns, st.st_size)
+                         for st in (os.stat(self.model_path), os.stat(self.meta_path)))
+        except OSError:
+            return None
+
+    def reload(self, force=False):
+        """
+        Load the model files if they changed since the last attempt (or always
+        with force=True). Returns True when a new version was swapped in.
+        """
+        with self._lock:
+            signature = self._files_signature()
+            if not force and signature == self._signature and self.current is not None:
+                return False
+            self._signature = signature
+
+            try:
+                version = file_version(self.model_path, self.meta_path)
+                if self.current is not None and version == self.current.version:
+                    return False
+                archived = os.path.join(self.model_dir, self.ARCHIVE_DIR, version)
+                bundle = load_bundle(
+                    self.model_path, self.meta_path, version=version,
+                    binary_path=os.path.join(archived, self.BINARY_FILE),
+                    nthread=self.nthread,
+                    evaluator=self.evaluator,
+                    flat_path=os.path.join(archived, self.FLAT_FILE),
+                )
+                if self.prepare is not None:
+                    self.prepare(bundle)
+                self._archive(bundle)
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                print(f"Error loading model or metadata: {e}")
+                return False
+
+            self._swap(bundle)
+            self.reloads += 1
+            self.last_error = None
+            print(f"XGBoost model {bundle.version} loaded successfully!")
+            return True
+
+    def rollback(self):
+        """
+        Make the previous version live again. Its archived files are copied back
+        over the live ones so that other workers watching the directory follow.
+        Returns the restored bundle, or None if there is nothing to roll back to.
+        """
+        with self._lock:
+            if self.previous is None:
+                return None
+            bundle = self.previous
+            if bundle.archive_dir is not None:
+                self._restore_files(bundle)
+            self._signature = self._files_signature()
+            self._swap(bundle)
+            return bundle
+
+    def _swap(self, bundle):
+        old = self.current
+        self.previous = old
+        self.current = bundle
+        if self.on_swap is not None:
+            self.on_swap(bundle, old)
+
+    # ------------- version archive -------------
+    def _archive(self, bundle):
+        archive_root = os.path.join(self.model_dir, self.ARCHIVE_DIR)
+        target = os.path.join(archive_root, bundle.version)
+        try:
+            if not os.path.isdir(target):
+                tmp = f'{target}.tmp{os.getpid()}'
+                os.makedirs(tmp, exist_ok=True)
+                shutil.copy2(bundle.model_path, os.path.join(tmp, os.path.basename(self.model_path)))
+                shutil.copy2(bundle.meta_path, os.path.join(tmp, os.path.basename(self.meta_path)))
+                try:
+                    os.rename(tmp, target)
+                except OSError:
+                    shutil.rmtree(tmp, ignore_errors=True)   # another worker archived it first
+            binary = os.path.join(target, self.BINARY_FILE)
+            if not os.path.exists(binary):
+                tmp = f'{binary}.tmp{os.getpid()}.ubj'
+                bundle.xgb.save_model(tmp)
+                os.replace(tmp, binary)
+            flat = os.path.join(target, self.FLAT_FILE)
+            if bundle.evaluator == 'flat' and not os.path.exists(flat):
+                tmp = f'{flat}.tmp{os.getpid()}.npz'
+                bundle.booster.flat.save(tmp)
+                os.replace(tmp, flat)
+            bundle.archive_dir = target
+            self._prune_archive(archive_root)
+        except OSError as e:
+            print(f"Could not archive model {bundle.version}: {e}")
+
+    def _prune_archive(self, archive_root):
+        versions = sorted(
+            (os.path.join(archive_root, name) for name in os.listdir(archive_root)
+             if '.tmp' not in name),
+            key=os.path.getmtime
+        )
+        keep = {b.archive_dir for b in (self.current, self.previous) if b is not None}
+        for path in versions[:-self.keep_versions]:
+            if path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _restore_files(self, bundle):
+        for live in (self.model_path, self.meta_path):
+            tmp = f'{live}.rollback{os.getpid()}'
+            shutil.copy2(os.path.join(bundle.archive_dir, os.path.basename(live)), tmp)
+            os.replace(tmp, live)
+
+    # ------------- background watcher -------------
+    def start_watcher(self):
+        """
+        Start the polling thread in this process; no-op if it is already running
+        here or polling is off. Threads do not survive fork(), so with a preloaded
+        gunicorn app each worker starts its own watcher on its first request.
+        """
+        if self.poll_interval <= 0:
+            return
+        if self._watcher_running():
+            return
+        # Called from every request: concurrent first requests must start one thread
+        with self._watcher_lock:
+            if self._watcher_running():
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='model-registry',
+                                             daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watcher_running(self):
+        return (self._watcher is not None and self._watcher_pid == os.getpid()
+                and self._watcher.is_alive())
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:      # never let the watcher die
+                print(f"Model watcher error: {e}")
+
+    def info(self):
+        return {
+            'current': self.current.info() if self.current is not None else None,
+            'previous': self.previous.info() if self.previous is not None else None,
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.last_error,
+            'poll_interval': self.poll_interval,
+        }
@@ -0,0 +1,86 @@
+"""
+Bounded LRU + TTL cache for hybrid predictions.
+
+The model is deterministic, so a prediction only depends on the feature vector.
+Keys are the features in feature_columns order, rounded to a fixed number of
+decimals so that e.g. 30 and 30.0 (or 37.50000001) share an entry.
+
+Cached values belong to one model version: the app clears the cache from the
+model registry's swap hook (app._on_model_swap).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss/eviction counters."""
+
+    def __init__(self, max_size=10000, ttl=3600.0, decimals=4):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+
+        self._entries = OrderedDict()        # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def make_key(self, features_dict, columns):
+        """Normalized feature tuple in column order (missing columns count as 0)."""
+        return tuple(round(float(features_dict.get(col, 0)), self.decimals) for col in columns)
+
+    def get(self, key):
+        """Cached value for key, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,113 @@
+"""
+JSON encoding and compression of API responses.
+
+FastJSONProvider replaces Flask's stdlib JSON provider when orjson is installed
+(it is optional; without it the app serializes exactly as before):
+
+- Responses are encoded straight to bytes. There is no str in between and no
+  re-encoding, and the trailing newline comes from orjson.
+- The output matches the stdlib provider: sorted keys, compact separators
+  (indented in debug mode), and non-string keys turned into strings.
+  Datetimes and dataclasses go through Flask's own default() hook, as before.
+  Anything orjson refuses (integers beyond 64 bits, say) falls back to the
+  stdlib encoder. The only visible differences are that non-ASCII text is
+  sent as UTF-8 instead of \\u escapes and NaN becomes null.
+- Request bodies are parsed with orjson.loads.
+
+compress_response() gzip- or brotli-encodes a response body when the client
+asks for it in Accept-Encoding. Brotli needs the optional brotli package.
+Small, streamed and already-encoded responses are left alone. A strong ETag
+becomes weak once the body is encoded, since the bytes differ per encoding.
+Conditional GETs compare ETags weakly (If-None-Match), so 304s still work.
+"""
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    @property
+    def encoder(self):
+        return 'orjson' if orjson is not None else 'stdlib'
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = orjson.dumps(obj, default=self.default,
+                                option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6,
+                      brotli_quality=4):
+    """
+    Encode response's body with the best encoding accept_encodings (the
+    request's parsed Accept-Encoding) allows. Returns the response, changed in
+    place or untouched.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    encoding = accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(body, quality=brotli_quality)
+    else:
+        body = gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,220 @@
+"""
+Shadow evaluation of a candidate model on live traffic.
+
+A sample of /api/predict payloads is handed to ShadowEvaluator.submit() once
+the primary response has been sent (Response.call_on_close in app.py). The
+request never waits on the candidate: submit() only puts the payload on a
+bounded queue and drops it when the queue is full. A background thread drains
+the queue in batches, validates each payload against the candidate's own
+feature schema and scores the batch with one vectorized hybrid call, using the
+candidate's threshold and slope.
+
+Every comparison lands in a fixed-size ring buffer (DeltaRing) of parallel
+NumPy arrays: time, duration, primary and shadow prediction, and whether the
+workout was above the primary model's duration threshold. summary() reports
+the delta statistics (shadow - primary) for the short and long branch.
+
+The ring buffer belongs to one process. With several gunicorn workers, each
+one keeps its own sample; the optional on_delta hook feeds the shared metrics
+instead.
+"""
+import os
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+
+
+class DeltaRing:
+    """Last ``capacity`` (time, duration, primary, shadow, long) records."""
+
+    FIELDS = (('time', np.float64), ('duration', np.float32), ('primary', np.float32),
+              ('shadow', np.float32), ('long', np.bool_))
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+        self._next = 0              # total records ever appended
+        self._lock = threading.Lock()
+
+    def extend(self, **columns):
+        n = len(columns['primary'])
+        if n > self.capacity:
+            columns = {name: values[-self.capacity:] for name, values in columns.items()}
+            n = self.capacity
+        with self._lock:
+            positions = (self._next + np.arange(n)) % self.capacity
+            for name, values in columns.items():
+                self._arrays[name][positions] = values
+            self._next += n
+
+    def view(self):
+        """Copies of the stored records, oldest first."""
+        with self._lock:
+            n = min(self._next, self.capacity)
+            start = self._next - n
+            order = (start + np.arange(n)) % self.capacity
+            return {name: array[order] for name, array in self._arrays.items()}
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+
+class ShadowEvaluator:
+    """
+    registry: ModelRegistry holding the candidate model
+    score_fn: (matrix, bundle) -> hybrid predictions for the candidate
+    """
+
+    def __init__(self, registry, score_fn, sample_rate=0.05, buffer_size=10000,
+                 max_queue=1000, batch_size=64, on_delta=None):
+        self.registry = registry
+        self.score_fn = score_fn
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.on_delta = on_delta
+        self.ring = DeltaRing(buffer_size)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.sampled = 0
+        self.dropped = 0
+        self.scored = 0
+        self.rejected = 0           # payloads the candidate's schema does not accept
+        self.errors = 0
+        self.last_error = None
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 and self.registry.current is not None
+
+    def should_sample(self):
+        return self.enabled and random.random() < self.sample_rate
+
+    def submit(self, payload, primary, primary_bundle):
+        """Queue one request payload and its primary prediction; never blocks."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((payload, float(primary), primary_bundle.threshold,
+                                    time.time()))
+            self.sampled += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        # Threads don't survive fork(): start one per process on first use
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='shadow-eval',
+                                                daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._evaluate(batch)
+            except Exception as e:
+                self.errors += len(batch)
+                self.last_error = f'{type(e).__name__}: {e}'
+
+    def _evaluate(self, batch):
+        candidate = self.registry.current
+        if candidate is None:
+            return
+        features, kept = [], []
+        for item in batch:
+            try:
+                features.append(candidate.schema.parse(item[0])[0])
+                kept.append(item)
+            except ValueError:
+                self.rejected += 1
+        if not kept:
+            return
+
+        matrix = candidate.schema.encode_many(features)
+        shadow = np.asarray(self.score_fn(matrix, candidate), dtype=np.float64)
+        primary = np.array([item[1] for item in kept])
+        thresholds = np.array([item[2] for item in kept], dtype=np.float64)
+        durations = matrix[:, candidate.duration_idx]
+        long_rows = durations > thresholds
+        self.ring.extend(time=np.array([item[3] for item in kept]), duration=durations,
+                         primary=primary, shadow=shadow, long=long_rows)
+        self.scored += len(kept)
+        if self.on_delta is not None:
+            for delta, is_long in zip(shadow - primary, long_rows):
+                self.on_delta(float(delta), 'long' if is_long else 'short')
+
+    # ------------- reporting -------------
+    def summary(self, recent=0):
+        records = self.ring.view()
+        delta = records['shadow'].astype(np.float64) - records['primary']
+        result = {
+            'candidate': self.registry.current.info() if self.registry.current else None,
+            'candidate_error': self.registry.last_error,
+            'sample_rate': self.sample_rate,
+            'buffer': {'size': len(self.ring), 'capacity': self.ring.capacity},
+            'sampled': self.sampled,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize(),
+            'scored': self.scored,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'all': _delta_stats(delta, records['primary']),
+            'short': _delta_stats(delta[~records['long']], records['primary'][~records['long']]),
+            'long': _delta_stats(delta[records['long']], records['primary'][records['long']]),
+        }
+        if recent:
+            tail = slice(-recent, None)
+            result['recent'] = [
+                {'time': round(float(t), 3), 'duration': float(d), 'primary': round(float(p), 2),
+                 'shadow': round(float(s), 2), 'long': bool(l)}
+                for t, d, p, s, l in zip(records['time'][tail], records['duration'][tail],
+                                         records['primary'][tail], records['shadow'][tail],
+                                         records['long'][tail])
+            ]
+        return result
+
+    def reset(self):
+        """Forget the recorded deltas and zero the counters (e.g. for a new candidate)."""
+        self.ring.clear()
+        self._reset_counters()
+
+
+def _delta_stats(delta, primary):
+    if len(delta) == 0:
+        return {'count': 0}
+    abs_delta = np.abs(delta)
+    p50, p95, p99 = np.percentile(abs_delta, (50, 95, 99))
+    nonzero = primary != 0
+    return {
+        'count': int(len(delta)),
+        'mean_delta': round(float(delta.mean()), 4),
+        'mean_abs_delta': round(float(abs_delta.mean()), 4),
+        'rmse': round(float(np.sqrt(np.mean(delta ** 2))), 4),
+        'p50_abs_delta': round(float(p50), 4),
+        'p95_abs_delta': round(float(p95), 4),
+        'p99_abs_delta': round(float(p99), 4),
+        'max_abs_delta': round(float(abs_delta.max()), 4),
+        'mean_rel_delta': (round(float(np.mean(delta[nonzero] / primary[nonzero])), 6)
+                           if nonzero.any() else None),
+    }
@@ -0,0 +1,600 @@
+"""
+SQLite-backed storage for user accounts and prediction history.
+
+Replaces the module-level ``users`` / ``predictions_history`` dicts in app.py so
+that data survives restarts and every gunicorn worker sees the same state.
+
+- The database runs in WAL mode, so readers never block the writer and several
+  processes can share one file.
+- ``synchronous=NORMAL`` defers the fsync to WAL checkpoints: a commit costs a
+  write() rather than a disk flush, which keeps inserts cheap.
+- Every add_predictions() call commits synchronously. /api/predict does not
+  call it on the request path: history_writer.py queues the records and commits
+  them in batches from a background thread (write-behind).
+- Each thread (and each forked worker) gets its own connection.
+- History rows are keyed on (username, id) and indexed on (username, ts).
+- Per-user running aggregates (``user_stats``), per-day totals
+  (``user_daily``) and weekly / monthly rollups (``user_rollups``) are updated
+  in the same transaction as each insert, so statistics and time-series charts
+  are read without rescanning the history.
+- History ids come from a per-user counter (``id_alloc``). Writers either take
+  ids inside the insert transaction or reserve a block up front with
+  reserve_ids() (see history_writer.py); both draw from the same counter, so ids
+  never collide. Reserved ids can commit out of order (two processes each hold
+  a block), so history pages do not follow ids: every row also gets ``seq``, the
+  user's next sequence number taken inside the insert transaction. Writers
+  commit one at a time, so seq follows commit order, and a cursor on it
+  (seq > cursor) never passes over a row that commits later.
+- Records are stored compactly (migration 7): the date as wall-clock epoch
+  seconds (``ts``) and the gender as a code into the ``genders`` table.
+  get_history_columns() keeps that layout in memory (HistoryColumns, see
+  history_columns.py) for reductions. get_history() serves history pages: it
+  lets SQLite decode each row and turns it straight into the response dict.
+"""
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+from history_columns import MEASUREMENTS, HistoryColumns, to_epoch
+
+
+# Each entry upgrades the schema by one version (PRAGMA user_version).
+MIGRATIONS = [
+    # 1: accounts and prediction history
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS predictions (
+        username TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        gender TEXT,
+        age REAL,
+        height REAL,
+        weight REAL,
+        duration REAL,
+        heart_rate REAL,
+        body_temp REAL,
+        calories_burnt REAL NOT NULL,
+        PRIMARY KEY (username, id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_predictions_user_date
+        ON predictions (username, date);
+    """,
+    # 2: running per-user aggregates and per-day totals, backfilled from history
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        username TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sum_calories REAL NOT NULL,
+        sum_sq_calories REAL NOT NULL,
+        min_calories REAL NOT NULL,
+        max_calories REAL NOT NULL,
+        sum_duration REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS user_daily (
+        username TEXT NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        sum_calories REAL NOT NULL,
+        sum_duration REAL NOT NULL,
+        PRIMARY KEY (username, day)
+    ) WITHOUT ROWID;
+    INSERT OR REPLACE INTO user_stats
+        SELECT username, MAX(id), COUNT(*), SUM(calories_burnt),
+               SUM(calories_burnt * calories_burnt), MIN(calories_burnt),
+               MAX(calories_burnt), SUM(duration)
+        FROM predictions GROUP BY username;
+    INSERT OR REPLACE INTO user_daily
+        SELECT username, substr(date, 1, 10), COUNT(*), SUM(calories_burnt),
+               SUM(duration)
+        FROM predictions GROUP BY username, substr(date, 1, 10);
+    """,
+    # 3: model version that produced each record
+    """
+    ALTER TABLE predictions ADD COLUMN model_version TEXT;
+    """,
+    # 4: failed login attempts per user, for rate limiting
+    """
+    CREATE TABLE IF NOT EXISTS login_attempts (
+        username TEXT PRIMARY KEY,
+        window_start REAL NOT NULL,
+        failures INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    # 5: weekly (bucket = the Monday) and monthly (bucket = the 1st) rollups,
+    #    backfilled from the daily totals
+    """
+    CREATE TABLE IF NOT EXISTS user_rollups (
+        username TEXT NOT NULL,
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        sum_calories REAL NOT NULL,
+        sum_duration REAL NOT NULL,
+        PRIMARY KEY (username, granularity, bucket)
+    ) WITHOUT ROWID;
+    INSERT OR REPLACE INTO user_rollups
+        SELECT username, 'week', date(day, 'weekday 0', '-6 days'), SUM(count),
+               SUM(sum_calories), SUM(sum_duration)
+        FROM user_daily GROUP BY username, date(day, 'weekday 0', '-6 days');
+    INSERT OR REPLACE INTO user_rollups
+        SELECT username, 'month', strftime('%Y-%m-01', day), SUM(count),
+               SUM(sum_calories), SUM(sum_duration)
+        FROM user_daily GROUP BY username, strftime('%Y-%m-01', day);
+    """,
+    # 6: next free history id per user, so that ids can be reserved in blocks
+    #    before the records are written (write-behind)
+    """
+    CREATE TABLE IF NOT EXISTS id_alloc (
+        username TEXT PRIMARY KEY,
+        next_id INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    INSERT OR REPLACE INTO id_alloc
+        SELECT username, last_id + 1 FROM user_stats;
+    """,
+    # 7: compact history rows: epoch-second timestamps instead of date strings
+    #    and gender codes instead of labels (codes 0 / 1 match the default
+    #    feature encoding). SQLite cannot change column types, so the table is
+    #    rebuilt.
+    """
+    CREATE TABLE IF NOT EXISTS genders (
+        code INTEGER PRIMARY KEY,
+        label TEXT NOT NULL UNIQUE
+    );
+    INSERT OR IGNORE INTO genders VALUES (0, 'male'), (1, 'female');
+    INSERT OR IGNORE INTO genders (label)
+        SELECT DISTINCT gender FROM predictions WHERE gender IS NOT NULL;
+    CREATE TABLE predictions_compact (
+        username TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        gender INTEGER,
+        age REAL,
+        height REAL,
+        weight REAL,
+        duration REAL,
+        heart_rate REAL,
+        body_temp REAL,
+        calories_burnt REAL NOT NULL,
+        model_version TEXT,
+        PRIMARY KEY (username, id)
+    ) WITHOUT ROWID;
+    INSERT INTO predictions_compact
+        SELECT p.username, p.id, CAST(strftime('%s', p.date) AS INTEGER), g.code,
+               p.age, p.height, p.weight, p.duration, p.heart_rate, p.body_temp,
+               p.calories_burnt, p.model_version
+        FROM predictions p LEFT JOIN genders g ON g.label = p.gender;
+    DROP TABLE predictions;
+    ALTER TABLE predictions_compact RENAME TO predictions;
+    CREATE INDEX IF NOT EXISTS idx_predictions_user_ts
+        ON predictions (username, ts);
+    """,
+    # 8: per-user commit-order sequence for history pages (ids reserved ahead
+    #    can commit out of order); existing rows keep their id order
+    """
+    ALTER TABLE predictions ADD COLUMN seq INTEGER;
+    UPDATE predictions SET seq = id;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_user_seq
+        ON predictions (username, seq);
+    """,
+]
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def bucket_start(day, granularity):
+    """First day ('YYYY-MM-DD') of the day / week (Monday) / month containing day."""
+    if granularity == 'day':
+        return day[:10]
+    if granularity == 'month':
+        return day[:7] + '-01'
+    d = date.fromisoformat(day[:10])
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+# Keys of a history record, in the order they are returned
+RECORD_FIELDS = (
+    'id', 'date', 'gender', 'age', 'height', 'weight', 'duration',
+    'heart_rate', 'body_temp', 'calories_burnt', 'model_version'
+)
+
+# Columns of the predictions table, in the order HistoryColumns.from_rows reads them
+STORED_COLUMNS = ('id', 'ts', 'gender', *MEASUREMENTS, 'model_version')
+
+
+class HistoryStore:
+    """Accounts and prediction history in a single SQLite file."""
+
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._gender_codes = {}         # label -> code; codes never change once assigned
+        self._migrate()
+        # Don't carry the migration connection across a fork (gunicorn preload)
+        self.close()
+
+    # ------------- connections -------------
+    def _conn(self):
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, fn):
+        """Run fn(conn) inside a single IMMEDIATE transaction."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def _migrate(self):
+        def upgrade(conn):
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in script.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+        self._write(upgrade)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------- users -------------
+    def create_user(self, username, password):
+        """Insert a new account. Returns False if the username is taken."""
+        try:
+            self._write(lambda conn: conn.execute(
+                'INSERT INTO users (username, password) VALUES (?, ?)',
+                (username, password)
+            ))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def get_password(self, username):
+        """Stored password for username, or None if the user does not exist."""
+        row = self._conn().execute(
+            'SELECT password FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_password(self, username, password):
+        self._write(lambda conn: conn.execute(
+            'UPDATE users SET password = ? WHERE username = ?', (password, username)
+        ))
+
+    # ------------- login rate limiting -------------
+    def begin_login_attempt(self, username, now, window, max_failures):
+        """
+        Count a login attempt as a failure before the password is checked,
+        unless the user already has max_failures in the current window. Check
+        and count happen in one IMMEDIATE transaction, so concurrent guesses
+        (from any thread or worker) cannot all pass the check before one is
+        counted. Returns (allowed, window_start); a successful login clears the
+        count with clear_login_failures(), an attempt that was never checked is
+        handed back with cancel_login_attempt().
+        """
+        def attempt(conn):
+            row = conn.execute(
+                'SELECT failures, window_start FROM login_attempts WHERE username = ?',
+                (username,)
+            ).fetchone()
+            failures, window_start = row if row and row[1] + window > now else (0, now)
+            if failures >= max_failures:
+                return False, window_start
+            conn.execute(
+                'INSERT INTO login_attempts (username, window_start, failures) VALUES (?, ?, ?) '
+                'ON CONFLICT (username) DO UPDATE SET '
+                'window_start = excluded.window_start, failures = excluded.failures',
+                (username, window_start, failures + 1)
+            )
+            return True, window_start
+        return self._write(attempt)
+
+    def cancel_login_attempt(self, username):
+        self._write(lambda conn: conn.execute(
+            'UPDATE login_attempts SET failures = failures - 1 '
+            'WHERE username = ? AND failures > 0', (username,)
+        ))
+
+    def clear_login_failures(self, username):
+        self._write(lambda conn: conn.execute(
+            'DELETE FROM login_attempts WHERE username = ?', (username,)
+        ))
+
+    # ------------- history -------------
+    def reserve_ids(self, username, count):
+        """Reserve count consecutive history ids for username; returns the first."""
+        return self._write(lambda conn: self._reserve(conn, username, count))
+
+    @staticmethod
+    def _reserve(conn, username, count):
+        row = conn.execute(
+            'SELECT next_id FROM id_alloc WHERE username = ?', (username,)
+        ).fetchone()
+        first = row[0] if row else 1
+        conn.execute(
+            'INSERT INTO id_alloc VALUES (?, ?) '
+            'ON CONFLICT (username) DO UPDATE SET next_id = excluded.next_id',
+            (username, first + count)
+        )
+        return first
+
+    def add_predictions(self, username, records):
+        """
+        Append records (dicts shaped like RECORD_FIELDS) to the user's history in
+        one transaction. Records without an 'id' get the next ids of the user's
+        sequence, written back into the dicts; records that carry one (reserved
+        with reserve_ids()) keep it. Returns the records.
+        """
+        if records:
+            self._write(lambda conn: self._insert(conn, username, records))
+        return records
+
+    def add_prediction_groups(self, groups):
+        """add_predictions for several users ({username: records}) in one transaction."""
+        def insert_all(conn):
+            for username, records in groups.items():
+                if records:
+                    self._insert(conn, username, records)
+        self._write(insert_all)
+
+    def _insert(self, conn, username, records):
+        calories = [r['calories_burnt'] for r in records]
+        durations = [r['duration'] for r in records]
+        daily = {}
+        for r in records:
+            totals = daily.setdefault(r['date'][:10], [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += r['calories_burnt']
+            totals[2] += r['duration']
+        rollups = {}
+        for day, totals in daily.items():
+            for granularity in ('week', 'month'):
+                bucket = rollups.setdefault((granularity, bucket_start(day, granularity)),
+                                            [0, 0.0, 0.0])
+                for i, value in enumerate(totals):
+                    bucket[i] += value
+
+        new = [r for r in records if r.get('id') is None]
+        if new:
+            first = self._reserve(conn, username, len(new))
+            for offset, record in enumerate(new):
+                record['id'] = first + offset
+        # Inside the write transaction, so seq follows commit order
+        last_seq = conn.execute(
+            'SELECT MAX(seq) FROM predictions WHERE username = ?', (username,)
+        ).fetchone()[0] or 0
+        conn.executemany(
+            f'INSERT INTO predictions (username, seq, {", ".join(STORED_COLUMNS)}) '
+            f'VALUES (?, ?, {", ".join("?" * len(STORED_COLUMNS))})',
+            [(username, last_seq + offset, r['id'], to_epoch(r['date']),
+              self._gender_code(conn, r['gender']), *(r[f] for f in MEASUREMENTS),
+              r['model_version'])
+             for offset, r in enumerate(records, start=1)]
+        )
+        conn.execute(
+            """
+            INSERT INTO user_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (username) DO UPDATE SET
+                last_id = MAX(last_id, excluded.last_id),
+                count = count + excluded.count,
+                sum_calories = sum_calories + excluded.sum_calories,
+                sum_sq_calories = sum_sq_calories + excluded.sum_sq_calories,
+                min_calories = MIN(min_calories, excluded.min_calories),
+                max_calories = MAX(max_calories, excluded.max_calories),
+                sum_duration = sum_duration + excluded.sum_duration
+            """,
+            (username, max(r['id'] for r in records), len(records), sum(calories),
+             sum(c * c for c in calories), min(calories), max(calories),
+             sum(durations))
+        )
+        conn.executemany(
+            """
+            INSERT INTO user_daily VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (username, day) DO UPDATE SET
+                count = count + excluded.count,
+                sum_calories = sum_calories + excluded.sum_calories,
+                sum_duration = sum_duration + excluded.sum_duration
+            """,
+            [(username, day, *totals) for day, totals in daily.items()]
+        )
+        conn.executemany(
+            """
+            INSERT INTO user_rollups VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (username, granularity, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                sum_calories = sum_calories + excluded.sum_calories,
+                sum_duration = sum_duration + excluded.sum_duration
+            """,
+            [(username, granularity, bucket, *totals)
+             for (granularity, bucket), totals in rollups.items()]
+        )
+
+    def _gender_code(self, conn, label):
+        if label is None:
+            return None
+        code = self._gender_codes.get(label)
+        if code is None:
+            row = conn.execute('SELECT code FROM genders WHERE label = ?', (label,)).fetchone()
+            if row is not None:
+                code = self._gender_codes[label] = row[0]
+            else:
+                # A new label; cached once committed and read back by a later call
+                code = conn.execute('INSERT INTO genders (label) VALUES (?)',
+                                    (label,)).lastrowid
+        return code
+
+    def _gender_labels(self):
+        rows = self._conn().execute('SELECT code, label FROM genders').fetchall()
+        labels = [None] * (max(code for code, _ in rows) + 1)
+        for code, label in rows:
+            labels[code] = label
+        return labels
+
+    def get_history(self, username, after_seq=None, limit=None, date_from=None, date_to=None,
+                    before_seq=None, descending=False):
+        """
+        Records for username, oldest first (unless descending), as dicts with
+        the RECORD_FIELDS keys plus 'seq'; same arguments as
+        get_history_columns(). This is the response path: SQLite formats the
+        date and looks up the gender label, so each row becomes its dict
+        directly, with no column arrays in between.
+        """
+        query, params = self._history_query(
+            "SELECT p.id, datetime(p.ts, 'unixepoch'), g.label, "
+            f"{', '.join('p.' + f for f in MEASUREMENTS)}, p.model_version, p.seq "
+            "FROM predictions p LEFT JOIN genders g ON g.code = p.gender",
+            username, after_seq, limit, date_from, date_to, before_seq, descending
+        )
+        return [dict(zip(RECORD_FIELDS + ('seq',), row))
+                for row in self._conn().execute(query, params).fetchall()]
+
+    def get_history_columns(self, username, after_seq=None, limit=None, date_from=None,
+                            date_to=None, before_seq=None, descending=False):
+        """
+        Records for username, oldest (first committed) first, as HistoryColumns.
+
+        after_seq: only records with seq > after_seq (cursor pagination; seeks
+                   on the (username, seq) index)
+        before_seq: only records with seq < before_seq (the cursor when paging
+                    newest first)
+        descending: newest first
+        limit:    maximum number of records to return
+        date_from / date_to: inclusive bounds, 'YYYY-MM-DD[ HH:MM:SS]'
+        """
+        query, params = self._history_query(
+            f'SELECT {", ".join("p." + c for c in STORED_COLUMNS)} FROM predictions p',
+            username, after_seq, limit, date_from, date_to, before_seq, descending
+        )
+        rows = self._conn().execute(query, params).fetchall()
+        return HistoryColumns.from_rows(rows, self._gender_labels())
+
+    @staticmethod
+    def _history_query(select, username, after_seq, limit, date_from, date_to, before_seq,
+                       descending):
+        query = select + ' WHERE p.username = ?'
+        params = [username]
+        if after_seq is not None:
+            query += ' AND p.seq > ?'
+            params.append(after_seq)
+        if before_seq is not None:
+            query += ' AND p.seq < ?'
+            params.append(before_seq)
+        if date_from is not None:
+            query += ' AND p.ts >= ?'
+            params.append(to_epoch(date_from))
+        if date_to is not None:
+            query += ' AND p.ts <= ?'
+            params.append(to_epoch(date_to))
+        query += ' ORDER BY p.seq DESC' if descending else ' ORDER BY p.seq'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return query, params
+
+    def get_history_version(self, username):
+        """
+        (last_id, count) for username's history; changes whenever a record is
+        added, so it can back an ETag without reading the history itself.
+        """
+        row = self._conn().execute(
+            'SELECT last_id, count FROM user_stats WHERE username = ?', (username,)
+        ).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    # ------------- aggregates -------------
+    def get_statistics(self, username):
+        """
+        Running aggregates for username, or None if they have no history.
+
+        Keys: count, sum_calories, min_calories, max_calories, sum_duration and
+        var_calories (population variance, derived from the sum of squares).
+        """
+        row = self._conn().execute(
+            'SELECT count, sum_calories, sum_sq_calories, min_calories, '
+            'max_calories, sum_duration FROM user_stats WHERE username = ?',
+            (username,)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        count, total, total_sq, lowest, highest, duration = row
+        mean = total / count
+        return {
+            'count': count,
+            'sum_calories': total,
+            'min_calories': lowest,
+            'max_calories': highest,
+            'sum_duration': duration,
+            'var_calories': max(total_sq / count - mean * mean, 0.0),
+        }
+
+    def get_daily_totals(self, username, since=None):
+        """
+        Per-day totals for username, oldest first: dicts with day ('YYYY-MM-DD'),
+        count, sum_calories and sum_duration. since limits to days >= since.
+        """
+        rows = self._conn().execute(
+            'SELECT day, count, sum_calories, sum_duration FROM user_daily '
+            'WHERE username = ? AND day >= ? ORDER BY day',
+            (username, since or '')
+        ).fetchall()
+        return [
+            {'day': day, 'count': count, 'sum_calories': calories, 'sum_duration': duration}
+            for day, count, calories, duration in rows
+        ]
+
+    def get_timeseries(self, username, granularity, date_from=None, date_to=None, limit=None):
+        """
+        Buckets for username at granularity ('day', 'week' or 'month'), oldest
+        first: dicts with bucket (its first day), count, sum_calories and
+        sum_duration. date_from / date_to select the buckets containing those
+        days and everything between; limit keeps the most recent buckets.
+        """
+        if granularity == 'day':
+            query = ('SELECT day, count, sum_calories, sum_duration FROM user_daily '
+                     'WHERE username = ?')
+            params = [username]
+            column = 'day'
+        else:
+            query = ('SELECT bucket, count, sum_calories, sum_duration FROM user_rollups '
+                     'WHERE username = ? AND granularity = ?')
+            params = [username, granularity]
+            column = 'bucket'
+        if date_from is not None:
+            query += f' AND {column} >= ?'
+            params.append(bucket_start(date_from, granularity))
+        if date_to is not None:
+            query += f' AND {column} <= ?'
+            params.append(bucket_start(date_to, granularity))
+        query += f' ORDER BY {column} DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        rows = self._conn().execute(query, params).fetchall()
+        return [
+            {'bucket': bucket, 'count': count, 'sum_calories': calories, 'sum_duration': duration}
+            for bucket, count, calories, duration in reversed(rows)
+        ]
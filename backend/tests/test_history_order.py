@@ -0,0 +1,101 @@
+"""
+History cursors with two writers on one database (two gunicorn workers).
+
+Each HistoryWriter reserves its own block of ids, so a user's ids commit out of
+order: worker A writes id 1, worker B id 65, then A id 2. A client holding a
+cursor past id 65 must still receive id 2. History pages follow the
+commit-order seq (storage.py), and these tests check that no row is skipped.
+
+Run from backend/:
+
+    python -m unittest discover -s tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from history_writer import HistoryWriter  # noqa: E402
+from storage import HistoryStore  # noqa: E402
+
+USER = 'alice'
+
+
+def record(n):
+    return {'date': '2024-01-01 10:00:00', 'gender': 'male', 'age': 30.0, 'height': 180.0,
+            'weight': 80.0, 'duration': 20.0, 'heart_rate': 100.0, 'body_temp': 37.0,
+            'calories_burnt': float(n), 'model_version': 'test'}
+
+
+class TwoWriterCursorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'history.db')
+        HistoryStore(path).create_user(USER, 'x')
+        # Separate stores: separate connections, like separate processes
+        self.writers = [HistoryWriter(HistoryStore(path), flush_interval_ms=5, id_block=64)
+                        for _ in range(2)]
+        self.reader = HistoryStore(path)
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, writer, n):
+        records = writer.submit(USER, [record(n)])
+        while writer.pending(USER):
+            time.sleep(0.001)
+        return records[0]['id']
+
+    def test_cursor_sees_lower_id_committed_later(self):
+        a, b = self.writers
+        first = self.write(a, 1)
+        second = self.write(b, 2)
+        page = self.reader.get_history(USER, limit=10)
+        self.assertEqual([r['id'] for r in page], [first, second])
+
+        late = self.write(a, 3)
+        self.assertLess(late, second)       # the id order no longer matches commit order
+        page = self.reader.get_history(USER, after_seq=page[-1]['seq'], limit=10)
+        self.assertEqual([r['id'] for r in page], [late])
+
+    def test_paging_during_concurrent_writes_skips_nothing(self):
+        per_writer = 300
+        submitted = [[] for _ in self.writers]
+
+        def produce(k):
+            for n in range(per_writer):
+                submitted[k].extend(r['id'] for r in self.writers[k].submit(USER, [record(n)]))
+
+        threads = [threading.Thread(target=produce, args=(k,)) for k in range(len(self.writers))]
+        for t in threads:
+            t.start()
+        seen = []
+        cursor = None
+        while True:
+            page = self.reader.get_history(USER, after_seq=cursor, limit=7)
+            seen.extend(r['id'] for r in page)
+            if page:
+                cursor = page[-1]['seq']
+            elif not any(t.is_alive() for t in threads) and \
+                    not any(w.pending(USER) for w in self.writers):
+                # Writers are done; one last page picks up their final commits
+                page = self.reader.get_history(USER, after_seq=cursor)
+                seen.extend(r['id'] for r in page)
+                break
+
+        expected = sorted(submitted[0] + submitted[1])
+        self.assertEqual(len(expected), per_writer * len(self.writers))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sorted(seen), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,35 +1,11 @@
 import React, { useState, useEffect, useCallback } from 'react';
-import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
+import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import { Flame, Activity, User, Lock, TrendingUp, Calendar, Clock } from 'lucide-react';
 
 const API_URL = 'https://mini-project-rijs.onrender.com/api';
 
-// Custom Tooltip Component
-const CustomTooltip = ({ active, payload }) => {
-  if (active && payload && payload.length) {
-    const data = payload[0].payload;
-    return (
-      <div className="bg-white p-4 border-2 border-orange-500 rounded-xl shadow-xl">
-        <p className="text-xs text-gray-500 mb-2">{data.date}</p>
-        <div className="space-y-1">
-          <p className="text-sm font-semibold text-orange-600">
-            🔥 Calories: {data.calories_burnt} kcal
-          </p>
-          <p className="text-sm text-gray-700">
-            ⏱️ Duration: {data.duration} min
-          </p>
-          <p className="text-sm text-gray-700">
-            💓 Heart Rate: {data.heart_rate} bpm
-          </p>
-          <p className="text-sm text-gray-700">
-            🌡️ Body Temp: {data.body_temp}°C
-          </p>
-        </div>
-      </div>
-    );
-  }
-  return null;
-};
+// Workouts per page of the history table, newest first (the API pages by cursor)
+const HISTORY_PAGE_SIZE = 20;
 
 export default function CalorieBurntTracker() {
   const [currentPage, setCurrentPage] = useState('login');
@@ -37,6 +13,7 @@ export default function CalorieBurntTracker() {
   const [username, setUsername] = useState('');
   const [password, setPassword] = useState('');
   const [loggedInUser, setLoggedInUser] = useState(null);
+  const [authToken, setAuthToken] = useState(null);
   const [formData, setFormData] = useState({
     gender: 'male',
     age: '',
@@ -48,28 +25,54 @@ export default function CalorieBurntTracker() {
   });
   const [prediction, setPrediction] = useState(null);
   const [history, setHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const [statistics, setStatistics] = useState(null);
+  const [timeseries, setTimeseries] = useState([]);
+  const [granularity, setGranularity] = useState('day');
   const [loading, setLoading] = useState(false);
 
-  const fetchHistory = useCallback(async () => {
+  // One page of history; cursor null starts over, otherwise the page is appended
+  const fetchHistory = useCallback(async (cursor = null) => {
     try {
-      const response = await fetch(`${API_URL}/history/${loggedInUser}`);
+      const params = `order=desc&limit=${HISTORY_PAGE_SIZE}` +
+        (cursor !== null ? `&cursor=${cursor}` : '');
+      const response = await fetch(`${API_URL}/history/${loggedInUser}?${params}`, {
+        headers: { Authorization: `Bearer ${authToken}` }
+      });
       const data = await response.json();
-      if (data.success) setHistory(data.history);
+      if (data.success) {
+        setHistory((previous) => (cursor !== null ? [...previous, ...data.history] : data.history));
+        setHistoryCursor(data.next_cursor);
+      }
     } catch (error) {
       console.error('Error fetching history:', error);
     }
-  }, [loggedInUser]);
+  }, [loggedInUser, authToken]);
 
   const fetchStatistics = useCallback(async () => {
     try {
-      const response = await fetch(`${API_URL}/statistics/${loggedInUser}`);
+      const response = await fetch(`${API_URL}/statistics/${loggedInUser}`, {
+        headers: { Authorization: `Bearer ${authToken}` }
+      });
       const data = await response.json();
       if (data.success) setStatistics(data.statistics);
     } catch (error) {
       console.error('Error fetching statistics:', error);
     }
-  }, [loggedInUser]);
+  }, [loggedInUser, authToken]);
+
+  const fetchTimeseries = useCallback(async () => {
+    try {
+      const response = await fetch(
+        `${API_URL}/timeseries/${loggedInUser}?granularity=${granularity}&limit=60`,
+        { headers: { Authorization: `Bearer ${authToken}` } }
+      );
+      const data = await response.json();
+      if (data.success) setTimeseries(data.points);
+    } catch (error) {
+      console.error('Error fetching timeseries:', error);
+    }
+  }, [loggedInUser, authToken, granularity]);
 
   useEffect(() => {
     if (loggedInUser && currentPage === 'history') {
@@ -78,6 +81,12 @@ export default function CalorieBurntTracker() {
     }
   }, [loggedInUser, currentPage, fetchHistory, fetchStatistics]);
 
+  useEffect(() => {
+    if (loggedInUser && currentPage === 'history') {
+      fetchTimeseries();
+    }
+  }, [loggedInUser, currentPage, fetchTimeseries]);
+
   const handleAuth = async () => {
     setLoading(true);
     const endpoint = isLogin ? '/login' : '/register';
@@ -93,6 +102,7 @@ export default function CalorieBurntTracker() {
       
       if (data.success) {
         setLoggedInUser(username);
+        setAuthToken(data.token);
         setCurrentPage('predict');
         setPassword('');
       } else {
@@ -111,7 +121,10 @@ export default function CalorieBurntTracker() {
     try {
       const response = await fetch(`${API_URL}/predict`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: `Bearer ${authToken}`
+        },
         body: JSON.stringify({ ...formData, username: loggedInUser })
       });
       
@@ -132,6 +145,7 @@ export default function CalorieBurntTracker() {
 
   const handleLogout = () => {
     setLoggedInUser(null);
+    setAuthToken(null);
     setCurrentPage('login');
     setUsername('');
     setFormData({
@@ -438,70 +452,63 @@ export default function CalorieBurntTracker() {
             </div>
           )}
 
-          {/* Charts */}
-          {history.length > 0 && (
+          {/* Calories over time (server-side rollups) */}
+          {timeseries.length > 0 && (
             <div className="bg-white rounded-xl shadow-md p-6 mb-6">
               <div className="flex items-center justify-between mb-4">
-                <h3 className="text-xl font-bold text-gray-800">📈 Calorie Burning Progress</h3>
-                <div className="text-sm text-gray-500">
-                  Last {Math.min(history.length, 10)} workouts
+                <h3 className="text-xl font-bold text-gray-800">📊 Calories Over Time</h3>
+                <div className="flex gap-2">
+                  {['day', 'week', 'month'].map((g) => (
+                    <button
+                      key={g}
+                      onClick={() => setGranularity(g)}
+                      className={`px-3 py-1 rounded-lg text-sm font-semibold transition-all ${
+                        granularity === g
+                          ? 'bg-orange-500 text-white'
+                          : 'bg-gray-100 text-gray-600 hover:bg-gray-200'
+                      }`}
+                    >
+                      {g.charAt(0).toUpperCase() + g.slice(1)}
+                    </button>
+                  ))}
                 </div>
               </div>
-              
-              <div className="h-80">
+
+              <div className="h-72">
                 <ResponsiveContainer width="100%" height="100%">
-                  <LineChart data={history.slice(-10)} margin={{ top: 5, right: 30, left: 20, bottom: 5 }}>
-                    <defs>
-                      <linearGradient id="colorCalories" x1="0" y1="0" x2="0" y2="1">
-                        <stop offset="5%" stopColor="#f97316" stopOpacity={0.8}/>
-                        <stop offset="95%" stopColor="#f97316" stopOpacity={0.1}/>
-                      </linearGradient>
-                    </defs>
+                  <BarChart data={timeseries} margin={{ top: 5, right: 30, left: 20, bottom: 5 }}>
                     <CartesianGrid strokeDasharray="3 3" stroke="#f0f0f0" />
-                    <XAxis 
-                      dataKey="id" 
-                      label={{ value: 'Workout #', position: 'insideBottom', offset: -5 }}
-                      tick={{ fill: '#666' }}
-                    />
-                    <YAxis 
+                    <XAxis dataKey="bucket" tick={{ fill: '#666', fontSize: 12 }} />
+                    <YAxis
                       label={{ value: 'Calories (kcal)', angle: -90, position: 'insideLeft' }}
                       tick={{ fill: '#666' }}
                     />
-                    <Tooltip content={<CustomTooltip />} />
-                    <Line 
-                      type="monotone" 
-                      dataKey="calories_burnt" 
-                      stroke="#f97316" 
-                      strokeWidth={3}
-                      dot={{ fill: '#f97316', r: 5 }}
-                      activeDot={{ r: 7, fill: '#ea580c' }}
-                      fill="url(#colorCalories)"
+                    <Tooltip
+                      formatter={(value, name) => [value, name === 'total_calories' ? 'Total kcal' : name]}
+                      labelFormatter={(label) => `${granularity === 'day' ? 'Day' : granularity === 'week' ? 'Week of' : 'Month of'} ${label}`}
                     />
-                  </LineChart>
+                    <Bar dataKey="total_calories" fill="#f97316" radius={[6, 6, 0, 0]} />
+                  </BarChart>
                 </ResponsiveContainer>
               </div>
 
               {/* Summary Stats Below Chart */}
-              <div className="grid grid-cols-3 gap-4 mt-6 pt-6 border-t border-gray-200">
-                <div className="text-center">
-                  <p className="text-2xl font-bold text-orange-600">
-                    {history.length > 0 ? Math.max(...history.map(h => h.calories_burnt)) : 0}
-                  </p>
-                  <p className="text-xs text-gray-600 mt-1">Peak Calories</p>
-                </div>
-                <div className="text-center">
-                  <p className="text-2xl font-bold text-red-600">
-                    {history.length > 0 ? (history.reduce((sum, h) => sum + h.calories_burnt, 0) / history.length).toFixed(0) : 0}
-                  </p>
-                  <p className="text-xs text-gray-600 mt-1">Average Calories</p>
-                </div>
-                <div className="text-center">
-                  <p className="text-2xl font-bold text-pink-600">
-                    {history.reduce((sum, h) => sum + h.calories_burnt, 0).toFixed(0)}
-                  </p>
-                  <p className="text-xs text-gray-600 mt-1">Total Burned</p>
+              {statistics && (
+                <div className="grid grid-cols-3 gap-4 mt-6 pt-6 border-t border-gray-200">
+                  <div className="text-center">
+                    <p className="text-2xl font-bold text-orange-600">{statistics.max_calories}</p>
+                    <p className="text-xs text-gray-600 mt-1">Peak Calories</p>
+                  </div>
+                  <div className="text-center">
+                    <p className="text-2xl font-bold text-red-600">{statistics.avg_calories.toFixed(0)}</p>
+                    <p className="text-xs text-gray-600 mt-1">Average Calories</p>
+                  </div>
+                  <div className="text-center">
+                    <p className="text-2xl font-bold text-pink-600">{statistics.total_calories.toFixed(0)}</p>
+                    <p className="text-xs text-gray-600 mt-1">Total Burned</p>
+                  </div>
                 </div>
-              </div>
+              )}
             </div>
           )}
 
@@ -526,7 +533,7 @@ export default function CalorieBurntTracker() {
                     </tr>
                   </thead>
                   <tbody>
-                    {history.slice().reverse().map((record) => (
+                    {history.map((record) => (
                       <tr key={record.id} className="border-b border-gray-100 hover:bg-gray-50">
                         <td className="py-3 px-4">{record.date}</td>
                         <td className="py-3 px-4">{record.duration} min</td>
@@ -540,6 +547,14 @@ export default function CalorieBurntTracker() {
                     ))}
                   </tbody>
                 </table>
+                {historyCursor !== null && (
+                  <button
+                    onClick={() => fetchHistory(historyCursor)}
+                    className="w-full mt-4 py-2 rounded-lg bg-gray-100 text-gray-600 font-semibold hover:bg-gray-200 transition-colors"
+                  >
+                    Load more
+                  </button>
+                )}
               </div>
             )}
           </div>